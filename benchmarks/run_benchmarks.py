@@ -0,0 +1,288 @@
+"""Measures the performance of the simulation, the event files, the
+aggregation and the startup of the programs.
+
+Run it from the root of the repository, as a module:
+
+  python3 -m benchmarks.run_benchmarks -o results.json
+  python3 -m benchmarks.run_benchmarks --baseline results.json
+
+The results are written as JSON. With --baseline, every benchmark is compared
+to the same benchmark in an earlier result file, and the exit status is 1 if
+any of them got slower by more than --tolerance.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy
+from collections.abc import Callable
+from dataclasses import asdict
+from dataclasses import dataclass
+from dataclasses import field
+
+from pyrademo import analysis
+from pyrademo import model
+from pyrademo import simulation
+from pyrademo.decaychain import read_decay_chain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THORIUM_CHAIN = os.path.join(ROOT, "data", "thorium.decaychain")
+TOTAL_TIME = 20 * 365 * 24 * 3600.0
+SEED = 1
+FILES_MAX_PARTICLES = 100000
+
+
+@dataclass
+class Result:
+    """The result of one benchmark.
+
+    Attributes:
+      name: The name of the benchmark.
+      params: The parameters, like the number of particles.
+      seconds: The best wall time of the repetitions.
+      metrics: Throughputs derived from seconds, like events_per_s.
+    """
+
+    name: str
+    params: dict
+    seconds: float
+    metrics: dict[str, float] = field(default_factory=dict)
+
+    def key(self) -> str:
+        """Identifies the benchmark, to compare it to a baseline."""
+        return self.name + "".join(" {}={}".format(k, v) for k, v in sorted(self.params.items()))
+
+
+def best_time(function: Callable[[], object], repeat: int) -> float:
+    """Returns the shortest wall time of repeat calls to function."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def report(result: Result) -> Result:
+    metrics = "  ".join("{}={:.4g}".format(k, v) for k, v in result.metrics.items())
+    print("{:<48} {:>10.4f} s  {}".format(result.key(), result.seconds, metrics), flush=True)
+    return result
+
+
+def make_config(decay_chain: model.DecayChain, num_particles: int, base_name: str = "bench") -> model.SimulationConfig:
+    return model.SimulationConfig(decay_chain, num_particles, TOTAL_TIME, base_name, seed=SEED)
+
+
+def bench_simulation(decay_chain: model.DecayChain, sizes: list[int], repeat: int) -> list[Result]:
+    """Particles and events per second of RawSimulator.simulate, and of
+    BatchSimulator.simulate_columns for comparison, and of their time ordered
+    streams."""
+    results = []
+    for n in sizes:
+        cfg = make_config(decay_chain, n)
+        num_events = len(simulation.BatchSimulator(cfg).simulate_columns())
+        for name, run in [
+            ("simulate/particle", lambda: simulation.RawSimulator(cfg).simulate()),
+            ("simulate/batch", lambda: simulation.BatchSimulator(cfg).simulate_columns()),
+            ("simulate/particle_time_ordered", lambda: list(simulation.RawSimulator(cfg).simulate_time_ordered(n))),
+            ("simulate/batch_time_ordered", lambda: list(simulation.BatchSimulator(cfg).simulate_time_ordered(n))),
+        ]:
+            seconds = best_time(run, repeat)
+            results.append(report(Result(name, {"n": n}, seconds, {
+                "particles_per_s": n / seconds,
+                "events_per_s": num_events / seconds,
+            })))
+    return results
+
+
+def bench_files(decay_chain: model.DecayChain, sizes: list[int], repeat: int, directory: str) -> list[Result]:
+    """MB/s of SimulationResults.write_file and from_file, for both formats."""
+    results = []
+    for n in sizes:
+        for binary, extension in [(False, ".events"), (True, ".events.bin")]:
+            base_name = os.path.join(directory, "files-{}-{}".format(n, "binary" if binary else "text"))
+            cfg = make_config(decay_chain, n, base_name)
+            sr = model.SimulationResults(cfg, simulation.BatchSimulator(cfg).simulate())
+            params = {"n": n, "format": "binary" if binary else "text"}
+
+            seconds = best_time(lambda: sr.write_file(binary=binary), repeat)
+            megabytes = os.path.getsize(base_name + extension) / 1e6
+            results.append(report(Result("results/write_file", params, seconds, {
+                "mb_per_s": megabytes / seconds,
+                "events_per_s": len(sr.data) / seconds,
+            })))
+
+            seconds = best_time(lambda: model.SimulationResults.from_file(base_name + ".sim"), repeat)
+            results.append(report(Result("results/from_file", params, seconds, {
+                "mb_per_s": megabytes / seconds,
+                "events_per_s": len(sr.data) / seconds,
+            })))
+    return results
+
+
+def write_synthetic_chain(file_name: str, num_isotopes: int) -> None:
+    """Writes a decay chain file with num_isotopes isotopes. Every tenth
+    isotope has two branches, the others a single decay."""
+    with open(file_name, "w") as f:
+        f.write("# from to type probability half_time time_unit energy_MeV\n")
+        for i in range(num_isotopes - 2):
+            if i % 10 == 0:
+                f.write("I{} I{} alpha 40.0 {} s 4.0\n".format(i, i + 1, i + 1))
+                f.write("I{} I{} beta 60.0 {} s 1.0\n".format(i, i + 2, i + 1))
+            else:
+                f.write("I{} I{} beta 100.0 {} s 1.0\n".format(i, i + 1, i + 1))
+        f.write("I{} I{} alpha 100.0 1.0 s 4.0\n".format(num_isotopes - 2, num_isotopes - 1))
+
+
+def bench_decay_chain(sizes: list[int], repeat: int, directory: str) -> list[Result]:
+    """Time of read_decay_chain on synthetic chains, whole, and restricted to
+    the second half, reachable from its middle isotope."""
+    results = []
+    for num_isotopes in sizes:
+        file_name = os.path.join(directory, "synthetic-{}.decaychain".format(num_isotopes))
+        write_synthetic_chain(file_name, num_isotopes)
+        seconds = best_time(lambda: read_decay_chain(file_name), repeat)
+        results.append(report(Result("read_decay_chain", {"isotopes": num_isotopes}, seconds, {
+            "isotopes_per_s": num_isotopes / seconds,
+        })))
+        start = ["I{}".format(num_isotopes // 2)]
+        seconds = best_time(lambda: read_decay_chain(file_name, start), repeat)
+        results.append(report(Result("read_decay_chain/reachable", {"isotopes": num_isotopes}, seconds, {
+            "isotopes_per_s": num_isotopes / seconds,
+        })))
+    return results
+
+
+def bench_aggregation(decay_chain: model.DecayChain, sizes: list[int], repeat: int) -> list[Result]:
+    """Time of the per-isotope aggregations of the analysis module."""
+    results = []
+    grid = numpy.linspace(0.0, TOTAL_TIME, 1000)
+    for n in sizes:
+        cfg = make_config(decay_chain, n)
+        events = simulation.BatchSimulator(cfg).simulate_columns()
+        time_ordered = model.EventTable.concatenate(simulation.BatchSimulator(cfg).simulate_time_ordered(n))
+        num_events = len(events)
+        for name, run in [
+            ("analysis/population_steps", lambda: analysis.population_steps(events, decay_chain, n)),
+            ("analysis/population_steps/time_ordered",
+             lambda: analysis.population_steps(time_ordered, decay_chain, n)),
+            ("analysis/energy_steps", lambda: analysis.energy_steps(events, decay_chain)),
+            ("analysis/energy_steps/time_ordered", lambda: analysis.energy_steps(time_ordered, decay_chain)),
+            ("analysis/binned_populations", lambda: analysis.binned_populations(events, decay_chain, n, grid)),
+            ("analysis/binned_energy", lambda: analysis.binned_energy(events, decay_chain, grid)),
+            ("analysis/binned_rates", lambda: analysis.binned_rates(events, decay_chain, grid)),
+        ]:
+            seconds = best_time(run, repeat)
+            results.append(report(Result(name, {"n": n}, seconds, {"events_per_s": num_events / seconds})))
+    return results
+
+
+def bench_startup(repeat: int) -> list[Result]:
+    """Wall time of starting the programs, until their --help is printed, and
+    of the imports they are made of."""
+    results = []
+    for name, command in [
+        ("startup/python", ["-c", "pass"]),
+        ("startup/import_numpy", ["-c", "import numpy"]),
+        ("startup/import_matplotlib", ["-c", "import matplotlib.pyplot"]),
+        ("startup/pyrademo_help", ["-m", "pyrademo", "--help"]),
+        ("startup/pyrademo_run_help", ["-m", "pyrademo", "run", "--help"]),
+        ("startup/pyrademo_simulate_help", ["-m", "pyrademo", "simulate", "--help"]),
+        ("startup/write_raw_events_help", ["write_raw_events.py", "--help"]),
+        ("startup/plot_all_help", ["plot_all.py", "--help"]),
+    ]:
+        seconds = best_time(lambda: subprocess.run([sys.executable] + command, cwd=ROOT, check=True,
+                                                   stdout=subprocess.DEVNULL), repeat)
+        results.append(report(Result(name, {}, seconds)))
+    return results
+
+
+def compare(results: list[Result], baseline_file_name: str, tolerance: float) -> bool:
+    """Prints the change of each benchmark relative to the baseline.
+
+    Returns:
+      True, if none of them got slower by more than tolerance.
+    """
+    with open(baseline_file_name, "r") as f:
+        baseline = {r.key(): r for r in (Result(**d) for d in json.load(f)["results"])}
+
+    ok = True
+    print("\nCompared to {}:".format(baseline_file_name))
+    for result in results:
+        if result.key() not in baseline:
+            print("{:<48} {:>10}".format(result.key(), "new"))
+            continue
+        ratio = result.seconds / baseline[result.key()].seconds
+        regression = ratio > 1.0 + tolerance
+        ok = ok and not regression
+        print("{:<48} {:>9.2f}x{}".format(result.key(), ratio, "  SLOWER" if regression else ""))
+    return ok
+
+
+parser = argparse.ArgumentParser(
+    prog="run_benchmarks.py",
+    description="Measures the performance of the simulation, the event files, the aggregation and the startup of "
+    "the programs.",
+)
+
+parser.add_argument("-o", "--output",
+                    help="Write the results to this JSON file.")
+parser.add_argument("--baseline",
+                    help="A JSON file written by an earlier run with -o, to compare the results to.")
+parser.add_argument("--tolerance", type=float, default=0.2,
+                    help="The relative slowdown compared to the baseline, above which a benchmark counts as a "
+                    "regression. 0.2 by default.")
+parser.add_argument("--max-particles", type=int, default=1000000,
+                    help="The largest number of particles. The simulations run with 1e2, 1e3, ... particles up to "
+                    "this. 1e6 by default.")
+parser.add_argument("--repeat", type=int, default=3,
+                    help="The number of repetitions of each benchmark, the best time is reported. Benchmarks "
+                    "with 1e5 particles or more run once.")
+parser.add_argument("--only", choices=["simulation", "files", "decay_chain", "aggregation", "startup"],
+                    action="append",
+                    help="Only run this group of benchmarks. Can be given multiple times.")
+
+args = parser.parse_args(sys.argv[1:])
+
+groups = args.only if args.only else ["simulation", "files", "decay_chain", "aggregation", "startup"]
+sizes = [10 ** k for k in range(2, 7) if 10 ** k <= args.max_particles]
+small_sizes = [n for n in sizes if n < 100000]
+large_sizes = [n for n in sizes if n >= 100000]
+decay_chain = read_decay_chain(THORIUM_CHAIN)
+
+results: list[Result] = []
+with tempfile.TemporaryDirectory() as directory:
+    for repeat, group_sizes in [(args.repeat, small_sizes), (1, large_sizes)]:
+        if "simulation" in groups:
+            results.extend(bench_simulation(decay_chain, group_sizes, repeat))
+        if "files" in groups:
+            # Writing 1e6 particles as text takes minutes.
+            results.extend(bench_files(decay_chain, [n for n in group_sizes if n <= FILES_MAX_PARTICLES],
+                                       repeat, directory))
+        if "aggregation" in groups:
+            results.extend(bench_aggregation(decay_chain, group_sizes, repeat))
+    if "decay_chain" in groups:
+        results.extend(bench_decay_chain([100, 1000, 5000], args.repeat, directory))
+    if "startup" in groups:
+        results.extend(bench_startup(args.repeat))
+
+if args.output is not None:
+    with open(args.output, "w") as f:
+        json.dump({
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "engine_version": simulation.ENGINE_VERSION,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "results": [asdict(result) for result in results],
+        }, f, indent=1)
+        f.write("\n")
+
+if args.baseline is not None and not compare(results, args.baseline, args.tolerance):
+    sys.exit(1)
@@ -0,0 +1,73 @@
+"""Converts text .events files to the binary .events.bin format."""
+
+import argparse
+import os
+import sys
+import time
+
+from pyrademo import eventfile
+from pyrademo import eventindex
+from pyrademo import model
+from pyrademo import profiling
+from pyrademo import textevents
+
+parser = argparse.ArgumentParser(
+    prog="convert_events.py",
+    description="Converts the text .events files of simulations to the binary .events.bin format. The text files "
+    "are split into ranges of lines, which are parsed in parallel.",
+)
+
+parser.add_argument("files", nargs="+",
+                    help="The .sim files of the simulations to convert, or their base names.")
+parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                    help="The number of worker processes parsing the text files. The number of CPUs by default.")
+parser.add_argument("--chunk-size", type=int, default=textevents.CHUNK_BYTES >> 20,
+                    help="The size of the ranges of lines parsed by a worker at once, in MiB. 64 by default.")
+parser.add_argument("--index", action="store_true",
+                    help="Also write a .events.idx file, an index of the events by isotope and time.")
+parser.add_argument("--remove-text", action="store_true",
+                    help="Remove the text .events file after converting it.")
+
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+for file_name in args.files:
+    base_name = file_name.removesuffix(".sim")
+    with profiler.stage("read_config"):
+        cfg = model.SimulationConfig.from_file(base_name)
+    text_file_name = base_name + ".events"
+    binary_file_name = base_name + ".events.bin"
+
+    start = time.perf_counter()
+    num_bytes = 0
+    with profiler.stage("convert"), eventfile.EventWriter(binary_file_name, len(cfg.decay_chain.isotopes)) as writer:
+        chunks = textevents.read_chunks(text_file_name, args.workers, args.chunk_size << 20)
+        for columns, size in profiler.iterate("parse", chunks):
+            with profiler.stage("write"):
+                writer.write(columns)
+            num_bytes += size
+    seconds = time.perf_counter() - start
+    # The readers use the events file of the format recorded in the .sim file.
+    cfg.event_format = "binary"
+    with open(base_name + ".sim", "w") as f:
+        f.write(cfg.to_json())
+    if args.index:
+        with profiler.stage("index"):
+            eventindex.write_index(base_name)
+    elif eventindex.has_index(base_name):
+        # The index of an earlier binary file does not match the new one.
+        os.remove(eventindex.index_file_name(base_name))
+
+    profiler.count("files")
+    profiler.count("bytes_read", num_bytes)
+    profiler.count("events", writer.num_events)
+    profiler.count_bytes([binary_file_name])
+    print("Converted {}: {} events, {:.1f} MB in {:.2f} s, {:.1f} MB/s, {:.3g} events/s".format(
+        text_file_name, writer.num_events, num_bytes / 1e6, seconds, num_bytes / 1e6 / seconds,
+        writer.num_events / seconds))
+    if args.remove_text:
+        os.remove(text_file_name)
+
+profiler.write_report()
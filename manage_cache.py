@@ -0,0 +1,53 @@
+"""Inspects and prunes the cache of simulation results."""
+
+import argparse
+import sys
+import time
+
+from pyrademo import cache
+from pyrademo import profiling
+
+parser = argparse.ArgumentParser(
+    prog="manage_cache.py",
+    description="Inspects and prunes the cache of simulation results, used by write_raw_events.py --cache.",
+)
+
+parser.add_argument("--cache-dir",
+                    help="The directory of the result cache. Defaults to $PYRADEMO_CACHE_DIR or ~/.cache/pyrademo.")
+subparsers = parser.add_subparsers(dest="command", required=True)
+subparsers.add_parser("list", help="Lists the entries, the least recently used first.")
+prune_parser = subparsers.add_parser("prune", help="Removes the least recently used entries.")
+prune_parser.add_argument("--max-size", required=True, type=cache.parse_size,
+                          help="The size to shrink the cache to, like 500M or 5G.")
+subparsers.add_parser("clear", help="Removes all the entries.")
+
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+result_cache = cache.ResultCache(args.cache_dir)
+
+
+def size_mib(size: int) -> str:
+    return "{:.1f} MiB".format(size / (1 << 20))
+
+
+if args.command == "list":
+    with profiler.stage("list"):
+        entries = result_cache.entries()
+    profiler.count("entries", len(entries))
+    for entry in entries:
+        last_used = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.last_used))
+        print("{}  {}  {:>12}  {}".format(entry.key[:16], last_used, size_mib(entry.size), entry.description))
+    print("{} entries, {} in {}".format(len(entries), size_mib(sum(e.size for e in entries)), result_cache.directory))
+else:
+    with profiler.stage(args.command):
+        if args.command == "prune":
+            removed = result_cache.prune(args.max_size)
+        else:
+            removed = result_cache.clear()
+    profiler.count("entries_removed", len(removed))
+    print("Removed {} entries, {}".format(len(removed), size_mib(sum(e.size for e in removed))))
+
+profiler.write_report()
@@ -0,0 +1,38 @@
+"""Converts .sim files written by older versions to the current JSON format."""
+
+import argparse
+import sys
+
+from pyrademo import model
+from pyrademo import profiling
+
+parser = argparse.ArgumentParser(
+    prog="migrate_sim_files.py",
+    description="Converts .sim files written by older versions of write_raw_events.py to the current JSON format, in place.",
+)
+
+parser.add_argument("files", nargs="+",
+                    help="The .sim files to convert. Files already in the current format are left unchanged.")
+
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+for file_name in args.files:
+    with open(file_name, "r") as f:
+        contents = f.read()
+    with profiler.stage("read_config"):
+        cfg = model.SimulationConfig.from_file(file_name)
+    new_contents = cfg.to_json()
+    profiler.count("files")
+    if new_contents == contents:
+        continue
+    with profiler.stage("write_config"):
+        with open(file_name, "w") as f:
+            f.write(new_contents)
+    profiler.count("files_converted")
+    profiler.count("bytes_written", len(new_contents.encode("utf-8")))
+    print("Converted {}".format(file_name))
+
+profiler.write_report()
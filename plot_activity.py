@@ -0,0 +1,85 @@
+"""Plots the activity and the released power per isotope as a function of time."""
+
+import argparse
+import os
+import sys
+
+from pyrademo import ensemble
+from pyrademo import model
+from pyrademo import population
+from pyrademo import profiling
+from pyrademo import rates
+from pyrademo import reduction
+
+parser = argparse.ArgumentParser(
+    prog="plot_activity.py",
+    description="Plots the activity, in decays per second, and the released power, in MeV per second, per isotope "
+    "and in total, averaged over time bins, with bootstrap confidence intervals.",
+)
+
+parser.add_argument("-i", "--input", required=True,
+                    help="A simulation, produced by write_raw_events.py. Either the filename of a .sim file, or its base name.")
+parser.add_argument("--bins", type=int, default=200,
+                    help="The number of time bins, 200 by default.")
+parser.add_argument("--bootstrap", type=int, default=200,
+                    help="The number of bootstrap resamples of the particles, 200 by default. 0 for no confidence "
+                    "intervals. Simulations of the population engine have none.")
+parser.add_argument("--level", type=float, default=0.95,
+                    help="The confidence level of the intervals, 0.95 by default.")
+parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                    help="The number of processes of the bootstrap. The number of CPUs by default.")
+parser.add_argument("--seed", type=int, default=None,
+                    help="The seed of the bootstrap. A random seed if not given.")
+parser.add_argument("--log", action="store_true",
+                    help="Use a logarithmic y scale.")
+parser.add_argument("--no-show", action="store_true",
+                    help="Only save the figures, do not show them. For batch jobs, also without a display.")
+
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+if args.bins < 1 or args.bootstrap < 0:
+    parser.error("--bins must be positive, and --bootstrap not negative")
+if not 0.0 < args.level < 1.0:
+    parser.error("--level must be between 0 and 1")
+if ensemble.has_ensemble(args.input):
+    parser.error("an ensemble has no events, plot it with plot_all.py")
+
+if population.has_populations(args.input):
+    with profiler.stage("read"):
+        cfg, history = population.read_populations(args.input)
+    with profiler.stage("aggregate"):
+        series = rates.population_rate_series(history, rates.time_bins(cfg.total_time, args.bins))
+else:
+    with profiler.stage("read"):
+        cfg, events = model.read_event_columns(args.input)
+    profiler.count("events", len(events))
+    with profiler.stage("aggregate"):
+        # The decays of lumped isotopes are attributed to them, not to their
+        # parents.
+        series = rates.rate_series(reduction.expand_events(events, cfg.decay_chain), cfg.decay_chain,
+                                   cfg.num_particles, rates.time_bins(cfg.total_time, args.bins), args.bootstrap,
+                                   args.level, args.workers, args.seed)
+    profiler.count("bootstrap_resamples", args.bootstrap)
+
+with profiler.stage("import_matplotlib"):
+    if args.no_show:
+        import matplotlib
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from pyrademo import plotting
+
+for quantity in ["activity", "power"]:
+    with profiler.stage("plot"):
+        fig, file_name, num_points = plotting.rate_figure(cfg, series, quantity, args.log)
+    profiler.count("plotted_points", num_points)
+    with profiler.stage("save"):
+        fig.savefig(file_name)
+    if args.no_show:
+        plt.close(fig)
+    print("Wrote {}".format(file_name))
+profiler.write_report()
+if not args.no_show:
+    plt.show()
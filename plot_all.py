@@ -0,0 +1,8 @@
+"""Plots all the figures of a simulation, from a single load of its results. See pyrademo/plot.py."""
+
+import sys
+
+from pyrademo import plot
+
+if __name__ == "__main__":
+    sys.exit(plot.main(sys.argv[1:]))
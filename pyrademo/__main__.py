@@ -0,0 +1,7 @@
+"""Runs the pyrademo command, see pyrademo/cli.py."""
+
+import sys
+
+from .cli import main
+
+sys.exit(main(sys.argv[1:]))
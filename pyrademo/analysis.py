@@ -0,0 +1,270 @@
+"""Aggregation of simulated decay events to time series per isotope.
+
+The events of a simulation are given as a model.EventTable. All the functions
+here work on whole columns with NumPy, without a Python loop over the events.
+"""
+
+import numpy
+from dataclasses import dataclass
+
+from .model import DecayChain
+from .model import EventTable
+
+
+@dataclass
+class StepCurve:
+    """A step function of time, for a single isotope.
+
+    The value is values[i] from times[i] until times[i+1].
+
+    Attributes:
+      name: The name of the isotope.
+      times: The times of the steps, in seconds, increasing.
+      values: The values after each step.
+    """
+
+    name: str
+    times: numpy.ndarray
+    values: numpy.ndarray
+
+
+def _initial_populations(decay_chain: DecayChain, num_particles: int | numpy.ndarray) -> numpy.ndarray:
+    """Returns the number of particles of each isotope at time 0.
+
+    Args:
+      decay_chain: The decay chain of the simulation.
+      num_particles: Either the number of particles, all of them isotope 0,
+        or the number of particles of each isotope, like
+        SimulationConfig.initial_populations.
+    """
+    if numpy.ndim(num_particles) > 0:
+        initial = numpy.asarray(num_particles, dtype=numpy.int64)
+        if initial.shape != (len(decay_chain.isotopes),):
+            raise ValueError("Expected initial populations of {} isotopes, got shape {}".format(
+                len(decay_chain.isotopes), initial.shape))
+        return initial
+    initial = numpy.zeros(len(decay_chain.isotopes), dtype=numpy.int64)
+    initial[0] = num_particles
+    return initial
+
+
+def _time_order(times: numpy.ndarray) -> numpy.ndarray | slice:
+    """Returns the indices, which sort the events stably by time.
+
+    The events written with write_raw_events.py --time-ordered are already in
+    time order. For them, the sort is skipped, and a slice of all the events
+    is returned, which indexes the columns without copying them.
+    """
+    if times.size < 2 or bool((times[1:] >= times[:-1]).all()):
+        return slice(None)
+    return numpy.argsort(times, kind="stable")
+
+
+def _isotope_dtype(num_isotopes: int) -> type:
+    """Returns the smallest integer type for isotope indices.
+
+    A stable argsort of 8 and 16 bit integers is a radix sort in NumPy, much
+    faster than sorting 64 bit integers.
+    """
+    if num_isotopes <= 1 << 8:
+        return numpy.uint8
+    if num_isotopes <= 1 << 16:
+        return numpy.uint16
+    return numpy.int64
+
+
+def _step_curves(decay_chain: DecayChain, isotope: numpy.ndarray, times: numpy.ndarray,
+                 changes: numpy.ndarray, initial: numpy.ndarray) -> list[StepCurve]:
+    """Builds the cumulative step curves from changes of the isotopes.
+
+    Args:
+      decay_chain: The decay chain.
+      isotope: The isotope of each change.
+      times: The time of each change, increasing.
+      changes: The amount of each change.
+      initial: The value of each isotope at time 0.
+
+    Returns:
+      A StepCurve per isotope, starting with a step at time 0.
+    """
+    n = len(decay_chain.isotopes)
+    # The changes are already in time order, so a stable sort by isotope keeps
+    # them in time order within each isotope.
+    order = numpy.argsort(isotope.astype(_isotope_dtype(n)), kind="stable")
+    times = times[order]
+    values = numpy.cumsum(changes[order])
+
+    # The cumulative sum runs over all isotopes. Subtract the sum of the
+    # isotopes before, so that each isotope starts from its initial value.
+    counts = numpy.bincount(isotope, minlength=n)
+    ends = numpy.cumsum(counts)
+    starts = ends - counts
+    offsets = numpy.concatenate(([0], values))[starts]
+    values = values - numpy.repeat(offsets, counts) + numpy.repeat(initial, counts)
+
+    return [
+        StepCurve(
+            name=decay_chain.isotopes[i].name,
+            times=numpy.concatenate(([0.0], times[starts[i]:ends[i]])),
+            values=numpy.concatenate(([initial[i]], values[starts[i]:ends[i]])),
+        )
+        for i in range(n)
+    ]
+
+
+def population_steps(events: EventTable, decay_chain: DecayChain,
+                     num_particles: int | numpy.ndarray) -> list[StepCurve]:
+    """Computes the number of particles of each isotope as a function of time.
+
+    Args:
+      events: The events of the simulation.
+      decay_chain: The decay chain of the simulation.
+      num_particles: The number of particles, all of them isotope 0 at time 0,
+        or the number of particles of each isotope at time 0.
+
+    Returns:
+      A StepCurve per isotope, with a step at every event changing its number.
+    """
+    order = _time_order(numpy.asarray(events.time))
+    times = numpy.asarray(events.time, dtype=float)[order]
+    # Each event is a change of -1 for the decaying isotope, and +1 for the
+    # decay target. Interleaving them keeps the changes in time order.
+    isotope = numpy.stack((numpy.asarray(events.from_isotope)[order],
+                           numpy.asarray(events.to_isotope)[order]), axis=1).ravel().astype(numpy.int64)
+    changes = numpy.tile(numpy.array([-1, 1], dtype=numpy.int64), times.size)
+    return _step_curves(decay_chain, isotope, numpy.repeat(times, 2), changes,
+                        _initial_populations(decay_chain, num_particles))
+
+
+def energy_steps(events: EventTable, decay_chain: DecayChain) -> list[StepCurve]:
+    """Computes the cumulative energy released by the decays of each isotope
+    as a function of time.
+
+    Args:
+      events: The events of the simulation.
+      decay_chain: The decay chain of the simulation.
+
+    Returns:
+      A StepCurve per isotope, in MeV, with a step at every decay of the
+      isotope.
+    """
+    order = _time_order(numpy.asarray(events.time))
+    return _step_curves(
+        decay_chain,
+        numpy.asarray(events.from_isotope, dtype=numpy.int64)[order],
+        numpy.asarray(events.time, dtype=float)[order],
+        numpy.asarray(events.energy, dtype=float)[order],
+        numpy.zeros(len(decay_chain.isotopes), dtype=float),
+    )
+
+
+def _binned_cumulative(num_isotopes: int, isotope: numpy.ndarray, times: numpy.ndarray,
+                       changes: numpy.ndarray, grid: numpy.ndarray) -> numpy.ndarray:
+    """Sums the changes of each isotope up to each time of the grid.
+
+    Returns:
+      An array of shape (num_isotopes, len(grid)).
+    """
+    # Changes at time t count for every grid point >= t.
+    bins = numpy.searchsorted(grid, times, side="left")
+    sums = numpy.bincount(isotope * (grid.size + 1) + bins, weights=changes,
+                          minlength=num_isotopes * (grid.size + 1))
+    return numpy.cumsum(sums.reshape(num_isotopes, grid.size + 1), axis=1)[:, :grid.size]
+
+
+def binned_populations(events: EventTable, decay_chain: DecayChain,
+                       num_particles: int | numpy.ndarray, grid: numpy.ndarray) -> numpy.ndarray:
+    """Computes the number of particles of each isotope at the times of a grid.
+
+    Args:
+      events: The events of the simulation.
+      decay_chain: The decay chain of the simulation.
+      num_particles: The number of particles, all of them isotope 0 at time 0,
+        or the number of particles of each isotope at time 0.
+      grid: Increasing times, in seconds.
+
+    Returns:
+      An array of shape (num_isotopes, len(grid)).
+    """
+    n = len(decay_chain.isotopes)
+    grid = numpy.asarray(grid, dtype=float)
+    times = numpy.asarray(events.time, dtype=float)
+    ones = numpy.ones(times.size, dtype=float)
+    decayed = _binned_cumulative(n, numpy.asarray(events.from_isotope, dtype=numpy.int64), times, ones, grid)
+    created = _binned_cumulative(n, numpy.asarray(events.to_isotope, dtype=numpy.int64), times, ones, grid)
+    initial = _initial_populations(decay_chain, num_particles)
+    return (initial[:, numpy.newaxis] + created - decayed).round().astype(numpy.int64)
+
+
+def binned_energy(events: EventTable, decay_chain: DecayChain,
+                  grid: numpy.ndarray) -> numpy.ndarray:
+    """Computes the cumulative energy released by the decays of each isotope at
+    the times of a grid.
+
+    Args:
+      events: The events of the simulation.
+      decay_chain: The decay chain of the simulation.
+      grid: Increasing times, in seconds.
+
+    Returns:
+      An array of shape (num_isotopes, len(grid)), in MeV.
+    """
+    return _binned_cumulative(
+        len(decay_chain.isotopes),
+        numpy.asarray(events.from_isotope, dtype=numpy.int64),
+        numpy.asarray(events.time, dtype=float),
+        numpy.asarray(events.energy, dtype=float),
+        numpy.asarray(grid, dtype=float),
+    )
+
+
+def bin_keys(num_isotopes: int, isotope: numpy.ndarray, times: numpy.ndarray,
+             edges: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns the index of the isotope and bin of each change, isotope *
+    num_bins + bin, for the changes within the bins.
+
+    The bins are [edges[i], edges[i+1]), the last one includes its end. The
+    keys can be counted with numpy.bincount, with minlength num_isotopes *
+    num_bins.
+
+    Args:
+      num_isotopes: The number of isotopes of the decay chain.
+      isotope: The index of the isotope of each change.
+      times: The time of each change, in seconds.
+      edges: The increasing edges of the bins, in seconds.
+
+    Returns:
+      The keys, and the mask of the changes within the bins.
+    """
+    num_bins = edges.size - 1
+    inside = (times >= edges[0]) & (times <= edges[-1])
+    bins = numpy.minimum(numpy.searchsorted(edges, times[inside], side="right") - 1, num_bins - 1)
+    return isotope[inside] * num_bins + bins, inside
+
+
+def binned_rates(events: EventTable, decay_chain: DecayChain,
+                 edges: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Computes the activity and the released power of each isotope, averaged
+    over time bins.
+
+    Args:
+      events: The events of the simulation. For a lumped decay chain, expand
+        them first with reduction.expand_events.
+      decay_chain: The decay chain of the simulation.
+      edges: The increasing edges of the bins, in seconds.
+
+    Returns:
+      The number of decays per second, and the released energy in MeV per
+      second, of each isotope in each bin, both of shape (num_isotopes,
+      len(edges) - 1).
+    """
+    n = len(decay_chain.isotopes)
+    edges = numpy.asarray(edges, dtype=float)
+    keys, inside = bin_keys(n, numpy.asarray(events.from_isotope, dtype=numpy.int64),
+                            numpy.asarray(events.time, dtype=float), edges)
+    shape = (n, edges.size - 1)
+    widths = numpy.diff(edges)
+    decays = numpy.bincount(keys, minlength=n * (edges.size - 1)).reshape(shape)
+    energy = numpy.bincount(keys, weights=numpy.asarray(events.energy, dtype=float)[inside],
+                            minlength=n * (edges.size - 1)).reshape(shape)
+    return decays / widths, energy / widths
@@ -0,0 +1,72 @@
+"""Writes the curves of a simulation on a time grid, as a table.
+
+The program behind `python3 -m pyrademo analyze`.
+"""
+
+import argparse
+import sys
+import numpy
+
+from . import ensemble
+from . import model
+from . import population
+from . import profiling
+
+
+def _parser(prog: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Writes the number of particles and the cumulative released energy of each isotope of a "
+        "simulation on a time grid, as a tab separated table.",
+    )
+    parser.add_argument("-i", "--input", required=True,
+                        help="A simulation, produced by write_raw_events.py. Either the filename of a .sim file, "
+                        "or its base name.")
+    parser.add_argument("--grid-points", type=int, default=1000,
+                        help="The number of points of the time grid, 1000 by default.")
+    parser.add_argument("-o", "--output",
+                        help="The file name of the table. <input base name>-curves.tsv by default.")
+    profiling.add_arguments(parser)
+    return parser
+
+
+def main(argv: list[str], prog: str = "python3 -m pyrademo analyze") -> int:
+    """Runs the program with the arguments argv, and returns its exit status.
+
+    Args:
+      argv: The arguments, without the program name.
+      prog: The name of the program in the help and the error messages.
+    """
+    args = _parser(prog).parse_args(argv)
+    profiler = profiling.from_args(args)
+    if ensemble.has_ensemble(args.input):
+        print("{}: {} is an ensemble, it has no events".format(prog, args.input), file=sys.stderr)
+        return 2
+    if population.has_populations(args.input):
+        with profiler.stage("read"):
+            cfg, history = population.read_populations(args.input)
+        grid = numpy.linspace(0.0, cfg.total_time, num=args.grid_points)
+        with profiler.stage("aggregate"):
+            populations, energy = history.sample(grid)
+    else:
+        with profiler.stage("read"):
+            cfg, events = model.read_event_columns(args.input)
+        profiler.count("events", len(events))
+        grid = numpy.linspace(0.0, cfg.total_time, num=args.grid_points)
+        with profiler.stage("aggregate"):
+            populations, energy = ensemble.bin_events(events, cfg.decay_chain, cfg.initial_populations(), grid)
+
+    output = args.output if args.output is not None else args.input.removesuffix(".sim") + "-curves.tsv"
+    names = [isotope.name for isotope in cfg.decay_chain.isotopes]
+    with profiler.stage("write"):
+        numpy.savetxt(output, numpy.column_stack((grid, populations.T, energy.T)), delimiter="\t",
+                      fmt=["%.6g"] + ["%d"] * len(names) + ["%.6g"] * len(names), comments="",
+                      header="\t".join(["time_s"] + names + [name + "_MeV" for name in names]))
+    profiler.count_bytes([output])
+    profiler.write_report()
+
+    print("{:<12} {:>14} {:>14}".format("isotope", "particles", "energy MeV"))
+    for name, n, e in zip(names, populations[:, -1], energy[:, -1]):
+        print("{:<12} {:>14} {:>14.6g}".format(name, n, e))
+    print("Wrote {}".format(output))
+    return 0
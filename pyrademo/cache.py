@@ -0,0 +1,182 @@
+"""A local on-disk cache of simulation results.
+
+Simulations are deterministic given their config, seed, engine and chunk size,
+so their results can be reused. The cache is keyed by a hash of these, see
+cache_key. Each entry is a directory holding the binary events file and the
+state file of a simulation.
+
+The cache is bounded in size: when storing a new entry would make it larger
+than the limit, the least recently used entries are removed. An entry counts as
+used when it is stored or found by lookup.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from dataclasses import dataclass
+from typing import Final
+
+from .model import SimulationConfig
+from .simulation import ENGINE_VERSION
+
+DEFAULT_MAX_BYTES: Final[int] = 5 << 30
+
+# Files of an entry.
+EVENTS_FILE: Final[str] = "events.bin"
+STATE_FILE: Final[str] = "state"
+_META_FILE: Final[str] = "meta.json"
+
+
+def default_directory() -> str:
+    """Returns the cache directory: $PYRADEMO_CACHE_DIR, or ~/.cache/pyrademo."""
+    directory = os.environ.get("PYRADEMO_CACHE_DIR")
+    if directory:
+        return directory
+    return os.path.join(os.path.expanduser("~"), ".cache", "pyrademo")
+
+
+def cache_key(cfg: SimulationConfig, engine: str, chunk_size: int) -> str:
+    """Returns the key of a simulation.
+
+    Args:
+      cfg: The config of the simulation. Its content_hash covers the decay
+        chain, the number of particles, the total time and the seed.
+      engine: The name of the simulation engine.
+      chunk_size: The number of particles per chunk, which determines the
+        random generators.
+    """
+    key = {
+        "content_hash": cfg.content_hash(),
+        "engine": engine,
+        "chunk_size": chunk_size,
+        "engine_version": ENGINE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def parse_size(s: str) -> int:
+    """Parses a size in bytes, with an optional K, M or G suffix (powers of 1024)."""
+    suffixes = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    s = s.strip().upper().removesuffix("B")
+    if s and s[-1] in suffixes:
+        return int(float(s[:-1]) * suffixes[s[-1]])
+    return int(s)
+
+
+@dataclass
+class CacheEntry:
+    """An entry of the cache.
+
+    Attributes:
+      key: The key of the entry.
+      path: The directory of the entry.
+      size: The size of the files of the entry, in bytes.
+      last_used: The time of the last use, in seconds since the epoch.
+      description: Human readable parameters of the cached simulation.
+    """
+
+    key: str
+    path: str
+    size: int
+    last_used: float
+    description: str
+
+
+class ResultCache:
+    """A size-bounded, least recently used cache of simulation results.
+
+    Attributes:
+      directory: The directory of the cache.
+      max_bytes: The maximum total size of the entries.
+    """
+
+    def __init__(self, directory: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory if directory is not None else default_directory()
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def lookup(self, key: str) -> str | None:
+        """Finds an entry, and marks it used.
+
+        Returns:
+          The directory of the entry, or None if it is not in the cache.
+        """
+        path = self._path(key)
+        if not os.path.exists(os.path.join(path, _META_FILE)):
+            return None
+        os.utime(os.path.join(path, _META_FILE))
+        return path
+
+    def store(self, key: str, cfg: SimulationConfig, engine: str, events_file: str, state_file: str) -> None:
+        """Copies the results of a simulation into the cache, then evicts the
+        least recently used entries, if the cache got too large.
+
+        Args:
+          key: The key of the simulation, see cache_key.
+          cfg: The config of the simulation.
+          engine: The name of the simulation engine.
+          events_file: The binary events file of the simulation.
+          state_file: The state file of the simulation.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # The entry is assembled under a temporary name, so that a concurrent
+        # lookup never sees a partial entry.
+        temporary = self._path("{}.tmp{}".format(key, os.getpid()))
+        os.makedirs(temporary, exist_ok=True)
+        shutil.copyfile(events_file, os.path.join(temporary, EVENTS_FILE))
+        shutil.copyfile(state_file, os.path.join(temporary, STATE_FILE))
+        meta = {
+            "description": "{} particles, {:g} s, seed {}, {} engine".format(
+                cfg.num_particles, cfg.total_time, cfg.seed, engine),
+            "config": cfg.to_dict(),
+        }
+        with open(os.path.join(temporary, _META_FILE), "w") as f:
+            json.dump(meta, f)
+
+        if os.path.exists(self._path(key)):
+            shutil.rmtree(temporary)
+        else:
+            os.rename(temporary, self._path(key))
+        self.prune(self.max_bytes)
+
+    def entries(self) -> list[CacheEntry]:
+        """Returns all the entries, the least recently used first."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for key in os.listdir(self.directory):
+            path = self._path(key)
+            meta_file = os.path.join(path, _META_FILE)
+            if not os.path.exists(meta_file):
+                continue
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            entries.append(CacheEntry(key, path, size, os.path.getmtime(meta_file), meta["description"]))
+        entries.sort(key=lambda entry: entry.last_used)
+        return entries
+
+    def prune(self, max_bytes: int) -> list[CacheEntry]:
+        """Removes the least recently used entries, until the total size is at
+        most max_bytes.
+
+        Returns:
+          The removed entries.
+        """
+        entries = self.entries()
+        total = sum(entry.size for entry in entries)
+        removed = []
+        for entry in entries:
+            if total <= max_bytes:
+                break
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total -= entry.size
+            removed.append(entry)
+        return removed
+
+    def clear(self) -> list[CacheEntry]:
+        """Removes all the entries."""
+        return self.prune(0)
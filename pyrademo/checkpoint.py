@@ -0,0 +1,172 @@
+"""End-of-run particle states, to continue a simulation later.
+
+A simulation stops following a particle, when its next decay is after
+total_time. That next decay is already drawn at that point, so the state of a
+particle is its current isotope, and its pending decay. With the states saved, a
+simulation can be extended to a longer total_time, without simulating the
+already simulated time again.
+
+The .state file starts with a fixed size header:
+
+  magic:           8 bytes, b"PYRADSTA"
+  version:         uint32
+  reserved:        4 bytes, zero
+  num_particles:   uint64
+  time:            float64, the total_time of the simulation in seconds
+
+Then one record follows per particle, in particle order:
+
+  isotope:          uint16, the current isotope
+  next_to_isotope:  uint16, the target of the pending decay
+  next_energy:      float64, the energy of the pending decay, in MeV
+  next_time:        float64, the time of the pending decay, infinity if the
+                    isotope is stable
+
+All the values are little endian. Version 1 stored next_energy as float32, which
+lost precision in the first event of each continued particle. It is still
+read.
+"""
+
+import numpy
+from dataclasses import dataclass
+from typing import Final
+
+MAGIC: Final[bytes] = b"PYRADSTA"
+VERSION: Final[int] = 2
+
+_HEADER_DTYPE: Final[numpy.dtype] = numpy.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("reserved", "<u4"),
+    ("num_particles", "<u8"),
+    ("time", "<f8"),
+])
+
+_RECORD_DTYPE: Final[numpy.dtype] = numpy.dtype([
+    ("isotope", "<u2"),
+    ("next_to_isotope", "<u2"),
+    ("next_energy", "<f8"),
+    ("next_time", "<f8"),
+])
+
+# The record type of each readable version.
+_RECORD_DTYPES: Final[dict[int, numpy.dtype]] = {
+    1: numpy.dtype([
+        ("isotope", "<u2"),
+        ("next_to_isotope", "<u2"),
+        ("next_energy", "<f4"),
+        ("next_time", "<f8"),
+    ]),
+    2: _RECORD_DTYPE,
+}
+
+
+@dataclass
+class ParticleState:
+    """The state of consecutive particles, between two decays.
+
+    For a particle of a stable isotope, next_time is infinity, next_to_isotope
+    is the isotope itself, and next_energy is 0.
+
+    Attributes:
+      isotope: The current isotope of each particle.
+      next_time: The time of the pending decay of each particle, in seconds.
+      next_to_isotope: The target of the pending decay of each particle.
+      next_energy: The energy of the pending decay of each particle, in MeV.
+    """
+
+    isotope: numpy.ndarray
+    next_time: numpy.ndarray
+    next_to_isotope: numpy.ndarray
+    next_energy: numpy.ndarray
+
+    def __len__(self) -> int:
+        return len(self.isotope)
+
+    def slice(self, start: int, stop: int) -> "ParticleState":
+        """Returns the state of the particles in [start, stop), as in-memory
+        arrays."""
+        return ParticleState(
+            isotope=numpy.array(self.isotope[start:stop], dtype=numpy.int64),
+            next_time=numpy.array(self.next_time[start:stop], dtype=float),
+            next_to_isotope=numpy.array(self.next_to_isotope[start:stop], dtype=numpy.int64),
+            next_energy=numpy.array(self.next_energy[start:stop], dtype=float),
+        )
+
+
+class StateWriter:
+    """Writes a .state file incrementally, in chunks of consecutive particles.
+
+    Can be used as a context manager.
+    """
+
+    def __init__(self, file_name: str, time: float) -> None:
+        self.file_name = file_name
+        self.time = time
+        self.num_particles = 0
+        self._f = open(file_name, "wb")
+        self._f.write(self._header())
+
+    def _header(self) -> bytes:
+        header = numpy.zeros(1, dtype=_HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = VERSION
+        header["num_particles"] = self.num_particles
+        header["time"] = self.time
+        return header.tobytes()
+
+    def write(self, state: ParticleState) -> None:
+        """Appends the state of the next particles."""
+        if len(state) > 0 and max(state.isotope.max(), state.next_to_isotope.max()) > numpy.iinfo(numpy.uint16).max:
+            raise ValueError("Too many isotopes for the state file")
+        records = numpy.zeros(len(state), dtype=_RECORD_DTYPE)
+        records["isotope"] = state.isotope
+        records["next_to_isotope"] = state.next_to_isotope
+        records["next_energy"] = state.next_energy
+        records["next_time"] = state.next_time
+        self._f.write(records.tobytes())
+        self.num_particles += len(state)
+
+    def close(self) -> None:
+        """Writes the final header, and closes the file."""
+        self._f.seek(0)
+        self._f.write(self._header())
+        self._f.close()
+
+    def __enter__(self) -> "StateWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def read_state(file_name: str) -> tuple[float, ParticleState]:
+    """Opens a .state file.
+
+    The records are memory mapped read only.
+
+    Returns:
+      The total_time of the simulation the state belongs to, and the state of
+      all the particles.
+    """
+    header = numpy.fromfile(file_name, dtype=_HEADER_DTYPE, count=1)
+    if header.size != 1 or header["magic"][0] != MAGIC:
+        raise ValueError("Not a state file: {}".format(file_name))
+    version = int(header["version"][0])
+    if version not in _RECORD_DTYPES:
+        raise ValueError("Unsupported state file version {} in {}".format(version, file_name))
+    record_dtype = _RECORD_DTYPES[version]
+
+    num_particles = int(header["num_particles"][0])
+    if num_particles == 0:
+        records = numpy.zeros(0, dtype=record_dtype)
+    else:
+        records = numpy.memmap(file_name, dtype=record_dtype, mode="r", offset=_HEADER_DTYPE.itemsize,
+                               shape=(num_particles,))
+    state = ParticleState(
+        isotope=records["isotope"],
+        next_time=records["next_time"],
+        next_to_isotope=records["next_to_isotope"],
+        next_energy=records["next_energy"],
+    )
+    return float(header["time"][0]), state
@@ -0,0 +1,129 @@
+"""The pyrademo command, python3 -m pyrademo, with subcommands.
+
+  simulate  Runs a simulation, like write_raw_events.py, see simulate.py.
+  plot      Plots a simulation, like plot_all.py, see plot.py.
+  analyze   Writes the curves of a simulation on a time grid, as a table, see
+            analyze.py.
+  run       Simulates, aggregates and plots in one process, in memory.
+
+Starting Python takes a few tens of milliseconds, importing NumPy about a
+hundred more, and matplotlib several hundred. This module only imports the
+standard library, and each subcommand imports what it needs when it runs, so
+`--help` answers right away, and only the subcommands that plot import
+matplotlib. The startup times are measured by the startup group of
+benchmarks/run_benchmarks.py.
+"""
+
+import argparse
+import importlib
+import sys
+
+# The subcommands with a module of their own, which parses all their options.
+_PROGRAMS = {
+    "simulate": ("simulate", "Runs a simulation, and writes its results, like write_raw_events.py."),
+    "plot": ("plot", "Plots all the figures of a simulation, like plot_all.py."),
+    "analyze": ("analyze", "Writes the number of particles and the cumulative released energy of each isotope of "
+                "a simulation on a time grid, as a tab separated table."),
+}
+
+
+def _run(args: argparse.Namespace) -> int:
+    import numpy
+    from . import profiling
+    from . import reduction
+    from . import sweep
+    from .decaychain import read_decay_chain
+    from .timeparser import parse_time_str
+
+    profiler = profiling.from_args(args)
+    with profiler.stage("read_decay_chain"):
+        decay_chain = read_decay_chain(args.decay_chain)
+    if args.lump_threshold is not None:
+        decay_chain = reduction.lump_short_lived(decay_chain, parse_time_str(args.lump_threshold))
+
+    if not args.show:
+        import matplotlib
+        matplotlib.use("Agg")
+    point = sweep.SweepPoint(0, args.num_particles, parse_time_str(args.total_time), args.output_base)
+    options = sweep.SweepOptions(
+        engine=args.engine,
+        seed=args.seed if args.seed is not None else numpy.random.SeedSequence().entropy,
+        ymax=args.ymax,
+        energy_ymax=args.energy_ymax,
+        theoretical=args.example_theoretical_curve,
+        write_events=args.write_events,
+    )
+    with profiler.stage("run"):
+        result = sweep.run_point(decay_chain, point, options, close_figures=not args.show)
+    profiler.count("events", result.num_events)
+    profiler.count_bytes(result.figures)
+    profiler.write_report()
+
+    print("{} events, simulated in {:.2f} s, aggregated in {:.2f} s, plotted in {:.2f} s".format(
+        result.num_events, result.simulate_seconds, result.aggregate_seconds, result.plot_seconds))
+    for file_name in result.figures:
+        print("Wrote {}".format(file_name))
+    if args.show:
+        import matplotlib.pyplot as plt
+        plt.show()
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    from . import profiling
+    from .timeparser import UNITS
+    from .timeparser import parse_count
+
+    parser = argparse.ArgumentParser(
+        prog="python3 -m pyrademo",
+        description="Simulates radioactive decay chains, and plots the results.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, (_, description) in _PROGRAMS.items():
+        subparsers.add_parser(command, help=description + " See `{} --help` for its options.".format(command))
+
+    run_parser = subparsers.add_parser(
+        "run", help="Simulates, aggregates and plots in one process, without writing events.")
+    run_parser.add_argument("-o", "--output_base", required=True,
+                            help="Basename of the figures, and of the results with --write-events.")
+    run_parser.add_argument("-n", "--num-particles", required=True, type=parse_count,
+                            help="The number of particles. Scientific notation, like 1e15, is accepted.")
+    run_parser.add_argument("--decay-chain", required=True,
+                            help="File name of a decay chain file.")
+    run_parser.add_argument("--total-time", required=True,
+                            help="The total time for the simulation. A string in the form of `<number> <unit>`. "
+                            "Available units: {}".format(UNITS))
+    run_parser.add_argument("--lump-threshold",
+                            help="Lump the isotopes with a shorter half life than this into the decays of their "
+                            "parents, see write_raw_events.py.")
+    run_parser.add_argument("--engine", choices=["batch", "particle", "population"], default="batch",
+                            help="The simulation engine, see write_raw_events.py.")
+    run_parser.add_argument("--seed", type=int, default=None,
+                            help="The seed of the random generator. A random seed if not given.")
+    run_parser.add_argument("--ymax", type=int, action="append", default=[],
+                            help="The maximum of the y scale of an additional figure of the number of particles. "
+                            "Can be given multiple times.")
+    run_parser.add_argument("--energy-ymax", type=int, action="append", default=[],
+                            help="The maximum of the y scale of an additional figure of the released energy. Can be "
+                            "given multiple times.")
+    run_parser.add_argument("-e", "--example-theoretical-curve", action="store_true",
+                            help="Also plot the solution of the Bateman equations on the figures of the number of "
+                            "particles.")
+    run_parser.add_argument("--write-events", action="store_true",
+                            help="Also write the .sim and .events.bin files, to plot them again later.")
+    run_parser.add_argument("--show", action="store_true",
+                            help="Show the figures, besides saving them.")
+    profiling.add_arguments(run_parser)
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    """Runs the pyrademo command with the arguments argv, and returns its exit
+    status."""
+    if argv and argv[0] in _PROGRAMS:
+        # The options, including --help, are parsed by the program itself.
+        program = importlib.import_module("." + _PROGRAMS[argv[0]][0], __package__)
+        return program.main(argv[1:], prog="python3 -m pyrademo " + argv[0])
+
+    args = _parser().parse_args(argv)
+    return _run(args)
@@ -11,84 +11,105 @@ from .timeparser import parse_time
 
 
 class _DecayType(Enum):
-    """An enum representing the decay type."""
-    ALPHA = 1
-    BETA = 2
-
-
-class _ParsedLine:
-    """A class representing directly a line in the textual representation of
-       a decay chain.
-       
-    Attributes:
-      from_name: The human name of the decaying isotope.
-      to_name: The human name of the decay target.
-      decay_type: A _DecayType enum value, describing if it is alpha or beta decay.
-      probability: In case there are multiple decay options, the probability of
-        this one happening.
-      half_time: The half time parameter of the decay.   
-    """
+    """An enum representing the decay type, with the mode name of Decay as
+    value."""
+    ALPHA = "alpha"
+    BETA = "beta"
+    BETA_PLUS = "beta+"
+    EC = "ec"
+    IT = "it"
+
+
+# The spellings of the decay types in decay chain files.
+_DECAY_TYPE_NAMES: Final[dict[str, _DecayType]] = {
+    "alpha": _DecayType.ALPHA,
+    "beta": _DecayType.BETA,
+    "beta-": _DecayType.BETA,
+    "beta+": _DecayType.BETA_PLUS,
+    "ec": _DecayType.EC,
+    "it": _DecayType.IT,
+}
 
-    from_name: str
-    to_name: str
-    decay_type: _DecayType
-    probability: float
-    half_time: float
-    energy: float
-
-    def __init__(self, line: str):
-        parts = line.split()
-        self.from_name = parts[0]
-        self.to_name = parts[1]
-        self.decay_type = _DecayType[parts[2].upper()]
-        self.probability = float(parts[3])
-        self.half_time = parse_time(float(parts[4]), parts[5])
-        self.energy = float(parts[6])
-
-
-def _ensure_isotope(decay_chain: DecayChain, name: str) -> int:
-    """Ensures, that an isotope with the given name exists, and
-    returns its index."""
-    for index, isotope in enumerate(decay_chain.isotopes):
-        if isotope.name == name:
-            return index
-    new_index = len(decay_chain.isotopes)
-    decay_chain.isotopes.append(Isotope(new_index, name))
-    return new_index
+
+def _parse_line(line: str) -> tuple[str, str, _DecayType, float, float, float]:
+    """Parses a line of a decay chain file.
+
+    Returns:
+      The name of the decaying isotope, the name of the decay target, the
+      decay type, the probability of the decay in percent, the half time in
+      seconds, and the released energy in MeV.
+
+    Raises:
+      ValueError: If the line is malformed. read_decay_chain adds the file name
+        and the line number to the message.
+    """
+    parts = line.split()
+    if len(parts) < 7:
+        raise ValueError("expected 7 fields, got {}".format(len(parts)))
+    decay_type = _DECAY_TYPE_NAMES.get(parts[2].lower())
+    if decay_type is None:
+        raise ValueError("unknown decay type: {}".format(parts[2]))
+    return parts[0], parts[1], decay_type, float(parts[3]), parse_time(float(parts[4]), parts[5]), float(parts[6])
 
 
 _LN2: Final[float] = log(2)
 
 
-def read_decay_chain(file_name: str) -> DecayChain:
+def read_decay_chain(file_name: str, start: list[str] | None = None) -> DecayChain:
     """Parses a text file describing a decay chain.
 
+    Each line describes a decay, with the names of the decaying isotope and
+    the decay target, the decay type, the probability in percent, the half
+    time and its unit, and the released energy in MeV. Lines starting with #
+    and empty lines are skipped. The isotopes are numbered in the order they
+    appear, and found by name with a dict, so files of whole nuclide tables,
+    with thousands of isotopes, are read in linear time.
+
     Args:
       file_name: the file to parse.
+      start: The names of the isotopes the particles start from. If given,
+        only these isotopes, and the isotopes they decay to, directly or
+        indirectly, are kept. The start isotopes get the first indices, in the
+        given order, the others keep the order of the file.
+
+    An isotope can have any number of decays, with probabilities adding up to
+    100, and the same half time.
 
     Returns:
-      The DecayChain object, representing the file.
+      The DecayChain object, representing the file, already compiled.
+
+    Raises:
+      ValueError: If a line is malformed, the message starts with the file
+        name and the line number. If the decay chain is not valid, see
+        DecayChain.validate, or a start isotope is not in the file.
     """
-    decay_chain = DecayChain()
     with open(file_name, "r") as f:
-        while True:
-            line = f.readline()
-            if not line:
-                break
-            line = line.strip()
-            if line.startswith("#"):
-                continue
-            parsed_line = _ParsedLine(line)
-            from_index = _ensure_isotope(decay_chain, parsed_line.from_name)
-            to_index = _ensure_isotope(decay_chain, parsed_line.to_name)
-            d = Decay(
-                rate=_LN2 / parsed_line.half_time,
-                probability=parsed_line.probability,
-                to_isotope=to_index,
-                energy=parsed_line.energy,
-            )
-            if parsed_line.decay_type == _DecayType.ALPHA:
-                decay_chain.isotopes[from_index].alpha_decay = d
-            else:
-                decay_chain.isotopes[from_index].beta_decay = d
+        lines = f.read().splitlines()
+
+    indices: dict[str, int] = {}
+    isotopes: list[Isotope] = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            from_name, to_name, decay_type, probability, half_time, energy = _parse_line(line)
+        except ValueError as e:
+            raise ValueError("{}:{}: {}".format(file_name, number, e)) from e
+        for name in (from_name, to_name):
+            if name not in indices:
+                indices[name] = len(isotopes)
+                isotopes.append(Isotope(len(isotopes), name))
+        isotopes[indices[from_name]].decays.append(Decay(
+            rate=_LN2 / half_time,
+            probability=probability,
+            to_isotope=indices[to_name],
+            energy=energy,
+            mode=decay_type.value,
+        ))
+
+    decay_chain = DecayChain(isotopes)
+    if start is not None:
+        decay_chain = decay_chain.reachable_from([decay_chain.isotope_index(name) for name in start])
+    decay_chain.compiled()
     return decay_chain
@@ -0,0 +1,439 @@
+"""Statistics over replicate simulations, reduced while they run.
+
+To show the statistical spread of a simulation, the same configuration is run
+R times, with independent random generators. Instead of keeping the events of
+the replicates, the population and the cumulative released energy of each
+isotope are sampled on a shared time grid as soon as a replicate finishes, and
+folded into running statistics:
+
+*   the mean and the variance, with Welford's algorithm,
+*   quantiles, like the median and the 5% and 95% quantiles, with the P²
+    algorithm of Jain and Chlamtac (1985). It keeps five markers per quantile
+    and grid point, and moves them towards the positions of the quantile as
+    values arrive. It is an estimate, which is rough with few replicates, and
+    exact with up to five.
+
+The memory use depends on the number of isotopes, grid points and quantiles,
+but not on the number of replicates, and with the chunked particle engines,
+not on the number of particles either.
+
+The results are written to a .ensemble.npz file next to the .sim file, which
+the plot scripts draw as mean ± σ bands.
+"""
+
+from __future__ import annotations
+
+import collections
+import os
+import numpy
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Final
+
+from . import analysis
+from . import population
+from . import reduction
+from . import simulation
+from .analysis import StepCurve
+from .model import DecayChain
+from .model import EventTable
+from .model import SimulationConfig
+
+ENSEMBLE_SUFFIX: Final[str] = ".ensemble.npz"
+
+DEFAULT_QUANTILES: Final[tuple[float, ...]] = (0.05, 0.5, 0.95)
+
+
+class RunningMoments:
+    """The running mean and variance of arrays, with Welford's algorithm.
+
+    Attributes:
+      count: The number of arrays added so far.
+      mean: The mean of the arrays added so far.
+    """
+
+    def __init__(self, shape: tuple[int, ...]) -> None:
+        self.count = 0
+        self.mean = numpy.zeros(shape, dtype=float)
+        self._m2 = numpy.zeros(shape, dtype=float)
+
+    def add(self, x: numpy.ndarray) -> None:
+        """Adds an array to the statistics."""
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    def variance(self) -> numpy.ndarray:
+        """Returns the sample variance, 0 with fewer than two arrays."""
+        if self.count < 2:
+            return numpy.zeros_like(self.mean)
+        return self._m2 / (self.count - 1)
+
+
+class P2Quantiles:
+    """Running estimates of quantiles of arrays, elementwise, with the P²
+    algorithm.
+
+    The first five arrays are kept, and give exact quantiles. From then on,
+    each quantile has five markers per element: the minimum, the maximum, the
+    quantile, and two in between, with their heights and positions. Each new
+    value shifts the positions of the markers above it, and the inner markers
+    are moved by one position towards their desired positions, with piecewise
+    parabolic interpolation of their heights.
+
+    Attributes:
+      levels: The quantiles to estimate, between 0 and 1.
+      count: The number of arrays added so far.
+    """
+
+    def __init__(self, shape: tuple[int, ...], levels: tuple[float, ...]) -> None:
+        self.levels = tuple(levels)
+        self.count = 0
+        self._first = numpy.zeros((5,) + tuple(shape), dtype=float)
+        # The heights and the positions of the markers, per level.
+        self._heights = numpy.zeros((len(self.levels), 5) + tuple(shape), dtype=float)
+        self._positions = numpy.zeros((len(self.levels), 5) + tuple(shape), dtype=float)
+
+    def add(self, x: numpy.ndarray) -> None:
+        """Adds an array to the statistics."""
+        if self.count < 5:
+            self._first[self.count] = x
+            self.count += 1
+            if self.count == 5:
+                self._first.sort(axis=0)
+                self._heights[:] = self._first
+                self._positions[:] = numpy.arange(1.0, 6.0).reshape((5,) + (1,) * x.ndim)
+            return
+        self.count += 1
+        for heights, positions, p in zip(self._heights, self._positions, self.levels):
+            self._add(heights, positions, p, x)
+
+    def _add(self, q: numpy.ndarray, n: numpy.ndarray, p: float, x: numpy.ndarray) -> None:
+        """Adds x to the markers of one quantile, with heights q and positions
+        n, in place."""
+        numpy.minimum(q[0], x, out=q[0])
+        numpy.maximum(q[4], x, out=q[4])
+        # The cell of x, between the markers k and k+1.
+        k = (x >= q[1]).astype(int) + (x >= q[2]) + (x >= q[3])
+        for i in range(1, 5):
+            n[i] += i > k
+        desired = 1.0 + (self.count - 1) * numpy.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+
+        for i in range(1, 4):
+            d = desired[i] - n[i]
+            up = (d >= 1) & (n[i + 1] - n[i] > 1)
+            down = (d <= -1) & (n[i - 1] - n[i] < -1)
+            step = up.astype(float) - down
+            if not step.any():
+                continue
+            parabolic = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+            linear = numpy.where(up,
+                                 q[i] + (q[i + 1] - q[i]) / (n[i + 1] - n[i]),
+                                 q[i] - (q[i - 1] - q[i]) / (n[i - 1] - n[i]))
+            monotone = (q[i - 1] < parabolic) & (parabolic < q[i + 1])
+            moved = up | down
+            q[i] = numpy.where(moved, numpy.where(monotone, parabolic, linear), q[i])
+            n[i] += step
+
+    def quantiles(self) -> numpy.ndarray:
+        """Returns the estimates of the quantiles, with the levels along the
+        first axis.
+
+        Raises:
+          ValueError: If no array was added.
+        """
+        if self.count == 0:
+            raise ValueError("No values to compute quantiles of")
+        if self.count < 5:
+            return numpy.quantile(self._first[:self.count], self.levels, axis=0)
+        if self.count == 5:
+            return numpy.quantile(self._first, self.levels, axis=0)
+        return self._heights[:, 2].copy()
+
+
+@dataclass
+class EnsembleStatistics:
+    """The statistics of the replicates of a simulation on a time grid.
+
+    Attributes:
+      grid: The times of the grid, in seconds, shape (G,).
+      num_replicates: The number of replicates.
+      levels: The levels of the quantiles, between 0 and 1, shape (L,).
+      population_mean: The mean number of atoms of each isotope, shape
+        (num_isotopes, G).
+      population_std: The standard deviation of the number of atoms, shape
+        (num_isotopes, G).
+      population_quantiles: The quantiles of the number of atoms, shape
+        (L, num_isotopes, G).
+      energy_mean: The mean cumulative energy released by the decays of each
+        isotope, in MeV, shape (num_isotopes, G).
+      energy_std: The standard deviation of the released energy.
+      energy_quantiles: The quantiles of the released energy, shape
+        (L, num_isotopes, G).
+    """
+
+    grid: numpy.ndarray
+    num_replicates: int
+    levels: numpy.ndarray
+    population_mean: numpy.ndarray
+    population_std: numpy.ndarray
+    population_quantiles: numpy.ndarray
+    energy_mean: numpy.ndarray
+    energy_std: numpy.ndarray
+    energy_quantiles: numpy.ndarray
+
+    def bands(self, decay_chain: DecayChain, quantity: str,
+              kind: str = "sigma") -> tuple[list[StepCurve], list[tuple[numpy.ndarray, numpy.ndarray]]]:
+        """Returns the central curves and the bands of each isotope, to plot.
+
+        Args:
+          decay_chain: The decay chain of the simulation.
+          quantity: "population" or "energy".
+          kind: "sigma" for the mean and the band of mean ± σ, or "quantile"
+            for the median, or the middle level, and the band between the
+            lowest and the highest level.
+
+        Returns:
+          A curve per isotope, and the lower and upper edges of its band.
+        """
+        if quantity not in ("population", "energy"):
+            raise ValueError("Unknown quantity: {}".format(quantity))
+        if kind == "sigma":
+            center = getattr(self, quantity + "_mean")
+            std = getattr(self, quantity + "_std")
+            lower, upper = center - std, center + std
+        elif kind == "quantile":
+            quantiles = getattr(self, quantity + "_quantiles")
+            center = quantiles[len(self.levels) // 2]
+            lower, upper = quantiles[0], quantiles[-1]
+        else:
+            raise ValueError("Unknown kind of band: {}".format(kind))
+        curves = [StepCurve(isotope.name, self.grid, center[isotope.index]) for isotope in decay_chain.isotopes]
+        return curves, [(lower[isotope.index], upper[isotope.index]) for isotope in decay_chain.isotopes]
+
+    def write_file(self, file_name: str) -> None:
+        """Writes the statistics to a .npz file."""
+        # Writing to a file object keeps numpy.savez from appending .npz.
+        with open(file_name, "wb") as f:
+            numpy.savez(f, grid=self.grid, num_replicates=self.num_replicates, levels=self.levels,
+                        population_mean=self.population_mean, population_std=self.population_std,
+                        population_quantiles=self.population_quantiles, energy_mean=self.energy_mean,
+                        energy_std=self.energy_std, energy_quantiles=self.energy_quantiles)
+
+    @staticmethod
+    def from_file(file_name: str) -> EnsembleStatistics:
+        """The inverse of write_file."""
+        with numpy.load(file_name) as data:
+            return EnsembleStatistics(
+                grid=data["grid"],
+                num_replicates=int(data["num_replicates"]),
+                levels=data["levels"],
+                population_mean=data["population_mean"],
+                population_std=data["population_std"],
+                population_quantiles=data["population_quantiles"],
+                energy_mean=data["energy_mean"],
+                energy_std=data["energy_std"],
+                energy_quantiles=data["energy_quantiles"],
+            )
+
+
+class EnsembleAccumulator:
+    """Folds the binned results of replicates into running statistics.
+
+    Attributes:
+      grid: The times of the grid, in seconds.
+      levels: The levels of the quantiles.
+    """
+
+    def __init__(self, num_isotopes: int, grid: numpy.ndarray,
+                 levels: tuple[float, ...] = DEFAULT_QUANTILES) -> None:
+        self.grid = grid
+        self.levels = tuple(levels)
+        shape = (num_isotopes, grid.size)
+        self._population_moments = RunningMoments(shape)
+        self._population_quantiles = P2Quantiles(shape, self.levels)
+        self._energy_moments = RunningMoments(shape)
+        self._energy_quantiles = P2Quantiles(shape, self.levels)
+
+    @property
+    def num_replicates(self) -> int:
+        return self._population_moments.count
+
+    def add(self, populations: numpy.ndarray, energy: numpy.ndarray) -> None:
+        """Adds the populations and the released energy of a replicate, both of
+        shape (num_isotopes, G)."""
+        populations = numpy.asarray(populations, dtype=float)
+        energy = numpy.asarray(energy, dtype=float)
+        self._population_moments.add(populations)
+        self._population_quantiles.add(populations)
+        self._energy_moments.add(energy)
+        self._energy_quantiles.add(energy)
+
+    def statistics(self) -> EnsembleStatistics:
+        """Returns the statistics of the replicates added so far."""
+        return EnsembleStatistics(
+            grid=self.grid,
+            num_replicates=self.num_replicates,
+            levels=numpy.array(self.levels, dtype=float),
+            population_mean=self._population_moments.mean.copy(),
+            population_std=numpy.sqrt(self._population_moments.variance()),
+            population_quantiles=self._population_quantiles.quantiles(),
+            energy_mean=self._energy_moments.mean.copy(),
+            energy_std=numpy.sqrt(self._energy_moments.variance()),
+            energy_quantiles=self._energy_quantiles.quantiles(),
+        )
+
+
+def ensemble_file_name(file_name: str) -> str:
+    """Returns the name of the .ensemble.npz file of a simulation, given the
+    name of its .sim file or its base name."""
+    return file_name.removesuffix(".sim") + ENSEMBLE_SUFFIX
+
+
+def read_ensemble(file_name: str) -> tuple[SimulationConfig, EnsembleStatistics]:
+    """Reads the statistics of an ensemble of replicates.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the ensemble.
+
+    Returns:
+      The config of the replicates, and their EnsembleStatistics.
+    """
+    return SimulationConfig.from_file(file_name), EnsembleStatistics.from_file(ensemble_file_name(file_name))
+
+
+def has_ensemble(file_name: str) -> bool:
+    """Returns whether a simulation is an ensemble of replicates."""
+    return os.path.exists(ensemble_file_name(file_name))
+
+
+def replicate_seeds(seed: int, num_replicates: int) -> Iterator[numpy.random.SeedSequence]:
+    """Returns the seeds of the replicates, the children of a
+    numpy.random.SeedSequence created from seed, created one by one."""
+    for r in range(num_replicates):
+        yield numpy.random.SeedSequence(seed, spawn_key=(r,))
+
+
+# The simulators of the engines following single particles.
+SIMULATORS: Final[dict[str, type[simulation.SimulationBase]]] = {
+    "batch": simulation.BatchSimulator,
+    "particle": simulation.RawSimulator,
+}
+
+
+def bin_events(events: EventTable, decay_chain: DecayChain, num_particles: int | numpy.ndarray,
+               grid: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Returns the number of particles and the cumulative released energy of
+    each isotope at the times of a grid, both of shape (num_isotopes,
+    len(grid)).
+
+    num_particles is the number of particles, all of them isotope 0 at time 0,
+    or the number of particles of each isotope at time 0, like
+    SimulationConfig.initial_populations. The events can be those of some of
+    the particles, like a chunk, then num_particles counts those particles,
+    and the results of the chunks add up to the results of the simulation.
+    """
+    populations = analysis.binned_populations(events, decay_chain, num_particles, grid)
+    # The energy of lumped isotopes is attributed to them, not to their
+    # parents.
+    energy = analysis.binned_energy(reduction.expand_events(events, decay_chain), decay_chain, grid)
+    return populations, energy
+
+
+# The config, engine, grid and chunk size of a worker process, set up by
+# _init_worker.
+_worker_cfg: SimulationConfig | None = None
+_worker_engine: str = "batch"
+_worker_grid: numpy.ndarray | None = None
+_worker_chunk_size: int = 0
+
+
+def _init_worker(cfg: SimulationConfig, engine: str, grid: numpy.ndarray, chunk_size: int) -> None:
+    global _worker_cfg, _worker_engine, _worker_grid, _worker_chunk_size
+    _worker_cfg = cfg
+    _worker_engine = engine
+    _worker_grid = grid
+    _worker_chunk_size = chunk_size
+
+
+def _run_replicate(seed: numpy.random.SeedSequence) -> tuple[numpy.ndarray, numpy.ndarray, int]:
+    """Simulates one replicate in a worker process, and samples it on the grid.
+
+    Returns:
+      The populations and the released energy of each isotope on the grid, and
+      the number of events, or of time steps of the population engine.
+    """
+    cfg, grid = _worker_cfg, _worker_grid
+    rng = numpy.random.default_rng(seed)
+    if _worker_engine == "population":
+        history = population.PopulationSimulator(cfg, rng).simulate()
+        populations, energy = history.sample(grid)
+        return populations, energy, history.times.size - 1
+
+    simulator = SIMULATORS[_worker_engine](cfg, rng)
+    n = len(cfg.decay_chain.isotopes)
+    populations = numpy.zeros((n, grid.size), dtype=numpy.int64)
+    energy = numpy.zeros((n, grid.size), dtype=float)
+    num_events = 0
+    start = 0
+    for events, _ in simulator.simulate_chunks(_worker_chunk_size):
+        stop = min(start + _worker_chunk_size, cfg.num_particles)
+        chunk_populations, chunk_energy = bin_events(events, cfg.decay_chain,
+                                                     cfg.initial_populations(start, stop), grid)
+        populations += chunk_populations
+        energy += chunk_energy
+        num_events += len(events)
+        start = stop
+    return populations, energy, num_events
+
+
+def simulate_replicates(cfg: SimulationConfig, engine: str, num_replicates: int, grid: numpy.ndarray,
+                        workers: int = 1,
+                        chunk_size: int = 100000) -> Iterator[tuple[numpy.ndarray, numpy.ndarray, int]]:
+    """Runs the replicates of a simulation, and samples each on a grid.
+
+    The random generator of replicate r is seeded with the r-th child of a
+    numpy.random.SeedSequence created from cfg.seed, so the results do not
+    depend on the number of workers.
+
+    Args:
+      cfg: The config of the replicates. cfg.seed must be set.
+      engine: The simulation engine, batch, particle or population.
+      num_replicates: The number of replicates.
+      grid: Increasing times, in seconds.
+      workers: The number of worker processes. With 1 worker, the replicates
+        are run in the current process.
+      chunk_size: The number of particles simulated at once by the particle
+        engines.
+
+    Yields:
+      The populations and the released energy of each isotope on the grid,
+      both of shape (num_isotopes, len(grid)), and the number of events, of
+      each replicate, in replicate order.
+    """
+    if cfg.seed is None:
+        raise ValueError("The replicates of an ensemble need a seed")
+    if engine != "population" and engine not in SIMULATORS:
+        raise ValueError("Unknown engine: {}".format(engine))
+    seeds = replicate_seeds(cfg.seed, num_replicates)
+    if workers == 1:
+        _init_worker(cfg, engine, grid, chunk_size)
+        for seed in seeds:
+            yield _run_replicate(seed)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cfg, engine, grid, chunk_size)) as pool:
+        # Only a limited number of replicates are in flight, so the memory use
+        # does not grow with the number of replicates.
+        pending: collections.deque = collections.deque()
+        for seed in seeds:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_run_replicate, seed))
+        while pending:
+            yield pending.popleft().result()
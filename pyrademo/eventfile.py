@@ -0,0 +1,233 @@
+"""A binary, columnar file format for decay events.
+
+The text format written by SimulationResults.write_file needs to be parsed line
+by line. This module implements a binary alternative, which can be opened with
+numpy.memmap without any parsing.
+
+The file starts with a fixed size header:
+
+  magic:           8 bytes, b"PYRADEVT"
+  version:         uint32
+  isotope_size:    uint32, the size of an isotope index in bytes, 1 or 2
+  num_events:      uint64
+  reserved:        8 bytes, zero
+
+After the header the columns follow, each one holding num_events values, in
+this order:
+
+  particle:        int32
+  from_isotope:    uint8 or uint16, see isotope_size
+  to_isotope:      uint8 or uint16, see isotope_size
+  time:            float64, seconds
+  energy:          float32, MeV
+
+Every column starts at an offset, which is a multiple of 8. All the values are
+little endian.
+"""
+
+import os
+import shutil
+import numpy
+from typing import Final
+
+MAGIC: Final[bytes] = b"PYRADEVT"
+VERSION: Final[int] = 1
+
+_HEADER_DTYPE: Final[numpy.dtype] = numpy.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("isotope_size", "<u4"),
+    ("num_events", "<u8"),
+    ("reserved", "<u8"),
+])
+
+_COPY_BUFFER_SIZE: Final[int] = 1 << 20
+_COPY_ROWS: Final[int] = 1 << 20
+
+_ISOTOPE_DTYPES: Final[dict[int, numpy.dtype]] = {
+    1: numpy.dtype("<u1"),
+    2: numpy.dtype("<u2"),
+}
+
+
+def _column_dtypes(isotope_size: int) -> list[tuple[str, numpy.dtype]]:
+    """Returns the names and types of the columns, in file order."""
+    isotope_dtype = _ISOTOPE_DTYPES[isotope_size]
+    return [
+        ("particle", numpy.dtype("<i4")),
+        ("from_isotope", isotope_dtype),
+        ("to_isotope", isotope_dtype),
+        ("time", numpy.dtype("<f8")),
+        ("energy", numpy.dtype("<f4")),
+    ]
+
+
+def _align(offset: int) -> int:
+    """Rounds up an offset to the next multiple of 8."""
+    return (offset + 7) // 8 * 8
+
+
+def _column_offsets(isotope_size: int, num_events: int) -> list[tuple[str, numpy.dtype, int]]:
+    """Returns the name, type and file offset of each column."""
+    layout = []
+    offset = _HEADER_DTYPE.itemsize
+    for name, dtype in _column_dtypes(isotope_size):
+        layout.append((name, dtype, offset))
+        offset = _align(offset + dtype.itemsize * num_events)
+    return layout
+
+
+def isotope_size_for(num_isotopes: int) -> int:
+    """Returns the number of bytes needed to store an isotope index."""
+    if num_isotopes <= 1 << 8:
+        return 1
+    if num_isotopes <= 1 << 16:
+        return 2
+    raise ValueError("Too many isotopes for the binary event format: {}".format(num_isotopes))
+
+
+def _check_particles(particle: numpy.ndarray) -> None:
+    """Raises a ValueError if the particle indices do not fit into int32."""
+    if particle.size > 0 and particle.max() > numpy.iinfo(numpy.int32).max:
+        raise ValueError("Too many particles for the binary event format: {}".format(particle.max() + 1))
+
+
+def _header(isotope_size: int, num_events: int) -> bytes:
+    """Returns the header of a binary event file."""
+    header = numpy.zeros(1, dtype=_HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["isotope_size"] = isotope_size
+    header["num_events"] = num_events
+    return header.tobytes()
+
+
+def write_events(file_name: str, columns: dict[str, numpy.ndarray], num_isotopes: int) -> None:
+    """Writes events to a binary event file.
+
+    Args:
+      file_name: The name of the file to write.
+      columns: A model.EventTable, or a dict of NumPy arrays, one for each
+        field of DecayEvent.
+      num_isotopes: The number of isotopes in the decay chain. Determines the
+        size of the isotope columns.
+    """
+    isotope_size = isotope_size_for(num_isotopes)
+    num_events = len(columns["particle"])
+    _check_particles(numpy.asarray(columns["particle"]))
+
+    with open(file_name, "wb") as f:
+        f.write(_header(isotope_size, num_events))
+        for name, dtype, offset in _column_offsets(isotope_size, num_events):
+            f.write(b"\0" * (offset - f.tell()))
+            f.write(numpy.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+
+
+def _read_header(file_name: str) -> numpy.ndarray:
+    """Reads and validates the header of a binary event file."""
+    header = numpy.fromfile(file_name, dtype=_HEADER_DTYPE, count=1)
+    if header.size != 1 or header["magic"][0] != MAGIC:
+        raise ValueError("Not a binary event file: {}".format(file_name))
+    if header["version"][0] != VERSION:
+        raise ValueError("Unsupported binary event file version {} in {}".format(header["version"][0], file_name))
+    return header[0]
+
+
+def read_events(file_name: str) -> dict[str, numpy.ndarray]:
+    """Opens a binary event file.
+
+    The columns are memory mapped read only, so opening is instant, and the
+    data is only read from the disk when it is accessed.
+
+    Args:
+      file_name: The name of the file to read.
+
+    Returns:
+      A dict of NumPy arrays, one for each field of DecayEvent.
+    """
+    header = _read_header(file_name)
+    num_events = int(header["num_events"])
+    columns: dict[str, numpy.ndarray] = {}
+    for name, dtype, offset in _column_offsets(int(header["isotope_size"]), num_events):
+        if num_events == 0:
+            columns[name] = numpy.zeros(0, dtype=dtype)
+        else:
+            columns[name] = numpy.memmap(file_name, dtype=dtype, mode="r", offset=offset, shape=(num_events,))
+    return columns
+
+
+class EventWriter:
+    """Writes a binary event file incrementally, in chunks of events.
+
+    Since the number of events is only known at the end, each column is first
+    written to its own temporary file next to the output, and the final file is
+    assembled from them by close(). The memory use does not depend on the total
+    number of events.
+
+    Can be used as a context manager. If the context exits with an exception,
+    the partial output is removed.
+    """
+
+    def __init__(self, file_name: str, num_isotopes: int, append: bool = False) -> None:
+        """Opens the writer.
+
+        Args:
+          file_name: The name of the file to write.
+          num_isotopes: The number of isotopes in the decay chain.
+          append: If True, the new events are appended to the events already
+            in the file.
+        """
+        self.file_name = file_name
+        self.isotope_size = isotope_size_for(num_isotopes)
+        self.num_events = 0
+        self._parts = {
+            name: open(self._part_file_name(name), "wb")
+            for name, _ in _column_dtypes(self.isotope_size)
+        }
+        if append:
+            existing = read_events(file_name)
+            num_existing = len(existing["particle"])
+            for start in range(0, num_existing, _COPY_ROWS):
+                self.write({name: column[start:start + _COPY_ROWS] for name, column in existing.items()})
+
+    def _part_file_name(self, column: str) -> str:
+        return "{}.{}.part".format(self.file_name, column)
+
+    def write(self, columns: dict[str, numpy.ndarray]) -> None:
+        """Appends a chunk of events, given as a model.EventTable, or a dict of
+        NumPy arrays, one for each field of DecayEvent."""
+        _check_particles(numpy.asarray(columns["particle"]))
+        for name, dtype in _column_dtypes(self.isotope_size):
+            self._parts[name].write(numpy.ascontiguousarray(columns[name], dtype=dtype).tobytes())
+        self.num_events += len(columns["particle"])
+
+    def close(self) -> None:
+        """Assembles the output file from the columns written so far."""
+        with open(self.file_name, "wb") as f:
+            f.write(_header(self.isotope_size, self.num_events))
+            for name, _, offset in _column_offsets(self.isotope_size, self.num_events):
+                self._parts[name].close()
+                f.write(b"\0" * (offset - f.tell()))
+                with open(self._part_file_name(name), "rb") as part:
+                    shutil.copyfileobj(part, f, _COPY_BUFFER_SIZE)
+        self._remove_parts()
+
+    def abort(self) -> None:
+        """Removes the partial output."""
+        for part in self._parts.values():
+            part.close()
+        self._remove_parts()
+
+    def _remove_parts(self) -> None:
+        for name in self._parts:
+            if os.path.exists(self._part_file_name(name)):
+                os.remove(self._part_file_name(name))
+
+    def __enter__(self) -> "EventWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
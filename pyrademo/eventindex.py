@@ -0,0 +1,274 @@
+"""A sidecar index of binary event files, for isotope and time range queries.
+
+Answering a question like "all the decays of Th(228) between year 2 and year
+3" from the event file alone needs a scan of all its events, since they are
+ordered by particle. The index, written next to the events as a .events.idx
+file, holds the row numbers of the events sorted by decaying isotope, and by
+time within an isotope. The time range of the simulation is split into
+buckets, and for each isotope and bucket, the index holds the position of its
+first event in the sorted rows. A query then only reads the rows of its time
+range, and only their events from the memory mapped event file.
+
+The file starts with a fixed size header:
+
+  magic:           8 bytes, b"PYRADIDX"
+  version:         uint32
+  row_size:        uint32, the size of a row number in bytes, 4 or 8
+  num_events:      uint64, of the indexed event file
+  num_isotopes:    uint64
+  num_buckets:     uint64
+  total_time:      float64, seconds, the end of the last bucket
+
+It is followed by the bucket starts, uint64 of shape
+(num_isotopes, num_buckets + 1), the position in the sorted rows of the first
+event of each isotope in each bucket, and of the end of the events of each
+isotope. Then the sorted rows follow, num_events row numbers. Both start at an
+offset, which is a multiple of 8. All the values are little endian.
+"""
+
+from __future__ import annotations
+
+import os
+import numpy
+from typing import Final
+
+from . import eventfile
+from .model import EventTable
+from .model import SimulationConfig
+
+INDEX_SUFFIX: Final[str] = ".events.idx"
+
+MAGIC: Final[bytes] = b"PYRADIDX"
+VERSION: Final[int] = 1
+
+# The number of time buckets of an index.
+DEFAULT_NUM_BUCKETS: Final[int] = 1024
+
+_HEADER_DTYPE: Final[numpy.dtype] = numpy.dtype([
+    ("magic", "S8"),
+    ("version", "<u4"),
+    ("row_size", "<u4"),
+    ("num_events", "<u8"),
+    ("num_isotopes", "<u8"),
+    ("num_buckets", "<u8"),
+    ("total_time", "<f8"),
+])
+
+_ROW_DTYPES: Final[dict[int, numpy.dtype]] = {
+    4: numpy.dtype("<u4"),
+    8: numpy.dtype("<u8"),
+}
+
+_STARTS_DTYPE: Final[numpy.dtype] = numpy.dtype("<u8")
+
+
+def _align(offset: int) -> int:
+    """Rounds up an offset to the next multiple of 8."""
+    return (offset + 7) // 8 * 8
+
+
+def _layout(num_isotopes: int, num_buckets: int) -> tuple[int, int]:
+    """Returns the file offsets of the bucket starts and the sorted rows."""
+    starts_offset = _align(_HEADER_DTYPE.itemsize)
+    rows_offset = _align(starts_offset + _STARTS_DTYPE.itemsize * num_isotopes * (num_buckets + 1))
+    return starts_offset, rows_offset
+
+
+def index_file_name(file_name: str) -> str:
+    """Returns the name of the .events.idx file of a simulation, given the name
+    of its .sim file or its base name."""
+    return file_name.removesuffix(".sim") + INDEX_SUFFIX
+
+
+def _events_file_name(file_name: str) -> str:
+    return file_name.removesuffix(".sim") + ".events.bin"
+
+
+class EventIndex:
+    """An open .events.idx file, see the module docstring.
+
+    Attributes:
+      num_events: The number of events of the indexed event file.
+      total_time: The end of the last time bucket, in seconds.
+      starts: The bucket starts, memory mapped, shape
+        (num_isotopes, num_buckets + 1).
+      rows: The row numbers of the events, sorted by isotope and time, memory
+        mapped.
+    """
+
+    def __init__(self, file_name: str) -> None:
+        """Opens an index file.
+
+        Raises:
+          ValueError: If the file is not an index file.
+        """
+        header = numpy.fromfile(file_name, dtype=_HEADER_DTYPE, count=1)
+        if header.size != 1 or header["magic"][0] != MAGIC:
+            raise ValueError("Not an event index file: {}".format(file_name))
+        if header["version"][0] != VERSION:
+            raise ValueError("Unsupported event index file version {} in {}".format(header["version"][0], file_name))
+        self.num_events = int(header["num_events"][0])
+        self.total_time = float(header["total_time"][0])
+        num_isotopes = int(header["num_isotopes"][0])
+        num_buckets = int(header["num_buckets"][0])
+        starts_offset, rows_offset = _layout(num_isotopes, num_buckets)
+        self.starts = numpy.memmap(file_name, dtype=_STARTS_DTYPE, mode="r", offset=starts_offset,
+                                   shape=(num_isotopes, num_buckets + 1))
+        row_dtype = _ROW_DTYPES[int(header["row_size"][0])]
+        if self.num_events == 0:
+            self.rows = numpy.zeros(0, dtype=row_dtype)
+        else:
+            self.rows = numpy.memmap(file_name, dtype=row_dtype, mode="r", offset=rows_offset,
+                                     shape=(self.num_events,))
+
+    @property
+    def num_buckets(self) -> int:
+        return self.starts.shape[1] - 1
+
+    def _bucket(self, t: float) -> int:
+        """Returns the bucket of a time, clipped to the existing buckets."""
+        if t <= 0.0:
+            return 0
+        return min(int(t / self.total_time * self.num_buckets), self.num_buckets - 1)
+
+    def _position(self, isotope: int, t: float, time: numpy.ndarray) -> int:
+        """Returns the position in the sorted rows of the first event of an
+        isotope at or after t.
+
+        Args:
+          time: The time column of the event file.
+        """
+        bucket = self._bucket(t)
+        # The bucket computed from t can be off by one from the one of the
+        # edges, due to rounding, so the neighbouring buckets are searched
+        # too. Only the times of their rows are read.
+        lo = int(self.starts[isotope, max(bucket - 1, 0)])
+        hi = int(self.starts[isotope, min(bucket + 2, self.num_buckets)])
+        return lo + int(numpy.searchsorted(time[self.rows[lo:hi]], t, side="left"))
+
+    def select(self, time: numpy.ndarray, isotope: int, start: float, stop: float) -> numpy.ndarray:
+        """Returns the row numbers of the decays of an isotope with
+        start <= time < stop, in time order.
+
+        Args:
+          time: The time column of the indexed event file.
+          isotope: The index of the decaying isotope.
+          start: The start of the time range, in seconds.
+          stop: The end of the time range, in seconds.
+        """
+        if stop <= start:
+            return numpy.zeros(0, dtype=self.rows.dtype)
+        lo = self._position(isotope, start, time)
+        hi = self._position(isotope, stop, time) if stop <= self.total_time else int(self.starts[isotope, -1])
+        return numpy.asarray(self.rows[lo:hi])
+
+
+def write_index(file_name: str, num_buckets: int = DEFAULT_NUM_BUCKETS) -> None:
+    """Writes the .events.idx file of a simulation with a binary event file.
+
+    The events are sorted one isotope at a time, so the memory use is
+    proportional to the number of decays of the most frequent isotope.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the simulation.
+      num_buckets: The number of time buckets.
+    """
+    cfg = SimulationConfig.from_file(file_name)
+    columns = eventfile.read_events(_events_file_name(file_name))
+    from_isotope = columns["from_isotope"]
+    time = columns["time"]
+    num_events = len(time)
+    num_isotopes = len(cfg.decay_chain.isotopes)
+    row_size = 4 if num_events <= numpy.iinfo(numpy.uint32).max else 8
+    starts_offset, rows_offset = _layout(num_isotopes, num_buckets)
+    edges = numpy.linspace(0.0, cfg.total_time, num_buckets + 1)[:-1]
+
+    header = numpy.zeros(1, dtype=_HEADER_DTYPE)
+    header["magic"] = MAGIC
+    header["version"] = VERSION
+    header["row_size"] = row_size
+    header["num_events"] = num_events
+    header["num_isotopes"] = num_isotopes
+    header["num_buckets"] = num_buckets
+    header["total_time"] = cfg.total_time
+
+    output = index_file_name(file_name)
+    with open(output, "wb") as f:
+        f.write(header.tobytes())
+        f.truncate(rows_offset + row_size * num_events)
+
+    starts = numpy.zeros((num_isotopes, num_buckets + 1), dtype=_STARTS_DTYPE)
+    counts = numpy.bincount(numpy.asarray(from_isotope, dtype=numpy.int64), minlength=num_isotopes)
+    ends = numpy.cumsum(counts)
+    if num_events > 0:
+        rows = numpy.memmap(output, dtype=_ROW_DTYPES[row_size], mode="r+", offset=rows_offset, shape=(num_events,))
+        for isotope in range(num_isotopes):
+            if counts[isotope] == 0:
+                continue
+            selected = numpy.flatnonzero(from_isotope == isotope)
+            isotope_time = numpy.asarray(time[selected])
+            order = numpy.argsort(isotope_time, kind="stable")
+            begin = int(ends[isotope] - counts[isotope])
+            rows[begin:int(ends[isotope])] = selected[order]
+            starts[isotope, :-1] = begin + numpy.searchsorted(isotope_time[order], edges, side="left")
+        rows.flush()
+        del rows
+    starts[:, -1] = ends
+    # Isotopes without decays start and end where the previous one ends.
+    empty = counts == 0
+    starts[empty, :-1] = (ends - counts)[empty, numpy.newaxis]
+    with open(output, "r+b") as f:
+        f.seek(starts_offset)
+        f.write(starts.tobytes())
+
+
+def read_index(file_name: str) -> EventIndex:
+    """Opens the index of a simulation.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the simulation.
+
+    Raises:
+      ValueError: If the index does not belong to the current events, like
+        after --extend-to. Then it needs to be written again.
+    """
+    index = EventIndex(index_file_name(file_name))
+    num_events = len(eventfile.read_events(_events_file_name(file_name))["time"])
+    if index.num_events != num_events:
+        raise ValueError("The event index {} is out of date, it has {} events instead of {}".format(
+            index_file_name(file_name), index.num_events, num_events))
+    return index
+
+
+def has_index(file_name: str) -> bool:
+    """Returns whether a simulation has an event index."""
+    return os.path.exists(index_file_name(file_name))
+
+
+def query_events(file_name: str, isotopes: list[int] | None = None, start: float = 0.0,
+                 stop: float = numpy.inf) -> tuple[SimulationConfig, EventTable]:
+    """Reads the decays of some isotopes within a time range, using the index.
+
+    Only the matching events are read from the event file.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the simulation.
+      isotopes: The indices of the decaying isotopes. All of them if None.
+      start: The start of the time range, in seconds.
+      stop: The end of the time range, in seconds, exclusive.
+
+    Returns:
+      The config of the simulation, and the matching events, in time order.
+    """
+    cfg = SimulationConfig.from_file(file_name)
+    index = read_index(file_name)
+    events = EventTable.from_columns(eventfile.read_events(_events_file_name(file_name)))
+    if isotopes is None:
+        isotopes = list(range(len(cfg.decay_chain.isotopes)))
+    selected = [index.select(events.time, isotope, start, stop) for isotope in isotopes]
+    rows = numpy.concatenate(selected) if selected else numpy.zeros(0, dtype=numpy.int64)
+    # Reading the rows in file order is faster, the result is sorted by time
+    # afterwards.
+    rows.sort()
+    result = events[rows]
+    return cfg, result[numpy.argsort(result.time, kind="stable")]
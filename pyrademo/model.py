@@ -5,11 +5,19 @@ This module contains classes to model radoactive decay chains.
 
 from __future__ import annotations
 
-import pprint
+import ast
+import hashlib
+import json
+import os
 import numpy
+from collections.abc import Iterable
+from collections.abc import Iterator
 from dataclasses import dataclass
 from dataclasses import field
 
+from . import eventfile
+from . import textevents
+
 
 @dataclass
 class Decay:
@@ -18,15 +26,44 @@ class Decay:
     Attributes:
       rate: The rate constant (lambda).
       probability: The probability, that among the possible decays from one isotope,
-        this one happens.
+        this one happens, in percent.
       to_isotope: Id of the decay target isotope within the DecayChain.
       energy: released energy, in MeV
+      mode: The decay mode: alpha, beta (for beta-), beta+, ec (electron
+        capture) or it (isomeric transition).
+      via: The short lived isotopes, which this decay passes through, in
+        order, if it is a lumped decay, see the reduction module. Empty for a
+        direct decay.
+      via_energy: The energy released by the decay of each isotope of via.
+        The rest of the energy is released by the decaying isotope itself.
     """
 
     rate: float
     probability: float
     to_isotope: int
     energy: float
+    mode: str = "alpha"
+    via: list[int] = field(default_factory=list)
+    via_energy: list[float] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        """Returns a JSON compatible representation."""
+        return {
+            "rate": self.rate,
+            "probability": self.probability,
+            "to_isotope": self.to_isotope,
+            "energy": self.energy,
+            "mode": self.mode,
+            "via": self.via,
+            "via_energy": self.via_energy,
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> Decay:
+        """The inverse of to_dict."""
+        return Decay(float(d["rate"]), float(d["probability"]), int(d["to_isotope"]), float(d["energy"]),
+                     str(d["mode"]), [int(i) for i in d.get("via", [])],
+                     [float(e) for e in d.get("via_energy", [])])
 
 
 @dataclass
@@ -36,27 +73,104 @@ class Isotope:
     Attributes:
       index: An integer, the index within DecayChain.isotopes.
       name: A human readable name.
-      alpha_decay: A Decay, if the isotope decays via alpha decay, None otherwise.
-      beta_decay: A Decay, if the isotope decays via beta decay, None otherwise.
+      decays: The possible decays of the isotope, empty if it is stable. Their
+        probabilities add up to 100.
     """
 
     index: int
     name: str
-    alpha_decay: Decay | None = None
-    beta_decay: Decay | None = None
+    decays: list[Decay] = field(default_factory=list)
+
+    @property
+    def alpha_decay(self) -> Decay | None:
+        """The alpha decay of the isotope, or None."""
+        return next((d for d in self.decays if d.mode == "alpha"), None)
+
+    @property
+    def beta_decay(self) -> Decay | None:
+        """The beta- decay of the isotope, or None."""
+        return next((d for d in self.decays if d.mode == "beta"), None)
+
+    def to_dict(self) -> dict:
+        """Returns a JSON compatible representation."""
+        return {
+            "index": self.index,
+            "name": self.name,
+            "decays": [decay.to_dict() for decay in self.decays],
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> Isotope:
+        """The inverse of to_dict.
+
+        Also reads the representation of version 1 .sim files, with an
+        alpha_decay and a beta_decay.
+        """
+        if "decays" not in d:
+            return _legacy_isotope(
+                int(d["index"]),
+                str(d["name"]),
+                alpha_decay=Decay.from_dict({**d["alpha_decay"], "mode": "alpha"}) if d["alpha_decay"] else None,
+                beta_decay=Decay.from_dict({**d["beta_decay"], "mode": "beta"}) if d["beta_decay"] else None,
+            )
+        return Isotope(int(d["index"]), str(d["name"]), [Decay.from_dict(decay) for decay in d["decays"]])
 
     def pick_decay(self, rng: numpy.random.Generator) -> Decay | None:
-        if self.alpha_decay is None and self.beta_decay is None:
+        """Picks one of the decays randomly, according to their probabilities.
+
+        Returns:
+          A Decay, or None, if the isotope is stable.
+        """
+        if not self.decays:
             return None
-        if self.alpha_decay == None:
-            return self.beta_decay
-        if self.beta_decay == None:
-            return self.alpha_decay
-        # TODO: verify if the two probabilities add up to 100, here or
-        # in the constructor.
-        if rng.uniform(0.0, 100.0) < self.alpha_decay.probability:
-            return self.alpha_decay
-        return self.beta_decay
+        u = rng.uniform(0.0, 100.0)
+        for decay in self.decays[:-1]:
+            if u < decay.probability:
+                return decay
+            u -= decay.probability
+        return self.decays[-1]
+
+
+# Allowed difference of the sum of the decay probabilities of an isotope from
+# 100, and relative difference of the rates of its decays.
+_PROBABILITY_TOLERANCE = 1e-6
+_RATE_TOLERANCE = 1e-9
+
+
+@dataclass
+class CompiledDecayChain:
+    """A DecayChain, flattened into contiguous NumPy arrays for simulation.
+
+    The decays of each isotope are its branches. The branch tables have a
+    column per branch, as many as the largest number of decays of an isotope.
+    The unused columns of isotopes with fewer decays are padding: infinite
+    cumulative probability, the isotope itself as target, and 0 energy.
+
+    Attributes:
+      rate: The total rate constant of each isotope, 0 for stable ones.
+      stable: True for the isotopes without any decay.
+      cumulative_probability: Shape (num_isotopes, max_branches). A uniform
+        random number u in [0, 100) picks the first branch whose cumulative
+        probability is larger than u. The last branch of each isotope has
+        infinity instead of 100, so that rounding never picks the padding.
+      to_isotope: Shape (num_isotopes, max_branches), the decay targets.
+      energy: Shape (num_isotopes, max_branches), the released energies, in
+        MeV.
+      probability: Shape (num_isotopes, max_branches), the probabilities of
+        the branches, as fractions. 0 for the padding.
+    """
+
+    rate: numpy.ndarray
+    stable: numpy.ndarray
+    cumulative_probability: numpy.ndarray
+    to_isotope: numpy.ndarray
+    energy: numpy.ndarray
+    probability: numpy.ndarray
+
+    def pick_branches(self, isotope: numpy.ndarray, u: numpy.ndarray) -> numpy.ndarray:
+        """Picks a branch for each isotope, given uniform random numbers in
+        [0, 100)."""
+        return (u[:, numpy.newaxis] >= self.cumulative_probability[isotope]).sum(axis=1)
 
 
 @dataclass
@@ -64,17 +178,154 @@ class DecayChain:
     """Models a decay chain.
 
     While the traditional name of "chain" suggests that this is a linear chain,
-    in reality it's a DAG, with nodes being elements, edges being alpha or beta
-    decays.
+    in reality it's a DAG, with nodes being elements, edges being decays.
 
     The element with index 0 is special, it is the starting element for the
-    decay simulation.
+    decay simulation, unless the simulation has an initial inventory, see
+    SimulationConfig.
 
     Attributes:
       isotopes: A list of all the isotopes in the decay tree.
     """
 
     isotopes: list[Isotope] = field(default_factory=list)
+    _compiled: CompiledDecayChain | None = field(default=None, init=False, repr=False, compare=False)
+
+    def to_dict(self) -> dict:
+        """Returns a JSON compatible representation."""
+        return {"isotopes": [isotope.to_dict() for isotope in self.isotopes]}
+
+    @staticmethod
+    def from_dict(d: dict) -> DecayChain:
+        """The inverse of to_dict."""
+        return DecayChain([Isotope.from_dict(isotope) for isotope in d["isotopes"]])
+
+    def isotope_index(self, name: str) -> int:
+        """Returns the index of the isotope with the given name.
+
+        Raises:
+          ValueError: If there is no such isotope.
+        """
+        for isotope in self.isotopes:
+            if isotope.name == name:
+                return isotope.index
+        raise ValueError("Unknown isotope: {}".format(name))
+
+    def reachable_from(self, start: list[int]) -> DecayChain:
+        """Returns the part of the decay chain reachable from some isotopes.
+
+        Args:
+          start: The indices of the isotopes to start from.
+
+        Returns:
+          A new decay chain, with the start isotopes, and the isotopes they
+          decay to, directly or indirectly. The start isotopes are renumbered
+          first, in the given order, then the others, in their current order.
+        """
+        reachable = set(start)
+        pending = list(start)
+        while pending:
+            for decay in self.isotopes[pending.pop()].decays:
+                if decay.to_isotope not in reachable:
+                    reachable.add(decay.to_isotope)
+                    pending.append(decay.to_isotope)
+
+        order = list(dict.fromkeys(start))
+        order += [i for i in range(len(self.isotopes)) if i in reachable and i not in order[:len(start)]]
+        new_index = {old: new for new, old in enumerate(order)}
+        return DecayChain([
+            Isotope(new_index[i], self.isotopes[i].name, [
+                Decay(decay.rate, decay.probability, new_index[decay.to_isotope], decay.energy, decay.mode,
+                      [new_index[v] for v in decay.via], list(decay.via_energy))
+                for decay in self.isotopes[i].decays
+            ])
+            for i in order
+        ])
+
+    def topological_order(self) -> list[int]:
+        """Returns the isotope indices, so that every decay goes to a later one.
+
+        Raises:
+          ValueError: If the decay chain has a cycle.
+        """
+        n = len(self.isotopes)
+        num_parents = [0] * n
+        for isotope in self.isotopes:
+            for decay in isotope.decays:
+                num_parents[decay.to_isotope] += 1
+
+        order = [i for i in range(n) if num_parents[i] == 0]
+        for i in order:
+            for decay in self.isotopes[i].decays:
+                num_parents[decay.to_isotope] -= 1
+                if num_parents[decay.to_isotope] == 0:
+                    order.append(decay.to_isotope)
+        if len(order) != n:
+            raise ValueError("The decay chain has a cycle")
+        return order
+
+    def validate(self) -> None:
+        """Checks the decay chain.
+
+        Raises:
+          ValueError: If the probabilities of the decays of an isotope do not
+            add up to 100, its decays have different rates, or a decay target
+            does not exist.
+        """
+        for isotope in self.isotopes:
+            if not isotope.decays:
+                continue
+            total = sum(decay.probability for decay in isotope.decays)
+            if abs(total - 100.0) > _PROBABILITY_TOLERANCE:
+                raise ValueError("The decay probabilities of {} add up to {}, not 100".format(isotope.name, total))
+            rate = isotope.decays[0].rate
+            if rate <= 0 or any(abs(decay.rate - rate) > _RATE_TOLERANCE * rate for decay in isotope.decays):
+                raise ValueError("The decays of {} must have the same, positive half life".format(isotope.name))
+            for decay in isotope.decays:
+                if not 0 <= decay.to_isotope < len(self.isotopes):
+                    raise ValueError("Unknown decay target of {}: {}".format(isotope.name, decay.to_isotope))
+
+    def compiled(self) -> CompiledDecayChain:
+        """Returns the decay chain as a CompiledDecayChain.
+
+        The result is computed on the first call and kept, so the isotopes
+        must not be changed afterwards.
+        """
+        if self._compiled is None:
+            self.validate()
+            n = len(self.isotopes)
+            max_branches = max((len(isotope.decays) for isotope in self.isotopes), default=0)
+            max_branches = max(max_branches, 1)
+
+            rate = numpy.zeros(n, dtype=float)
+            cumulative_probability = numpy.full((n, max_branches), numpy.inf)
+            to_isotope = numpy.repeat(numpy.arange(n, dtype=numpy.int64)[:, numpy.newaxis], max_branches, axis=1)
+            energy = numpy.zeros((n, max_branches), dtype=float)
+            probability = numpy.zeros((n, max_branches), dtype=float)
+
+            for isotope in self.isotopes:
+                i = isotope.index
+                if not isotope.decays:
+                    continue
+                rate[i] = isotope.decays[0].rate
+                cumulative = 0.0
+                for b, decay in enumerate(isotope.decays):
+                    cumulative += decay.probability
+                    cumulative_probability[i, b] = cumulative
+                    to_isotope[i, b] = decay.to_isotope
+                    energy[i, b] = decay.energy
+                    probability[i, b] = decay.probability / 100.0
+                cumulative_probability[i, len(isotope.decays) - 1] = numpy.inf
+
+            self._compiled = CompiledDecayChain(
+                rate=rate,
+                stable=rate == 0.0,
+                cumulative_probability=cumulative_probability,
+                to_isotope=to_isotope,
+                energy=energy,
+                probability=probability,
+            )
+        return self._compiled
 
 
 @dataclass
@@ -111,28 +362,351 @@ class DecayEvent:
         return DecayEvent(int(parts[0]), int(parts[1]), int(parts[2]), float(parts[3]), float(parts[4]))
 
 
+# The names of the fields of DecayEvent, in the order of the line oriented
+# format. These are also the names of the columns of EventTable.
+EVENT_FIELDS: tuple[str, ...] = ("particle", "from_isotope", "to_isotope", "time", "energy")
+
+_EVENT_DTYPES: dict[str, type] = {
+    "particle": numpy.int64,
+    "from_isotope": numpy.int64,
+    "to_isotope": numpy.int64,
+    "time": numpy.float64,
+    "energy": numpy.float64,
+}
+
+
+# The number of rows converted to DecayEvent objects at once, when iterating an
+# EventTable.
+_ITER_ROWS = 1 << 14
+
+
+class EventTable:
+    """Decay events, stored as parallel NumPy columns, one per field of
+    DecayEvent.
+
+    A DecayEvent object costs hundreds of bytes, a row of an EventTable 40 or
+    less. The columns can also be memory mapped from a binary event file.
+
+    Columns are accessed as attributes, or by name, like events["time"], so an
+    EventTable can be used where a dict of columns is expected. Indexing with
+    an integer gives a DecayEvent, and iterating gives all the events as
+    DecayEvent objects, created on the fly. Indexing with a slice, a bool mask
+    or an array of indices gives a new EventTable.
+
+    Attributes:
+      particle: The particle of each event.
+      from_isotope: The decaying isotope of each event.
+      to_isotope: The decay target of each event.
+      time: The time of each event, in seconds.
+      energy: The released energy of each event, in MeV.
+    """
+
+    def __init__(self, particle: numpy.ndarray, from_isotope: numpy.ndarray, to_isotope: numpy.ndarray,
+                 time: numpy.ndarray, energy: numpy.ndarray) -> None:
+        self.particle = particle
+        self.from_isotope = from_isotope
+        self.to_isotope = to_isotope
+        self.time = time
+        self.energy = energy
+        if any(len(column) != len(particle) for column in (from_isotope, to_isotope, time, energy)):
+            raise ValueError("The columns of an EventTable must have the same length")
+
+    @staticmethod
+    def from_columns(columns: dict[str, numpy.ndarray]) -> EventTable:
+        """Creates an EventTable from a dict of columns, keyed by the names in
+        EVENT_FIELDS. The arrays are not copied."""
+        return EventTable(*(columns[name] for name in EVENT_FIELDS))
+
+    @staticmethod
+    def from_events(events: Iterable[DecayEvent]) -> EventTable:
+        """Creates an EventTable from DecayEvent objects."""
+        events = list(events)
+        return EventTable(*(
+            numpy.fromiter((getattr(e, name) for e in events), dtype=_EVENT_DTYPES[name], count=len(events))
+            for name in EVENT_FIELDS
+        ))
+
+    @staticmethod
+    def empty() -> EventTable:
+        """Returns an EventTable without events."""
+        return EventTable(*(numpy.zeros(0, dtype=_EVENT_DTYPES[name]) for name in EVENT_FIELDS))
+
+    @staticmethod
+    def concatenate(tables: Iterable[EventTable]) -> EventTable:
+        """Returns the events of the tables, one after the other."""
+        tables = list(tables)
+        if not tables:
+            return EventTable.empty()
+        return EventTable(*(numpy.concatenate([table[name] for table in tables]) for name in EVENT_FIELDS))
+
+    def columns(self) -> dict[str, numpy.ndarray]:
+        """Returns the columns as a dict, keyed by the names in EVENT_FIELDS."""
+        return {name: getattr(self, name) for name in EVENT_FIELDS}
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the columns, in bytes."""
+        return sum(getattr(self, name).nbytes for name in EVENT_FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.particle)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in EVENT_FIELDS:
+                raise KeyError(key)
+            return getattr(self, key)
+        if isinstance(key, (int, numpy.integer)):
+            return DecayEvent(*(getattr(self, name)[key].item() for name in EVENT_FIELDS))
+        return EventTable(*(getattr(self, name)[key] for name in EVENT_FIELDS))
+
+    def __iter__(self) -> Iterator[DecayEvent]:
+        for start in range(0, len(self), _ITER_ROWS):
+            rows = zip(*(getattr(self, name)[start:start + _ITER_ROWS].tolist() for name in EVENT_FIELDS))
+            for row in rows:
+                yield DecayEvent(*row)
+
+    def __repr__(self) -> str:
+        return "EventTable({} events)".format(len(self))
+
+    def of_isotope(self, isotope: int) -> EventTable:
+        """Returns the decays of an isotope."""
+        return self[numpy.asarray(self.from_isotope) == isotope]
+
+    def in_time_range(self, start: float, stop: float) -> EventTable:
+        """Returns the events with start <= time < stop."""
+        time = numpy.asarray(self.time)
+        return self[(time >= start) & (time < stop)]
+
+
 @dataclass
 class SimulationConfig:
-    """A base config for simulations."""
+    """A base config for simulations.
+
+    Attributes:
+      decay_chain: The decay chain to simulate.
+      num_particles: The number of particles, all starting as isotope 0,
+        unless initial_inventory is given.
+      total_time: The length of the simulated time, in seconds.
+      file_base_name: The base name of the output files.
+      seed: The seed of the random generator, or None for a random seed.
+      initial_inventory: The number of particles of each isotope at time 0,
+        keyed by isotope index, adding up to num_particles. None if all of
+        them start as isotope 0. The particles are numbered isotope by
+        isotope, in the order of the indices.
+      event_format: The format of the events file of the simulation, "binary"
+        for .events.bin or "text" for .events. None if the simulation has no
+        events file, or was written by an older version, which did not
+        record it.
+    """
 
     decay_chain: DecayChain
     num_particles: int
     total_time: float
     file_base_name: str
+    seed: int | None = None
+    initial_inventory: dict[int, int] | None = None
+    event_format: str | None = None
+
+    def __post_init__(self) -> None:
+        if self.initial_inventory is None:
+            return
+        for index, count in self.initial_inventory.items():
+            if not 0 <= index < len(self.decay_chain.isotopes):
+                raise ValueError("Unknown isotope in the initial inventory: {}".format(index))
+            if count < 0:
+                raise ValueError("Negative number of particles in the initial inventory: {}".format(count))
+        if sum(self.initial_inventory.values()) != self.num_particles:
+            raise ValueError("The initial inventory has {} particles, not {}".format(
+                sum(self.initial_inventory.values()), self.num_particles))
+
+    def initial_populations(self, start: int = 0, stop: int | None = None) -> numpy.ndarray:
+        """Returns the number of particles of each isotope at time 0.
+
+        Args:
+          start: The index of the first particle counted.
+          stop: The index after the last particle counted, num_particles if
+            None.
+        """
+        stop = self.num_particles if stop is None else stop
+        initial = numpy.zeros(len(self.decay_chain.isotopes), dtype=numpy.int64)
+        if self.initial_inventory is None:
+            initial[0] = stop - start
+            return initial
+        for index, count in self.initial_inventory.items():
+            initial[index] = count
+        # The particles of isotope i are the ones in [ends[i] - initial[i],
+        # ends[i]).
+        ends = numpy.cumsum(initial)
+        return numpy.clip(ends, start, stop) - numpy.clip(ends - initial, start, stop)
+
+    def initial_isotopes(self, start: int, stop: int) -> numpy.ndarray:
+        """Returns the isotope of the particles with index in [start, stop) at
+        time 0."""
+        if self.initial_inventory is None:
+            return numpy.zeros(stop - start, dtype=numpy.int64)
+        ends = numpy.cumsum(self.initial_populations())
+        return numpy.searchsorted(ends, numpy.arange(start, stop), side="right").astype(numpy.int64)
+
+    def _content(self) -> dict:
+        """Returns everything, that determines the result of the simulation."""
+        content = {
+            "decay_chain": self.decay_chain.to_dict(),
+            "num_particles": self.num_particles,
+            "total_time": self.total_time,
+            "seed": self.seed,
+        }
+        # Only present if given, so that the hash of the other configs stays
+        # the same.
+        if self.initial_inventory is not None:
+            content["initial_inventory"] = {str(index): count
+                                            for index, count in sorted(self.initial_inventory.items())}
+        return content
+
+    def content_hash(self) -> str:
+        """Returns a hash of the decay chain and the parameters of the
+        simulation, including the seed, but not the file name.
+
+        It is the SHA-256 of the canonical JSON form of the content: sorted
+        keys, no whitespace. Two configs with the same hash give the same
+        simulation.
+        """
+        return _hash_content(self._content())
+
+    def to_dict(self) -> dict:
+        """Returns a JSON compatible representation, as written to .sim files."""
+        return {
+            "format": _SIM_FORMAT,
+            "version": _SIM_VERSION,
+            **self._content(),
+            "file_base_name": self.file_base_name,
+            "event_format": self.event_format,
+            "content_hash": self.content_hash(),
+        }
+
+    @staticmethod
+    def from_dict(d: dict) -> SimulationConfig:
+        """The inverse of to_dict.
+
+        Raises:
+          ValueError: If the dict is not a simulation config, or its content
+            hash does not match its content.
+        """
+        if d.get("format") != _SIM_FORMAT:
+            raise ValueError("Not a simulation config")
+        if d.get("version") not in _SIM_READABLE_VERSIONS:
+            raise ValueError("Unsupported simulation config version: {}".format(d.get("version")))
+        cfg = SimulationConfig(
+            decay_chain=DecayChain.from_dict(d["decay_chain"]),
+            num_particles=int(d["num_particles"]),
+            total_time=float(d["total_time"]),
+            file_base_name=str(d["file_base_name"]),
+            seed=int(d["seed"]) if d["seed"] is not None else None,
+            initial_inventory={int(index): int(count) for index, count in d["initial_inventory"].items()}
+            if d.get("initial_inventory") is not None else None,
+            event_format=d.get("event_format"),
+        )
+        if cfg.event_format not in _EVENT_FORMATS:
+            raise ValueError("Unknown event format: {}".format(cfg.event_format))
+        # The hash is checked on the content as written, since older versions
+        # represent the same content differently.
+        if "content_hash" in d and d["content_hash"] != _hash_content({key: d[key] for key in _CONTENT_KEYS
+                                                                        if key in d}):
+            raise ValueError("The content hash of the simulation config does not match its content")
+        return cfg
+
+    def to_json(self) -> str:
+        """Returns the contents of the .sim file of the config."""
+        return json.dumps(self.to_dict(), indent=1) + "\n"
 
     def write_file(self):
-        """Writes the simulation config to file."""
+        """Writes the simulation config to file, as JSON."""
         with open(self.file_base_name+".sim", "w") as f:
-            f.write(pprint.pformat(self))
+            f.write(self.to_json())
 
     @staticmethod
     def from_file(file_name: str) -> SimulationConfig:
+        """Reads a simulation config from file.
+
+        Besides the JSON format written by write_file, it also reads the
+        format of older versions, which wrote the repr of the config. That
+        format is parsed without evaluating it.
+        """
         if not file_name.endswith(".sim"):
             file_name = file_name + ".sim"
 
         with open(file_name, "r") as f:
             contents = f.read()
-            return eval(contents)
+        if contents.lstrip().startswith("{"):
+            return SimulationConfig.from_dict(json.loads(contents))
+        return _parse_legacy_config(contents)
+
+
+_SIM_FORMAT = "pyrademo-simulation"
+_SIM_VERSION = 4
+# Version 1 had an alpha_decay and a beta_decay per isotope, instead of a list
+# of decays. Version 2 had no initial_inventory, version 3 no event_format.
+_SIM_READABLE_VERSIONS = (1, 2, 3, 4)
+_EVENT_FORMATS = (None, "binary", "text")
+_CONTENT_KEYS = ("decay_chain", "num_particles", "total_time", "seed", "initial_inventory")
+
+
+def _hash_content(content: dict) -> str:
+    """Returns the SHA-256 of the canonical JSON form of a config content."""
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _legacy_isotope(index: int, name: str, alpha_decay: Decay | None = None,
+                    beta_decay: Decay | None = None) -> Isotope:
+    """Creates an Isotope from the alpha_decay and beta_decay of older
+    versions."""
+    decays = []
+    if alpha_decay is not None:
+        alpha_decay.mode = "alpha"
+        decays.append(alpha_decay)
+    if beta_decay is not None:
+        beta_decay.mode = "beta"
+        decays.append(beta_decay)
+    # Older versions ignored the probability of a single decay, and took the
+    # beta decay with the remaining probability of the alpha decay.
+    if len(decays) == 1:
+        decays[0].probability = 100.0
+    elif decays:
+        beta_decay.probability = 100.0 - alpha_decay.probability
+    return Isotope(index, name, decays)
+
+
+# The classes, which can appear in a .sim file written by older versions.
+_LEGACY_CLASSES = {
+    "SimulationConfig": SimulationConfig,
+    "DecayChain": DecayChain,
+    "Isotope": _legacy_isotope,
+    "Decay": Decay,
+}
+
+
+def _parse_legacy_node(node: ast.AST):
+    """Converts a node of the repr of a legacy config to its value."""
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _LEGACY_CLASSES:
+        args = [_parse_legacy_node(arg) for arg in node.args]
+        kwargs = {keyword.arg: _parse_legacy_node(keyword.value) for keyword in node.keywords}
+        return _LEGACY_CLASSES[node.func.id](*args, **kwargs)
+    if isinstance(node, ast.List):
+        return [_parse_legacy_node(element) for element in node.elts]
+    # Numbers, strings, None, and negative numbers.
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        raise ValueError("Unexpected element in simulation config: {}".format(ast.dump(node))) from None
+
+
+def _parse_legacy_config(contents: str) -> SimulationConfig:
+    """Parses a simulation config in the repr format of older versions."""
+    cfg = _parse_legacy_node(ast.parse(contents, mode="eval").body)
+    if not isinstance(cfg, SimulationConfig):
+        raise ValueError("Not a simulation config")
+    return cfg
 
 
 @dataclass
@@ -140,31 +714,168 @@ class SimulationResults:
     """A data structure representing results of a simulation."""
 
     cfg: SimulationConfig
-    data: list[DecayEvent]
+    data: EventTable
 
-    def write_file(self) -> None:
-        """Writes the simulation results to files."""
-        with open(self.cfg.file_base_name+".events", "w") as f:
-            f.write("# " + DecayEvent.header() + "\n")
-            for event in self.data:
-                f.write(event.as_line())
-                f.write("\n")
-        self.cfg.write_file()
+    def write_file(self, binary: bool = False) -> None:
+        """Writes the simulation results to files.
 
+        Args:
+          binary: If True, the events are written in the binary format of the
+            eventfile module, to a .events.bin file. Otherwise they are written
+            as text, to a .events file.
+        """
+        write_event_columns(self.cfg, self.data, binary)
+
+    @staticmethod
     def from_file(file_name: str) -> SimulationResults:
-        """Reads the simulation results from files."""
-        cfg = SimulationConfig.from_file(file_name)
-        events: list[DecayEvent] = []
-
-        data_file_name = file_name.removesuffix(".sim") + ".events"
-        with open(data_file_name, "r") as f:
-            while True:
-                line = f.readline()
-                if not line:
-                    break
-                line = line.strip()
-                if line.startswith("#") or line == "":
-                    continue
-                events.append(DecayEvent.from_line(line))
+        """Reads the simulation results from files, see read_event_columns."""
+        return SimulationResults(*read_event_columns(file_name))
+
+
+def _base_name(file_name: str) -> str:
+    """Returns the base name of a simulation, given the name of its .sim file or
+    its base name."""
+    return file_name.removesuffix(".sim")
+
 
-        return SimulationResults(cfg, events)
+def events_file_name(file_name: str, cfg: SimulationConfig) -> tuple[str, bool]:
+    """Returns the name of the events file of a simulation, and whether it is
+    in the binary format.
+
+    The file is the one of the event_format recorded in the config. Configs
+    without it, written by older versions, use the one of the .events.bin and
+    .events files, which exists.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the simulation.
+      cfg: The config of the simulation, read from the .sim file.
+
+    Raises:
+      ValueError: If the config does not record the format, and both files
+        exist.
+    """
+    binary_file_name = _base_name(file_name) + ".events.bin"
+    text_file_name = _base_name(file_name) + ".events"
+    if cfg.event_format is not None:
+        binary = cfg.event_format == "binary"
+        return (binary_file_name if binary else text_file_name), binary
+    if os.path.exists(binary_file_name) and os.path.exists(text_file_name):
+        raise ValueError("{} has both a .events and a .events.bin file, and its .sim file does not record which "
+                         "one belongs to it. Remove the other one".format(_base_name(file_name)))
+    if os.path.exists(binary_file_name):
+        return binary_file_name, True
+    return text_file_name, False
+
+
+_TEXT_BUFFER_SIZE = 1 << 20
+
+
+class TextEventWriter:
+    """Writes a text .events file incrementally, in chunks of events.
+
+    Can be used as a context manager, like eventfile.EventWriter.
+    """
+
+    def __init__(self, file_name: str, append: bool = False) -> None:
+        self.file_name = file_name
+        self.num_events = 0
+        self._append = append
+        if append:
+            self._f = open(file_name, "a", buffering=_TEXT_BUFFER_SIZE)
+        else:
+            self._f = open(file_name, "w", buffering=_TEXT_BUFFER_SIZE)
+            self._f.write("# " + DecayEvent.header() + "\n")
+
+    def write(self, events: EventTable) -> None:
+        """Appends a chunk of events."""
+        values = [events[name].tolist() for name in EVENT_FIELDS]
+        if events.energy.dtype == numpy.float32:
+            # Binary event files store the energy as float32. Converting those
+            # to str gives the shortest form, 0.046 instead of
+            # 0.04600000008940697.
+            values[EVENT_FIELDS.index("energy")] = events.energy.astype(str).tolist()
+        rows = zip(*values)
+        self._f.write("".join("{} {} {} {} {}\n".format(*row) for row in rows))
+        self.num_events += len(events)
+
+    def close(self) -> None:
+        self._f.close()
+
+    def abort(self) -> None:
+        self._f.close()
+        if not self._append:
+            os.remove(self.file_name)
+
+    def __enter__(self) -> TextEventWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def open_event_writer(cfg: SimulationConfig, binary: bool,
+                      append: bool = False) -> TextEventWriter | eventfile.EventWriter:
+    """Opens a writer for the events of a simulation.
+
+    Args:
+      cfg: The config of the simulation. Determines the file name.
+      binary: If True, the events are written to a binary .events.bin file,
+        otherwise to a text .events file.
+      append: If True, the events are appended to the existing file.
+
+    The format is recorded in cfg.event_format, for the .sim file written
+    afterwards.
+
+    Returns:
+      A writer, with a write method taking chunks of events as EventTable.
+    """
+    cfg.event_format = "binary" if binary else "text"
+    if binary:
+        return eventfile.EventWriter(cfg.file_base_name+".events.bin", len(cfg.decay_chain.isotopes), append)
+    return TextEventWriter(cfg.file_base_name+".events", append)
+
+
+def write_event_columns(cfg: SimulationConfig, events: EventTable, binary: bool) -> None:
+    """Writes simulation results to files.
+
+    Args:
+      cfg: The config of the simulation.
+      events: The events.
+      binary: If True, the events are written to a binary .events.bin file,
+        otherwise to a text .events file.
+    """
+    if binary:
+        eventfile.write_events(cfg.file_base_name+".events.bin", events.columns(), len(cfg.decay_chain.isotopes))
+    else:
+        with TextEventWriter(cfg.file_base_name+".events") as writer:
+            writer.write(events)
+    # The events of an earlier simulation in the other format would not match
+    # the config.
+    other_file_name = cfg.file_base_name + (".events" if binary else ".events.bin")
+    if os.path.exists(other_file_name):
+        os.remove(other_file_name)
+    cfg.event_format = "binary" if binary else "text"
+    cfg.write_file()
+
+
+def read_event_columns(file_name: str) -> tuple[SimulationConfig, EventTable]:
+    """Reads simulation results as an EventTable.
+
+    The events file is chosen by events_file_name, from the format recorded in
+    the .sim file. The columns of a binary .events.bin file are memory mapped,
+    a text .events file is parsed.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the simulation.
+
+    Returns:
+      The config of the simulation, and the events.
+    """
+    cfg = SimulationConfig.from_file(file_name)
+    data_file_name, binary = events_file_name(file_name, cfg)
+    if binary:
+        return cfg, EventTable.from_columns(eventfile.read_events(data_file_name))
+    return cfg, EventTable.from_columns(textevents.read_events(data_file_name))
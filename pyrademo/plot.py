@@ -0,0 +1,110 @@
+"""Plots all the figures of a simulation, from a single load of its results.
+
+The program behind plot_all.py and `python3 -m pyrademo plot`.
+"""
+
+import argparse
+import numpy
+
+from . import analysis
+from . import bateman
+from . import ensemble
+from . import model
+from . import population
+from . import profiling
+from . import reduction
+
+
+def _parser(prog: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Plots the number of particles and the cumulative released energy per isotope of a "
+        "simulation. The results are only read once, however many figures are plotted.",
+    )
+
+    parser.add_argument("-i", "--input", required=True,
+                        help="A simulation, produced by write_raw_events.py. Either the filename of a .sim file, "
+                        "or its base name.")
+    parser.add_argument("--ymax", type=int, action="append",
+                        help="The maximum of the y scale of an additional figure of the number of particles. Can "
+                        "be given multiple times.")
+    parser.add_argument("--energy-ymax", type=int, action="append",
+                        help="The maximum of the y scale of an additional figure of the released energy. Can be "
+                        "given multiple times.")
+    parser.add_argument("-e", "--example-theoretical-curve", action="store_true",
+                        help="Also plot the theoretical curve of each isotope on the figures of the number of "
+                        "particles, the solution of the Bateman equations.")
+    parser.add_argument("--no-show", action="store_true",
+                        help="Only save the figures, do not show them. For batch jobs, also without a display.")
+    parser.add_argument("--band", choices=["sigma", "quantile"], default="sigma",
+                        help="For an ensemble, written by run_ensemble.py: shade mean ± σ around the mean (sigma), "
+                        "or the outermost quantiles around the median (quantile).")
+
+    profiling.add_arguments(parser)
+    return parser
+
+
+def main(argv: list[str], prog: str = "plot_all.py") -> int:
+    """Runs the program with the arguments argv, and returns its exit status.
+
+    Args:
+      argv: The arguments, without the program name.
+      prog: The name of the program in the help and the error messages.
+    """
+    args = _parser(prog).parse_args(argv)
+    profiler = profiling.from_args(args)
+
+    population_bands = energy_bands = None
+    if ensemble.has_ensemble(args.input):
+        with profiler.stage("read"):
+            cfg, statistics = ensemble.read_ensemble(args.input)
+        population_curves, population_bands = statistics.bands(cfg.decay_chain, "population", args.band)
+        energy_curves, energy_bands = statistics.bands(cfg.decay_chain, "energy", args.band)
+    elif population.has_populations(args.input):
+        with profiler.stage("read"):
+            cfg, history = population.read_populations(args.input)
+        with profiler.stage("aggregate"):
+            population_curves = history.population_steps(cfg.decay_chain)
+            energy_curves = history.energy_steps(cfg.decay_chain)
+    else:
+        with profiler.stage("read"):
+            cfg, events = model.read_event_columns(args.input)
+        profiler.count("events", len(events))
+        with profiler.stage("aggregate"):
+            population_curves = analysis.population_steps(events, cfg.decay_chain, cfg.initial_populations())
+            # The energy of lumped isotopes is attributed to them, not to their
+            # parents.
+            energy_curves = analysis.energy_steps(reduction.expand_events(events, cfg.decay_chain), cfg.decay_chain)
+
+    theoretical = None
+    if args.example_theoretical_curve:
+        xf = numpy.linspace(0.0, cfg.total_time, num=1000, dtype=float)
+        with profiler.stage("bateman"):
+            theoretical = xf, bateman.solve(cfg.decay_chain, xf, cfg.initial_populations()).populations
+
+    with profiler.stage("import_matplotlib"):
+        if args.no_show:
+            import matplotlib
+            matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from . import plotting
+
+    figures = [lambda ymax=ymax: plotting.population_figure(cfg, population_curves, ymax, theoretical,
+                                                            population_bands)
+               for ymax in [None] + (args.ymax or [])]
+    figures += [lambda ymax=ymax: plotting.energy_figure(cfg, energy_curves, ymax, energy_bands)
+                for ymax in [None] + (args.energy_ymax or [])]
+
+    for figure in figures:
+        with profiler.stage("plot"):
+            fig, file_name, num_points = figure()
+        profiler.count("plotted_points", num_points)
+        with profiler.stage("save"):
+            fig.savefig(file_name)
+        if args.no_show:
+            plt.close(fig)
+        print("Wrote {}".format(file_name))
+    profiler.write_report()
+    if not args.no_show:
+        plt.show()
+    return 0
@@ -0,0 +1,224 @@
+"""The figures of the plot programs.
+
+A step curve of a simulation has a point for every event changing it, hundreds
+of thousands of them with 100k particles, far more than the pixels of a
+figure. Before rendering, the curves are decimated to the resolution of the
+axes: of the points falling into the same pixel column, only the first, the
+last, the lowest and the highest are kept. The line drawn through them covers
+the same pixel columns with the same vertical extent as the line through all
+the points, so the figure looks the same, but it has at most four points per
+pixel column. Only the edges of the lines differ slightly: thousands of tiny
+zigzags per pixel column made them look frayed, due to the joins of the line
+segments.
+
+Importing this module imports matplotlib, which takes a while. The plot
+programs import it only after loading the data.
+"""
+
+import numpy
+import matplotlib.pyplot as plt
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from .analysis import StepCurve
+from .model import SimulationConfig
+from .rates import RateSeries
+
+
+def decimate(times: numpy.ndarray, values: numpy.ndarray,
+             columns: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """Reduces a curve to the first, last, lowest and highest point of each
+    pixel column.
+
+    Args:
+      times: The times of the points, increasing.
+      values: The values of the points.
+      columns: The pixel column of each point, increasing.
+
+    Returns:
+      The times and values of the kept points, in the original order.
+    """
+    if times.size == 0:
+        return times, values
+    # The columns are increasing, so the points of a column are consecutive.
+    firsts = numpy.flatnonzero(numpy.diff(columns, prepend=columns[0] - 1))
+    lasts = numpy.append(firsts[1:], times.size) - 1
+    counts = lasts - firsts + 1
+    keep = [firsts, lasts]
+    for reduce in (numpy.minimum, numpy.maximum):
+        extremes = numpy.repeat(reduce.reduceat(values, firsts), counts)
+        # The first point of each column with the extreme value.
+        candidates = numpy.flatnonzero(values == extremes)
+        _, first_candidates = numpy.unique(columns[candidates], return_index=True)
+        keep.append(candidates[first_candidates])
+    kept = numpy.unique(numpy.concatenate(keep))
+    return times[kept], values[kept]
+
+
+def decimate_lines(ax: Axes, lines: list[Line2D]) -> int:
+    """Decimates lines to the pixel columns of their axes, see decimate.
+
+    Call it after everything is plotted on the axes, since the pixel columns
+    depend on the limits of the x axis. The limits do not change, since the
+    first and last points, and the extreme values are kept.
+
+    Returns:
+      The number of points of the decimated lines.
+    """
+    ax.autoscale_view()
+    num_points = 0
+    for line in lines:
+        times = numpy.asarray(line.get_xdata(), dtype=float)
+        values = numpy.asarray(line.get_ydata(), dtype=float)
+        pixels = ax.transData.transform(numpy.column_stack((times, values)))[:, 0]
+        times, values = decimate(times, values, numpy.floor(pixels).astype(numpy.int64))
+        line.set_data(times, values)
+        num_points += times.size
+    return num_points
+
+
+def fill_bands(ax: Axes, lines: list[Line2D], bands: list[tuple[numpy.ndarray, numpy.ndarray]]) -> None:
+    """Shades the band of each line, like the spread of the replicates of an
+    ensemble, in the color of the line."""
+    for line, (lower, upper) in zip(lines, bands):
+        ax.fill_between(line.get_xdata(), lower, upper, color=line.get_color(), alpha=0.25, linewidth=0.0)
+
+
+def population_figure(cfg: SimulationConfig, curves: list[StepCurve], ymax: int | None = None,
+                      theoretical: tuple[numpy.ndarray, numpy.ndarray] | None = None,
+                      bands: list[tuple[numpy.ndarray, numpy.ndarray]] | None = None) -> tuple[Figure, str, int]:
+    """Plots the number of particles per isotope.
+
+    Args:
+      cfg: The config of the simulation.
+      curves: The number of particles of each isotope.
+      ymax: The maximum of the y scale. Auto-scales if None.
+      theoretical: The times and the populations of the isotopes, of the
+        solution of the Bateman equations, plotted dashed, if given.
+      bands: The lower and upper edges of a band around each curve, at the
+        times of the curve, shaded if given.
+
+    Returns:
+      The figure, the name of its .png file, and the number of plotted points.
+    """
+    fig, ax = plt.subplots()
+    lines = [ax.plot(curve.times, curve.values, linewidth=2.0, label=curve.name)[0] for curve in curves]
+
+    if theoretical is not None:
+        # Partially for demonstration, but also to verify our model, we plot the
+        # theoretical graphs, in the same color as the simulated ones.
+        xf, populations = theoretical
+        for line, yf in zip(lines, populations):
+            ax.plot(xf, yf, linewidth=1.0, linestyle="--", color=line.get_color())
+        ax.plot([], [], linewidth=1.0, linestyle="--", color="black", label="theoretical")
+
+    if bands is not None:
+        fill_bands(ax, lines, bands)
+    num_points = decimate_lines(ax, lines)
+    ax.legend()
+
+    file_name = cfg.file_base_name+"-num_particles_per_isotope.png"
+
+    if ymax is not None:
+        ax.set(ylim=(0, ymax))
+        file_name = (cfg.file_base_name+"-num_particles_per_isotope-ymax{}.png").format(ymax)
+
+    ax.set_ylabel("# of particles")
+    ax.set_xlabel("seconds")
+
+    ax.set_title("num_particles={}".format(cfg.num_particles))
+    fig.suptitle("Number of particles per isotope in time")
+    return fig, file_name, num_points
+
+
+def energy_figure(cfg: SimulationConfig, curves: list[StepCurve], ymax: int | None = None,
+                  bands: list[tuple[numpy.ndarray, numpy.ndarray]] | None = None) -> tuple[Figure, str, int]:
+    """Plots the cumulative released energy per isotope.
+
+    Args:
+      cfg: The config of the simulation.
+      curves: The cumulative released energy of each isotope, in MeV.
+      ymax: The maximum of the y scale. Auto-scales if None.
+      bands: The lower and upper edges of a band around each curve, shaded if
+        given.
+
+    Returns:
+      The figure, the name of its .png file, and the number of plotted points.
+    """
+    fig, ax = plt.subplots()
+    lines = [ax.plot(curve.times, curve.values, linewidth=1.0, label=curve.name)[0] for curve in curves]
+
+    if bands is not None:
+        fill_bands(ax, lines, bands)
+    num_points = decimate_lines(ax, lines)
+    ax.legend()
+
+    file_name = cfg.file_base_name+"-released_energy_per_isotope.png"
+
+    if ymax is not None:
+        ax.set(ylim=(0, ymax))
+        file_name = (cfg.file_base_name+"-released_energy_per_isotope-ymax{}.png").format(ymax)
+
+    ax.set_ylabel("MeV")
+    ax.set_xlabel("sec")
+
+    ax.set_title("num_particles={}".format(cfg.num_particles))
+    fig.suptitle("Cumulative released energy per isotope in time")
+    return fig, file_name, num_points
+
+
+def rate_figure(cfg: SimulationConfig, series: RateSeries, quantity: str, log: bool = False) -> tuple[Figure, str, int]:
+    """Plots the activity or the released power per isotope, and in total, as
+    steps over the time bins, with the confidence intervals shaded.
+
+    Isotopes without any decays, like the stable end of the chain, are left
+    out.
+
+    Args:
+      cfg: The config of the simulation.
+      series: The rates.
+      quantity: "activity" or "power".
+      log: Whether to use a logarithmic y scale.
+
+    Returns:
+      The figure, the name of its .png file, and the number of plotted points.
+    """
+    if quantity not in ("activity", "power"):
+        raise ValueError("Unknown quantity: {}".format(quantity))
+    rates = getattr(series, quantity)
+    interval = getattr(series, quantity + "_interval")
+    names = [isotope.name for isotope in cfg.decay_chain.isotopes]
+
+    fig, ax = plt.subplots()
+    rows = [(names[i], rates[i], i, {}) for i in range(len(names)) if rates[i].any()]
+    rows.append(("total", rates.sum(axis=0), len(names), {"color": "black"}))
+    num_points = 0
+    for name, values, row, style in rows:
+        # The last value is repeated, so that the last bin is drawn too.
+        line, = ax.step(series.edges, numpy.append(values, values[-1]), where="post", linewidth=1.0, label=name,
+                        **style)
+        num_points += series.edges.size
+        if interval is not None:
+            ax.fill_between(series.edges, numpy.append(interval[0, row], interval[0, row, -1]),
+                            numpy.append(interval[1, row], interval[1, row, -1]), step="post",
+                            color=line.get_color(), alpha=0.25, linewidth=0.0)
+    if log:
+        ax.set_yscale("log")
+    ax.legend(fontsize="small")
+
+    if quantity == "activity":
+        file_name = cfg.file_base_name+"-activity_per_isotope.png"
+        ax.set_ylabel("decays / s")
+        fig.suptitle("Activity per isotope in time")
+    else:
+        file_name = cfg.file_base_name+"-power_per_isotope.png"
+        ax.set_ylabel("MeV / s")
+        fig.suptitle("Released power per isotope in time")
+    ax.set_xlabel("seconds")
+
+    title = "num_particles={}".format(cfg.num_particles)
+    if interval is not None:
+        title += ", {:g}% confidence intervals".format(100 * series.level)
+    ax.set_title(title)
+    return fig, file_name, num_points
@@ -0,0 +1,259 @@
+"""Simulation of the populations of the isotopes, instead of single particles.
+
+The simulators of the simulation module follow every particle, so their cost
+grows with the number of particles, and they are limited to about a million
+particles. A real sample has 1e15 atoms or more. PopulationSimulator only
+tracks the number of atoms of each isotope, and moves them through the decay
+chain in time steps (tau leaping): in each step, the number of decaying atoms
+of an isotope is drawn from a binomial distribution, and split among its
+branches with a multinomial one. The cost depends on the number of steps and
+isotopes, not on the number of atoms.
+
+Atoms arriving at an isotope during a step can decay again in the same step.
+This matters for short lived isotopes, like Po(212) with 299 ns, which would
+otherwise be delayed by a whole step. The arrivals are assumed to be uniform
+within the step, and the isotopes are processed in topological order, so the
+arrivals of an isotope are known when it is reached.
+
+The uniform arrivals are an approximation. While the short lived isotopes grow
+in, in the first steps, their populations are off by up to tens of percent,
+and in equilibrium by a few 1e-4. With 1e15 atoms of data/thorium.decaychain
+over 20 a, the populations agree with the Bateman solution at the end to about
+1e-6 relative for the long lived Ra(228), Th(228) and Pb(208), and to about
+1e-3 for the short lived isotopes with more than 1e7 atoms, whose counting
+noise alone is up to 1.6e-4. After the first tenth of the time, the short
+lived ones stay within about 3e-3.
+
+The results are written to a .populations.npz file next to the .sim file.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import numpy
+from dataclasses import dataclass
+from typing import Final
+
+from .analysis import StepCurve
+from .model import DecayChain
+from .model import Isotope
+from .model import SimulationConfig
+
+POPULATIONS_SUFFIX: Final[str] = ".populations.npz"
+
+# Below this lambda*dt, the probability of a decay of an arrival within the
+# step is computed from its Taylor series, to avoid cancellation.
+_SMALL_RATE_TIME: Final[float] = 1e-4
+
+
+@dataclass
+class PopulationHistory:
+    """The populations of the isotopes on the time grid of a simulation.
+
+    Attributes:
+      times: The end of each step, in seconds, starting with 0, shape (T+1,).
+      populations: The number of atoms of each isotope at each time, shape
+        (num_isotopes, T+1).
+      decays: The number of decays of each isotope in each step, shape
+        (num_isotopes, T). The decays of lumped isotopes are included, see the
+        reduction module.
+      energy: The energy released by the decays of each isotope in each step,
+        in MeV, shape (num_isotopes, T).
+    """
+
+    times: numpy.ndarray
+    populations: numpy.ndarray
+    decays: numpy.ndarray
+    energy: numpy.ndarray
+
+    def population_steps(self, decay_chain: DecayChain) -> list[StepCurve]:
+        """Returns the number of atoms of each isotope, like
+        analysis.population_steps."""
+        return [StepCurve(isotope.name, self.times, self.populations[isotope.index])
+                for isotope in decay_chain.isotopes]
+
+    def energy_steps(self, decay_chain: DecayChain) -> list[StepCurve]:
+        """Returns the cumulative energy released by the decays of each
+        isotope, like analysis.energy_steps."""
+        cumulative = numpy.concatenate((numpy.zeros((self.energy.shape[0], 1)), numpy.cumsum(self.energy, axis=1)),
+                                       axis=1)
+        return [StepCurve(isotope.name, self.times, cumulative[isotope.index]) for isotope in decay_chain.isotopes]
+
+    def sample(self, grid: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Returns the number of atoms and the cumulative released energy of
+        each isotope at the times of a grid, like analysis.binned_populations
+        and analysis.binned_energy.
+
+        Returns:
+          Two arrays of shape (num_isotopes, len(grid)).
+        """
+        # The value of a step holds until the end of the next one.
+        steps = numpy.searchsorted(self.times, grid, side="right") - 1
+        cumulative = numpy.concatenate((numpy.zeros((self.energy.shape[0], 1)), numpy.cumsum(self.energy, axis=1)),
+                                       axis=1)
+        return self.populations[:, steps], cumulative[:, steps]
+
+    def write_file(self, file_name: str) -> None:
+        """Writes the history to a .npz file."""
+        # Writing to a file object keeps numpy.savez from appending .npz.
+        with open(file_name, "wb") as f:
+            numpy.savez(f, times=self.times, populations=self.populations, decays=self.decays, energy=self.energy)
+
+    @staticmethod
+    def from_file(file_name: str) -> PopulationHistory:
+        """The inverse of write_file."""
+        with numpy.load(file_name) as data:
+            return PopulationHistory(data["times"], data["populations"], data["decays"], data["energy"])
+
+
+def populations_file_name(file_name: str) -> str:
+    """Returns the name of the .populations.npz file of a simulation, given
+    the name of its .sim file or its base name."""
+    return file_name.removesuffix(".sim") + POPULATIONS_SUFFIX
+
+
+def read_populations(file_name: str) -> tuple[SimulationConfig, PopulationHistory]:
+    """Reads the results of a PopulationSimulator.
+
+    Args:
+      file_name: The name of the .sim file, or the base name of the simulation.
+
+    Returns:
+      The config of the simulation, and its PopulationHistory.
+    """
+    return SimulationConfig.from_file(file_name), PopulationHistory.from_file(populations_file_name(file_name))
+
+
+def has_populations(file_name: str) -> bool:
+    """Returns whether a simulation was run by a PopulationSimulator."""
+    return os.path.exists(populations_file_name(file_name))
+
+
+class PopulationSimulator:
+    """Simulates the number of atoms of each isotope, in adaptive time steps.
+
+    A step is short enough, that about `epsilon` of the unstable atoms decay
+    in it, and at most total_time / min_steps long, so that the result has a
+    useful resolution.
+
+    Attributes:
+      cfg: SimulationConfig, holding the main options for the simulation.
+        num_particles is the number of atoms, all of them isotope 0 at time 0,
+        unless it has an initial inventory.
+      rng: The random generator. If not given, a new one is created, seeded
+        from cfg.seed.
+      epsilon: The targeted fraction of unstable atoms decaying in a step.
+      min_steps: The minimal number of steps.
+      rng_draws: The number of random variates drawn so far.
+    """
+
+    def __init__(self, cfg: SimulationConfig, rng: numpy.random.Generator | None = None,
+                 epsilon: float = 0.01, min_steps: int = 1000) -> None:
+        self.cfg = cfg
+        self.rng = rng if rng is not None else numpy.random.default_rng(cfg.seed)
+        self.epsilon = epsilon
+        self.min_steps = min_steps
+        self.rng_draws = 0
+        self._chain = cfg.decay_chain.compiled()
+        self._order = cfg.decay_chain.topological_order()
+        self._branches = [self._branch_table(isotope) for isotope in cfg.decay_chain.isotopes]
+
+    @staticmethod
+    def _branch_table(isotope: Isotope) -> tuple[numpy.ndarray, ...]:
+        """Returns the probabilities and targets of the branches of an isotope,
+        and its steps: the branch, the decaying isotope and the energy of each.
+
+        A branch has a single step, unless it is a lumped decay, see the
+        reduction module. Then its energy is released by the isotopes it passes
+        through.
+        """
+        stages = []
+        for b, decay in enumerate(isotope.decays):
+            stages.append((b, isotope.index, decay.energy - sum(decay.via_energy)))
+            stages.extend((b, via, energy) for via, energy in zip(decay.via, decay.via_energy))
+        return (
+            numpy.array([decay.probability / 100.0 for decay in isotope.decays]),
+            numpy.array([decay.to_isotope for decay in isotope.decays], dtype=numpy.int64),
+            numpy.array([stage[0] for stage in stages], dtype=numpy.int64),
+            numpy.array([stage[1] for stage in stages], dtype=numpy.int64),
+            numpy.array([stage[2] for stage in stages], dtype=float),
+        )
+
+    def _step_length(self, populations: numpy.ndarray, remaining: float) -> float:
+        """Returns the length of the next step."""
+        unstable = ~self._chain.stable
+        activity = float((populations[unstable] * self._chain.rate[unstable]).sum())
+        dt = min(remaining, self.cfg.total_time / self.min_steps)
+        if activity > 0.0:
+            dt = min(dt, self.epsilon * float(populations[unstable].sum()) / activity)
+        return dt
+
+    def _step(self, populations: numpy.ndarray, dt: float) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """Advances the populations by one step, in place.
+
+        Returns:
+          The number of decays, and the released energy of each isotope in the
+          step.
+        """
+        rate = self._chain.rate
+        x = rate * dt
+        # The probability, that an atom decays within the step.
+        p_start = -numpy.expm1(-x)
+        # The probability, that an atom arriving at a uniformly random time
+        # within the step decays before its end: 1 - (1 - exp(-x)) / x.
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            p_arrival = numpy.where(x < _SMALL_RATE_TIME, x / 2.0 - x * x / 6.0, 1.0 - p_start / x)
+
+        decays = self.rng.binomial(populations, p_start)
+        self.rng_draws += populations.size
+        arrivals = numpy.zeros_like(populations)
+        # The decays of the steps of each decay, including the ones of lumped
+        # isotopes.
+        step_decays = numpy.zeros_like(populations)
+        energy = numpy.zeros(populations.size, dtype=float)
+        for i in self._order:
+            if arrivals[i] > 0 and p_arrival[i] > 0.0:
+                decays[i] += self.rng.binomial(arrivals[i], p_arrival[i])
+                self.rng_draws += 1
+            populations[i] += arrivals[i] - decays[i]
+            if decays[i] == 0:
+                continue
+            probability, to_isotope, step_branch, step_isotope, step_energy = self._branches[i]
+            if probability.size == 1:
+                counts = decays[i:i + 1]
+            else:
+                counts = self.rng.multinomial(decays[i], probability)
+                self.rng_draws += probability.size
+            numpy.add.at(arrivals, to_isotope, counts)
+            numpy.add.at(step_decays, step_isotope, counts[step_branch])
+            numpy.add.at(energy, step_isotope, counts[step_branch] * step_energy)
+        return step_decays, energy
+
+    def simulate(self) -> PopulationHistory:
+        """Runs the simulation."""
+        n = len(self.cfg.decay_chain.isotopes)
+        populations = self.cfg.initial_populations()
+
+        times = [0.0]
+        history = [populations.copy()]
+        step_decays: list[numpy.ndarray] = []
+        step_energy: list[numpy.ndarray] = []
+        t = 0.0
+        while t < self.cfg.total_time:
+            dt = self._step_length(populations, self.cfg.total_time - t)
+            decays, energy = self._step(populations, dt)
+            # Summing the steps accumulates rounding errors, the last step
+            # ends exactly at total_time.
+            t = self.cfg.total_time if math.isclose(t + dt, self.cfg.total_time) else t + dt
+            times.append(t)
+            history.append(populations.copy())
+            step_decays.append(decays)
+            step_energy.append(energy)
+
+        return PopulationHistory(
+            times=numpy.array(times),
+            populations=numpy.stack(history, axis=1),
+            decays=numpy.stack(step_decays, axis=1) if step_decays else numpy.zeros((n, 0), dtype=numpy.int64),
+            energy=numpy.stack(step_energy, axis=1) if step_energy else numpy.zeros((n, 0), dtype=float),
+        )
@@ -0,0 +1,181 @@
+"""Wall time, memory and counters of the stages of a program.
+
+The entry points take a --profile option, which writes a JSON report of the
+run: the wall time and memory of each stage, like parsing the decay chain,
+simulating or plotting, and counters, like the number of events. With
+--cprofile, a cProfile dump of the run is written too, for pstats or
+snakeviz.
+
+Without these options the programs use a NullProfiler, which does nothing, so
+the instrumentation costs nothing measurable.
+
+The report looks like this:
+
+  {
+   "command": ["write_raw_events.py", "-o", "foo", ...],
+   "total_seconds": 12.3,
+   "peak_rss_mib": 180.2,
+   "stages": {
+    "simulate": {"seconds": 10.1, "calls": 10, "peak_rss_growth_mib": 120.5, "rss_mib": 150.3},
+    ...
+   },
+   "counters": {"events": 1577079, ...}
+  }
+
+A stage entered multiple times is summed up. Stages can be nested, then the
+outer one includes the time of the inner ones. peak_rss_growth_mib is how much
+the peak memory use of the process grew during the stage, rss_mib the memory
+use at the end of its last call.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import resource
+import sys
+import time
+from collections.abc import Iterable
+from collections.abc import Iterator
+
+
+def _current_rss() -> float | None:
+    """Returns the current memory use of the process in MiB, None if it is
+    not known on this platform."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+    except OSError:
+        return None
+
+
+def _peak_rss() -> float:
+    """Returns the peak memory use of the process in MiB."""
+    # On Linux, ru_maxrss is in kilobytes, on macOS in bytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+
+class Profiler:
+    """Records the stages and counters of a run, see the module docstring.
+
+    Attributes:
+      stages: The measurements of each stage, by name.
+      counters: The counters, by name.
+    """
+
+    def __init__(self, report_file_name: str | None = None, cprofile_file_name: str | None = None) -> None:
+        """Starts profiling.
+
+        Args:
+          report_file_name: Where write_report writes the JSON report. None to
+            not write it.
+          cprofile_file_name: Where write_report writes the cProfile dump. None
+            to not run cProfile.
+        """
+        self.stages: dict[str, dict] = {}
+        self.counters: dict[str, int] = {}
+        self._report_file_name = report_file_name
+        self._cprofile_file_name = cprofile_file_name
+        self._start = time.perf_counter()
+        self._cprofile = None
+        if cprofile_file_name is not None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """A context manager measuring a stage."""
+        peak_before = _peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            entry = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "peak_rss_growth_mib": 0.0,
+                                                  "rss_mib": None})
+            entry["seconds"] += seconds
+            entry["calls"] += 1
+            entry["peak_rss_growth_mib"] += _peak_rss() - peak_before
+            entry["rss_mib"] = _current_rss()
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Yields the items of iterable, measuring the production of each one
+        as the stage name. For generators doing the work of a stage, like a
+        simulation producing chunks."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Adds amount to a counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def count_bytes(self, file_names: Iterable[str]) -> None:
+        """Adds the size of files to the bytes_written counter."""
+        self.count("bytes_written", sum(os.path.getsize(f) for f in file_names if os.path.exists(f)))
+
+    def report(self) -> dict:
+        """Returns the report, as written to JSON."""
+        return {
+            "command": sys.argv,
+            "total_seconds": time.perf_counter() - self._start,
+            "peak_rss_mib": _peak_rss(),
+            "stages": self.stages,
+            "counters": self.counters,
+        }
+
+    def write_report(self) -> None:
+        """Writes the JSON report, and the cProfile dump, if requested."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self._cprofile_file_name)
+        if self._report_file_name is not None:
+            with open(self._report_file_name, "w") as f:
+                json.dump(self.report(), f, indent=1)
+                f.write("\n")
+
+
+class NullProfiler:
+    """A profiler with the interface of Profiler, which does nothing."""
+
+    def stage(self, name: str) -> contextlib.nullcontext:
+        return contextlib.nullcontext()
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterable:
+        return iterable
+
+    def count(self, name: str, amount: int = 1) -> None:
+        pass
+
+    def count_bytes(self, file_names: Iterable[str]) -> None:
+        pass
+
+    def write_report(self) -> None:
+        pass
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the --profile and --cprofile options to the parser of an entry
+    point."""
+    parser.add_argument("--profile", metavar="REPORT",
+                        help="Write the wall time and memory use of each stage of the run, and counters like the "
+                        "number of events, to this JSON file.")
+    parser.add_argument("--cprofile", metavar="DUMP",
+                        help="Run the program under cProfile, and write the statistics to this file, for pstats "
+                        "or snakeviz.")
+
+
+def from_args(args: argparse.Namespace) -> Profiler | NullProfiler:
+    """Returns the profiler requested by the options added by add_arguments."""
+    if args.profile is None and args.cprofile is None:
+        return NullProfiler()
+    return Profiler(args.profile, args.cprofile)
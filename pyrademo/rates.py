@@ -0,0 +1,199 @@
+"""Activity and released power over time, with bootstrap confidence intervals.
+
+The activity, the number of decays per second, and the released power, in MeV
+per second, of each isotope are averaged over time bins, see
+analysis.binned_rates.
+
+Their uncertainty is estimated with a bootstrap over the particles: a
+resampled simulation draws num_particles particles with replacement, and takes
+all the events of each drawn particle. This keeps the correlations between the
+decays of a particle, unlike resampling single events. A resample is
+represented by the number of times each particle is drawn, which weights its
+events, so the rates of a resample are again a weighted bincount over the
+events. The interval of a level, like 95%, is between the (1-level)/2 and the
+(1+level)/2 quantiles of the resampled rates.
+
+The resamples are run in batches on a process pool. The random generator of
+each batch is seeded with a child of a numpy.random.SeedSequence, so the
+intervals do not depend on the number of workers.
+"""
+
+from __future__ import annotations
+
+import collections
+import numpy
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Final
+
+from . import analysis
+from .model import DecayChain
+from .model import EventTable
+from .population import PopulationHistory
+
+# The number of resamples computed by a task.
+_BATCH_SIZE: Final[int] = 16
+
+
+@dataclass
+class RateSeries:
+    """The activity and the released power of the isotopes, in time bins.
+
+    Attributes:
+      edges: The edges of the bins, in seconds, shape (B+1,).
+      activity: The decays per second of each isotope, shape
+        (num_isotopes, B).
+      power: The released energy per second of each isotope, in MeV/s, shape
+        (num_isotopes, B).
+      level: The confidence level of the intervals, like 0.95.
+      activity_interval: The lower and upper ends of the confidence intervals
+        of the activity, shape (2, num_isotopes + 1, B). The last row is the
+        total of all isotopes. None without a bootstrap.
+      power_interval: The confidence intervals of the power, like
+        activity_interval.
+    """
+
+    edges: numpy.ndarray
+    activity: numpy.ndarray
+    power: numpy.ndarray
+    level: float = 0.95
+    activity_interval: numpy.ndarray | None = None
+    power_interval: numpy.ndarray | None = None
+
+    @property
+    def total_activity(self) -> numpy.ndarray:
+        """The decays per second of all the isotopes together."""
+        return self.activity.sum(axis=0)
+
+    @property
+    def total_power(self) -> numpy.ndarray:
+        """The released energy per second of all the isotopes together."""
+        return self.power.sum(axis=0)
+
+
+def time_bins(total_time: float, num_bins: int) -> numpy.ndarray:
+    """Returns the edges of num_bins equal bins from 0 to total_time."""
+    return numpy.linspace(0.0, total_time, num=num_bins + 1)
+
+
+# The weighted events of the bootstrap of a worker process, set up by
+# _init_worker.
+_worker_particles: numpy.ndarray | None = None
+_worker_keys: numpy.ndarray | None = None
+_worker_energy: numpy.ndarray | None = None
+_worker_shape: tuple[int, int] = (0, 0)
+_worker_widths: numpy.ndarray | None = None
+
+
+def _init_worker(particles: numpy.ndarray, keys: numpy.ndarray, energy: numpy.ndarray,
+                 shape: tuple[int, int], widths: numpy.ndarray) -> None:
+    global _worker_particles, _worker_keys, _worker_energy, _worker_shape, _worker_widths
+    _worker_particles = particles
+    _worker_keys = keys
+    _worker_energy = energy
+    _worker_shape = shape
+    _worker_widths = widths
+
+
+def _resample_batch(seed: numpy.random.SeedSequence, num_particles: int, size: int) -> numpy.ndarray:
+    """Computes the rates of size resamples in a worker process.
+
+    Returns:
+      The activity and the power of each resample, with the total of all
+      isotopes as the last row, shape (size, 2, num_isotopes + 1, B).
+    """
+    rng = numpy.random.default_rng(seed)
+    n, num_bins = _worker_shape
+    results = numpy.empty((size, 2, n + 1, num_bins), dtype=float)
+    for s in range(size):
+        draws = numpy.bincount(rng.integers(0, num_particles, size=num_particles), minlength=num_particles)
+        weights = draws[_worker_particles].astype(float)
+        for q, values in enumerate((weights, weights * _worker_energy)):
+            rates = numpy.bincount(_worker_keys, weights=values, minlength=n * num_bins).reshape(n, num_bins)
+            rates /= _worker_widths
+            results[s, q, :n] = rates
+            results[s, q, n] = rates.sum(axis=0)
+    return results
+
+
+def _run_batches(tasks: list[tuple], initargs: tuple, workers: int) -> Iterator[numpy.ndarray]:
+    """Runs _resample_batch(*task) for each task, and yields the results in
+    task order."""
+    if workers == 1:
+        _init_worker(*initargs)
+        for task in tasks:
+            yield _resample_batch(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+        pending: collections.deque = collections.deque()
+        for task in tasks:
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+            pending.append(pool.submit(_resample_batch, *task))
+        while pending:
+            yield pending.popleft().result()
+
+
+def rate_series(events: EventTable, decay_chain: DecayChain, num_particles: int, edges: numpy.ndarray,
+                num_resamples: int = 0, level: float = 0.95, workers: int = 1,
+                seed: int | None = None) -> RateSeries:
+    """Computes the activity and the released power of the isotopes of a
+    simulation, with bootstrap confidence intervals.
+
+    Args:
+      events: The events of the simulation. For a lumped decay chain, expand
+        them first with reduction.expand_events.
+      decay_chain: The decay chain of the simulation.
+      num_particles: The number of particles of the simulation.
+      edges: The increasing edges of the time bins, in seconds.
+      num_resamples: The number of bootstrap resamples. No intervals if 0.
+      level: The confidence level of the intervals.
+      workers: The number of worker processes of the bootstrap. With 1
+        worker, the resamples are computed in the current process.
+      seed: The seed of the random generators of the bootstrap, random if
+        None.
+
+    Returns:
+      The RateSeries.
+    """
+    edges = numpy.asarray(edges, dtype=float)
+    activity, power = analysis.binned_rates(events, decay_chain, edges)
+    series = RateSeries(edges, activity, power, level)
+    if num_resamples <= 0:
+        return series
+    if not 0.0 < level < 1.0:
+        raise ValueError("The confidence level must be between 0 and 1: {}".format(level))
+
+    n = len(decay_chain.isotopes)
+    keys, inside = analysis.bin_keys(n, numpy.asarray(events.from_isotope, dtype=numpy.int64),
+                                     numpy.asarray(events.time, dtype=float), edges)
+    initargs = (numpy.asarray(events.particle, dtype=numpy.int64)[inside], keys,
+                numpy.asarray(events.energy, dtype=float)[inside], (n, edges.size - 1), numpy.diff(edges))
+    sizes = [min(_BATCH_SIZE, num_resamples - start) for start in range(0, num_resamples, _BATCH_SIZE)]
+    seeds = numpy.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(batch_seed, num_particles, size) for batch_seed, size in zip(seeds, sizes)]
+    resamples = numpy.concatenate(list(_run_batches(tasks, initargs, workers)))
+
+    interval = numpy.quantile(resamples, [(1 - level) / 2, (1 + level) / 2], axis=0)
+    series.activity_interval = interval[:, 0]
+    series.power_interval = interval[:, 1]
+    return series
+
+
+def population_rate_series(history: PopulationHistory, edges: numpy.ndarray) -> RateSeries:
+    """Computes the activity and the released power of the isotopes of a
+    PopulationHistory, without intervals.
+
+    The decays and the energy of a step are assumed to be uniform within the
+    step, and are split among the bins it overlaps.
+    """
+    edges = numpy.asarray(edges, dtype=float)
+    widths = numpy.diff(edges)
+    rates = []
+    for per_step in (history.decays, history.energy):
+        cumulative = numpy.concatenate((numpy.zeros((per_step.shape[0], 1)), numpy.cumsum(per_step, axis=1)), axis=1)
+        at_edges = numpy.array([numpy.interp(edges, history.times, row) for row in cumulative])
+        rates.append(numpy.diff(at_edges, axis=1) / widths)
+    return RateSeries(edges, rates[0], rates[1])
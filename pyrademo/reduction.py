@@ -0,0 +1,131 @@
+"""Reduction of decay chains, by lumping short lived isotopes.
+
+Isotopes much shorter lived than the time resolution of a simulation are
+invisible on its plots, yet every particle passing through them produces an
+event. In the thorium chain, Po(216) with 0.145 s and Po(212) with 299 ns
+double the number of events.
+
+lump_short_lived folds such isotopes into the decays of their parents: a decay
+to a short lived isotope is replaced by one decay per branch of it, directly to
+its targets, with the combined energy, and the product of the probabilities.
+The lumped isotopes stay in the decay chain, with the same indices, but no
+particle reaches them anymore. Each lumped decay records the isotopes it passes
+through in Decay.via, so expand_events can restore their events.
+"""
+
+import numpy
+from math import log
+from typing import Final
+
+from .model import EVENT_FIELDS
+from .model import Decay
+from .model import DecayChain
+from .model import EventTable
+from .model import Isotope
+
+_LN2: Final[float] = log(2)
+
+
+def short_lived_isotopes(decay_chain: DecayChain, threshold: float, num_start: int = 1) -> list[int]:
+    """Returns the indices of the isotopes with a half life below threshold, in
+    seconds. The first num_start isotopes, the ones the particles start from,
+    are never included."""
+    return [isotope.index for isotope in decay_chain.isotopes[num_start:]
+            if isotope.decays and _LN2 / isotope.decays[0].rate < threshold]
+
+
+def lump_short_lived(decay_chain: DecayChain, threshold: float, num_start: int = 1) -> DecayChain:
+    """Folds the short lived isotopes of a decay chain into the decays of their
+    parents.
+
+    Args:
+      decay_chain: The decay chain, it is not changed.
+      threshold: The half life in seconds, below which isotopes are lumped.
+      num_start: The number of isotopes the particles start from, the first
+        ones of the decay chain, see read_decay_chain. They are never lumped.
+
+    Returns:
+      A new decay chain, with the same isotopes. The branches of the lumped
+      isotopes are preserved in the decays of their parents.
+    """
+    lumped = set(short_lived_isotopes(decay_chain, threshold, num_start))
+    # The decays of each isotope after folding. In reverse topological order,
+    # the decays of the targets are already folded.
+    folded: dict[int, list[Decay]] = {}
+    for i in reversed(decay_chain.topological_order()):
+        decays: list[Decay] = []
+        for decay in decay_chain.isotopes[i].decays:
+            if decay.to_isotope not in lumped:
+                decays.append(Decay(decay.rate, decay.probability, decay.to_isotope, decay.energy, decay.mode,
+                                    list(decay.via), list(decay.via_energy)))
+                continue
+            for child in folded[decay.to_isotope]:
+                decays.append(Decay(
+                    rate=decay.rate,
+                    probability=decay.probability * child.probability / 100.0,
+                    to_isotope=child.to_isotope,
+                    energy=decay.energy + child.energy,
+                    mode=decay.mode,
+                    via=[decay.to_isotope] + child.via,
+                    via_energy=[child.energy - sum(child.via_energy)] + child.via_energy,
+                ))
+        folded[i] = decays
+
+    result = DecayChain([Isotope(isotope.index, isotope.name, folded[isotope.index])
+                         for isotope in decay_chain.isotopes])
+    result.compiled()
+    return result
+
+
+def expand_events(events: EventTable, decay_chain: DecayChain) -> EventTable:
+    """Restores the events of the lumped isotopes.
+
+    Every event of a lumped decay is replaced by an event for each step of it,
+    all at the time of the lumped event, since the lumped isotopes decay
+    immediately on the time scale of the simulation. A decaying isotope can
+    have several decays to the same target, they are told apart by their
+    energy.
+
+    Args:
+      events: The events of a simulation with a lumped decay chain.
+      decay_chain: The lumped decay chain.
+
+    Returns:
+      The expanded events, in the same order, and with the same types. The
+      events themselves if the decay chain has no lumped decays.
+    """
+    lumped = [(isotope.index, decay) for isotope in decay_chain.isotopes for decay in isotope.decays if decay.via]
+    if not lumped:
+        return events
+
+    from_isotope = numpy.asarray(events.from_isotope)
+    to_isotope = numpy.asarray(events.to_isotope)
+    energy = numpy.asarray(events.energy, dtype=float)
+
+    lumped_index = {id(decay): k for k, (_, decay) in enumerate(lumped)}
+    # The index within lumped of the decay of each event, -1 for direct decays.
+    branch = numpy.full(from_isotope.size, -1, dtype=numpy.int64)
+    for parent, target in {(parent, decay.to_isotope) for parent, decay in lumped}:
+        candidates = [decay for decay in decay_chain.isotopes[parent].decays if decay.to_isotope == target]
+        matching = numpy.flatnonzero((from_isotope == parent) & (to_isotope == target))
+        distance = numpy.abs(energy[matching, numpy.newaxis] - numpy.array([d.energy for d in candidates]))
+        picked = numpy.argmin(distance, axis=1)
+        for c, decay in enumerate(candidates):
+            if decay.via:
+                branch[matching[picked == c]] = lumped_index[id(decay)]
+
+    steps = numpy.ones(from_isotope.size, dtype=numpy.int64)
+    for k, (_, decay) in enumerate(lumped):
+        steps[branch == k] = len(decay.via) + 1
+    expanded = EventTable(*(numpy.repeat(numpy.asarray(events[name]), steps) for name in EVENT_FIELDS))
+
+    starts = numpy.cumsum(steps) - steps
+    for k, (parent, decay) in enumerate(lumped):
+        first = starts[branch == k]
+        path = [parent] + decay.via + [decay.to_isotope]
+        energies = [decay.energy - sum(decay.via_energy)] + decay.via_energy
+        for step in range(len(path) - 1):
+            expanded.from_isotope[first + step] = path[step]
+            expanded.to_isotope[first + step] = path[step + 1]
+            expanded.energy[first + step] = energies[step]
+    return expanded
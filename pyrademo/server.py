@@ -0,0 +1,461 @@
+"""A local simulation server, for interactive demonstrations.
+
+Every run of write_raw_events.py pays for starting Python and NumPy, parsing
+the decay chain, and writing and reading the event files, before anything is
+plotted. The server keeps the parsed decay chains and a pool of worker
+processes warm, and sends the curves back while the particles are still being
+simulated, without any files.
+
+The protocol is HTTP on localhost, with JSON requests and newline delimited
+JSON responses:
+
+  GET /status
+    {"workers": 8, "decay_chains": 2, "requests": 10}
+
+  POST /simulate
+    {"decay_chain": "/abs/path/thorium.decaychain", "num_particles": 100000,
+     "total_time": "20 a", "seed": 1, "engine": "batch", "grid_points": 500,
+     "lump_threshold": null, "first_shard": 1000, "shard_size": 100000}
+  Only decay_chain, num_particles and total_time are required. The response
+  is a stream of messages, one per line:
+    {"type": "start", "isotopes": [...], "grid": [...], "num_particles": ...,
+     "total_time": ..., "seed": ...}
+    {"type": "progress", "particles": 1000, "events": 7890, "seconds": 0.01,
+     "populations": [[...], ...], "energy": [[...], ...]}
+    ...
+    {"type": "done", "particles": 100000, "events": 789012, "seconds": 1.2}
+  The particles are simulated in shards, the first of first_shard particles,
+  each following one twice as large, up to shard_size. A progress message is
+  sent after every shard, with the number of particles and the cumulative
+  released energy of each isotope on the grid, of the particles simulated so
+  far. Multiplied by num_particles / particles, they are an estimate of the
+  final curves. The population engine sends a single progress message.
+
+  POST /aggregate
+    {"input": "/abs/path/foo.sim", "grid_points": 500}
+  Reads the results of a simulation written by write_raw_events.py, and
+  responds with a start and a single progress message of its curves.
+
+Invalid requests get a 400 response with {"type": "error", "message": ...}.
+An error during a simulation ends the stream with an error message. Several
+requests are served at once, their shards share the worker pool.
+
+The server only listens on localhost, and reads any decay chain and
+simulation file the client names, so it is meant for a single user.
+"""
+
+from __future__ import annotations
+
+import collections
+import http.client
+import itertools
+import json
+import os
+import threading
+import time
+import urllib.parse
+import numpy
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Final
+
+from . import ensemble
+from . import model
+from . import population
+from . import reduction
+from .decaychain import read_decay_chain
+from .model import DecayChain
+from .model import SimulationConfig
+from .timeparser import parse_time_str
+
+DEFAULT_HOST: Final[str] = "127.0.0.1"
+DEFAULT_PORT: Final[int] = 8765
+DEFAULT_GRID_POINTS: Final[int] = 500
+DEFAULT_FIRST_SHARD: Final[int] = 1000
+DEFAULT_SHARD_SIZE: Final[int] = 100000
+
+
+@dataclass
+class SimulationRequest:
+    """The parameters of a POST /simulate request, see the module docstring."""
+
+    decay_chain: str
+    num_particles: int
+    total_time: str
+    seed: int | None = None
+    engine: str = "batch"
+    grid_points: int = DEFAULT_GRID_POINTS
+    lump_threshold: str | None = None
+    first_shard: int = DEFAULT_FIRST_SHARD
+    shard_size: int = DEFAULT_SHARD_SIZE
+
+    @staticmethod
+    def from_dict(d: dict) -> SimulationRequest:
+        """Parses a request.
+
+        Raises:
+          ValueError: If a parameter is missing, unknown, or invalid.
+        """
+        unknown = set(d) - set(SimulationRequest.__dataclass_fields__)
+        if unknown:
+            raise ValueError("Unknown parameters: {}".format(", ".join(sorted(unknown))))
+        for name, value in d.items():
+            _check_type(name, value, _PARAMETER_TYPES[name],
+                        SimulationRequest.__dataclass_fields__[name].default is None)
+        try:
+            request = SimulationRequest(**d)
+        except TypeError:
+            raise ValueError("decay_chain, num_particles and total_time are required") from None
+        if request.num_particles < 1:
+            raise ValueError("num_particles must be a positive integer")
+        if request.engine != "population" and request.engine not in ensemble.SIMULATORS:
+            raise ValueError("Unknown engine: {}".format(request.engine))
+        if request.grid_points < 2 or request.first_shard < 1 or request.shard_size < 1:
+            raise ValueError("grid_points must be at least 2, first_shard and shard_size positive")
+        return request
+
+
+# The JSON types of the parameters of a POST /simulate request.
+_PARAMETER_TYPES: Final[dict[str, type]] = {
+    "decay_chain": str,
+    "num_particles": int,
+    "total_time": str,
+    "seed": int,
+    "engine": str,
+    "grid_points": int,
+    "lump_threshold": str,
+    "first_shard": int,
+    "shard_size": int,
+}
+
+
+def _check_type(name: str, value, expected: type, optional: bool = False) -> None:
+    """Checks the JSON type of a request parameter.
+
+    Raises:
+      ValueError: If the value is not of the expected type, or None for an
+        optional parameter. JSON booleans are not integers.
+    """
+    if optional and value is None:
+        return
+    if isinstance(value, bool) or not isinstance(value, expected):
+        raise ValueError("{} must be {}, not {}".format(name, "an integer" if expected is int else "a string",
+                                                        json.dumps(value)))
+
+
+def shard_bounds(num_particles: int, first_shard: int, shard_size: int) -> Iterator[tuple[int, int]]:
+    """Yields the start and stop of each shard of particles: the first has
+    first_shard particles, and each following one is twice as large, up to
+    shard_size."""
+    start, size = 0, min(first_shard, shard_size)
+    while start < num_particles:
+        stop = min(start + size, num_particles)
+        yield start, stop
+        start, size = stop, min(2 * size, shard_size)
+
+
+def _simulate_shard(cfg: SimulationConfig, engine: str, start: int, stop: int, seed: numpy.random.SeedSequence,
+                    grid: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray, int]:
+    """Simulates a shard of particles in a worker process, and samples it on
+    the grid.
+
+    Returns:
+      The populations and the released energy of each isotope on the grid,
+      and the number of events, or of time steps of the population engine.
+    """
+    rng = numpy.random.default_rng(seed)
+    if engine == "population":
+        history = population.PopulationSimulator(cfg, rng).simulate()
+        populations, energy = history.sample(grid)
+        return populations, energy, history.times.size - 1
+    events, _ = ensemble.SIMULATORS[engine](cfg, rng)._simulate_particles(start, stop)
+    populations, energy = ensemble.bin_events(events, cfg.decay_chain, cfg.initial_populations(start, stop), grid)
+    return populations, energy, len(events)
+
+
+def _warm_up() -> None:
+    """Does nothing, to start a worker process."""
+
+
+class SimulationService:
+    """Runs the requests of the server on a pool of worker processes.
+
+    The decay chains are parsed once, and kept until their file changes.
+
+    Attributes:
+      workers: The number of worker processes.
+      requests: The number of requests served so far.
+    """
+
+    def __init__(self, workers: int) -> None:
+        self.workers = workers
+        self.requests = 0
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._chains: dict[tuple, DecayChain] = {}
+        self._lock = threading.Lock()
+
+    def warm_up(self, decay_chain_files: list[str]) -> None:
+        """Starts the worker processes, and parses decay chains in advance."""
+        for future in [self._pool.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        for file_name in decay_chain_files:
+            self.decay_chain(file_name)
+
+    def close(self) -> None:
+        """Stops the worker processes."""
+        self._pool.shutdown(cancel_futures=True)
+
+    def decay_chain(self, file_name: str, lump_threshold: str | None = None) -> DecayChain:
+        """Returns the parsed, and optionally lumped, decay chain of a file,
+        from the cache if the file did not change."""
+        file_name = os.path.abspath(file_name)
+        key = (file_name, os.stat(file_name).st_mtime_ns, lump_threshold)
+        with self._lock:
+            decay_chain = self._chains.get(key)
+        if decay_chain is None:
+            decay_chain = read_decay_chain(file_name)
+            if lump_threshold is not None:
+                decay_chain = reduction.lump_short_lived(decay_chain, parse_time_str(lump_threshold))
+            with self._lock:
+                # Older versions of the file are not needed anymore.
+                for old_key in [k for k in self._chains if k[0] == file_name and k[1] != key[1]]:
+                    del self._chains[old_key]
+                self._chains[key] = decay_chain
+        return decay_chain
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "decay_chains": len(self._chains), "requests": self.requests}
+
+    def _count_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def prepare(self, request: SimulationRequest) -> tuple[SimulationConfig, numpy.ndarray]:
+        """Returns the config and the grid of a request.
+
+        Raises:
+          ValueError: If the decay chain or the times are invalid.
+          OSError: If the decay chain file cannot be read.
+        """
+        cfg = SimulationConfig(
+            decay_chain=self.decay_chain(request.decay_chain, request.lump_threshold),
+            num_particles=request.num_particles,
+            total_time=parse_time_str(request.total_time),
+            file_base_name="",
+            seed=request.seed if request.seed is not None else numpy.random.SeedSequence().entropy,
+        )
+        return cfg, numpy.linspace(0.0, cfg.total_time, num=request.grid_points)
+
+    def simulate(self, cfg: SimulationConfig, grid: numpy.ndarray, request: SimulationRequest) -> Iterator[dict]:
+        """Runs a simulation, and yields its messages, see the module
+        docstring.
+
+        If the consumer stops early, like when the client disconnects, the
+        shards not started yet are cancelled.
+        """
+        self._count_request()
+        start_time = time.perf_counter()
+        yield _start_message(cfg, grid)
+
+        if request.engine == "population":
+            bounds = [(0, cfg.num_particles)]
+        else:
+            bounds = shard_bounds(cfg.num_particles, request.first_shard, request.shard_size)
+        # The children of a SeedSequence of cfg.seed, created one by one.
+        seeds = (numpy.random.SeedSequence(cfg.seed, spawn_key=(i,)) for i in itertools.count())
+        populations = numpy.zeros((len(cfg.decay_chain.isotopes), grid.size), dtype=numpy.int64)
+        energy = numpy.zeros(populations.shape, dtype=float)
+        particles = events = 0
+
+        # Only a limited number of shards are in flight, so that concurrent
+        # requests share the pool, and the first shards are done first.
+        pending: collections.deque = collections.deque()
+        tasks = iter(zip(bounds, seeds))
+        try:
+            while True:
+                for (start, stop), seed in tasks:
+                    pending.append((stop - start, self._pool.submit(
+                        _simulate_shard, cfg, request.engine, start, stop, seed, grid)))
+                    if len(pending) >= 2 * self.workers:
+                        break
+                if not pending:
+                    break
+                size, future = pending.popleft()
+                shard_populations, shard_energy, shard_events = future.result()
+                populations += shard_populations
+                energy += shard_energy
+                particles += size
+                events += shard_events
+                yield {"type": "progress", "particles": particles, "events": events,
+                       "seconds": time.perf_counter() - start_time,
+                       "populations": populations.tolist(), "energy": energy.tolist()}
+        finally:
+            for _, future in pending:
+                future.cancel()
+        yield {"type": "done", "particles": particles, "events": events, "seconds": time.perf_counter() - start_time}
+
+    def aggregate(self, file_name: str, grid_points: int) -> Iterator[dict]:
+        """Reads the results of a simulation, and yields its messages, see the
+        module docstring.
+
+        Raises:
+          ValueError, OSError: If the simulation cannot be read.
+        """
+        self._count_request()
+        start_time = time.perf_counter()
+        if population.has_populations(file_name):
+            cfg, history = population.read_populations(file_name)
+            grid = numpy.linspace(0.0, cfg.total_time, num=grid_points)
+            populations, energy = history.sample(grid)
+            num_events = history.times.size - 1
+        else:
+            cfg, events = model.read_event_columns(file_name)
+            grid = numpy.linspace(0.0, cfg.total_time, num=grid_points)
+            populations, energy = ensemble.bin_events(events, cfg.decay_chain, cfg.initial_populations(), grid)
+            num_events = len(events)
+        yield _start_message(cfg, grid)
+        seconds = time.perf_counter() - start_time
+        yield {"type": "progress", "particles": cfg.num_particles, "events": num_events, "seconds": seconds,
+               "populations": populations.tolist(), "energy": energy.tolist()}
+        yield {"type": "done", "particles": cfg.num_particles, "events": num_events, "seconds": seconds}
+
+
+def _start_message(cfg: SimulationConfig, grid: numpy.ndarray) -> dict:
+    return {"type": "start", "isotopes": [isotope.name for isotope in cfg.decay_chain.isotopes],
+            "grid": grid.tolist(), "num_particles": cfg.num_particles, "total_time": cfg.total_time,
+            "seed": cfg.seed}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serves the requests of a SimulationServer."""
+
+    server: SimulationServer
+
+    def _send_json(self, status: int, message: dict) -> None:
+        body = (json.dumps(message) + "\n").encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_stream(self, messages: Iterator[dict]) -> None:
+        """Sends messages as newline delimited JSON, each as soon as it is
+        ready. The end of the response is marked by closing the connection."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        try:
+            for message in messages:
+                self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client is gone. Closing the generator cancels the shards.
+            messages.close()
+        except Exception as e:
+            self.wfile.write((json.dumps({"type": "error", "message": str(e)}) + "\n").encode("utf-8"))
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            d = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError("Invalid JSON: {}".format(e)) from None
+        if not isinstance(d, dict):
+            raise ValueError("The request must be a JSON object")
+        return d
+
+    def do_GET(self) -> None:
+        if urllib.parse.urlparse(self.path).path == "/status":
+            self._send_json(200, self.server.service.status())
+        else:
+            self._send_json(404, {"type": "error", "message": "Unknown path: {}".format(self.path)})
+
+    def do_POST(self) -> None:
+        path = urllib.parse.urlparse(self.path).path
+        service = self.server.service
+        try:
+            d = self._read_json()
+            if path == "/simulate":
+                request = SimulationRequest.from_dict(d)
+                cfg, grid = service.prepare(request)
+                messages = service.simulate(cfg, grid, request)
+            elif path == "/aggregate":
+                if "input" not in d:
+                    raise ValueError("input is required")
+                grid_points = d.get("grid_points", DEFAULT_GRID_POINTS)
+                _check_type("input", d["input"], str)
+                _check_type("grid_points", grid_points, int)
+                if grid_points < 2:
+                    raise ValueError("grid_points must be at least 2")
+                messages = service.aggregate(d["input"], grid_points)
+                # Reads the simulation, so that its errors get a 400 response.
+                messages = _prefetched(messages)
+            else:
+                self._send_json(404, {"type": "error", "message": "Unknown path: {}".format(self.path)})
+                return
+        except (ValueError, OSError) as e:
+            self._send_json(400, {"type": "error", "message": str(e)})
+            return
+        self._send_stream(messages)
+
+
+def _prefetched(messages: Iterator[dict]) -> Iterator[dict]:
+    """Returns the messages, after computing the first one."""
+    first = next(messages)
+
+    def stream() -> Iterator[dict]:
+        yield first
+        yield from messages
+    return stream()
+
+
+class SimulationServer(ThreadingHTTPServer):
+    """The HTTP server of a SimulationService.
+
+    Attributes:
+      service: The SimulationService serving the requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service: SimulationService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+        super().__init__((host, port), _Handler)
+        self.service = service
+
+
+def request_messages(url: str, path: str, payload: dict | None = None,
+                     timeout: float | None = None) -> Iterator[dict]:
+    """Sends a request to a server, and yields the messages of the response
+    as they arrive.
+
+    Args:
+      url: The URL of the server, like http://127.0.0.1:8765.
+      path: The path of the request, like /simulate.
+      payload: The JSON body of a POST request. A GET request if None.
+      timeout: The timeout of the connection, in seconds.
+
+    Raises:
+      ValueError: If the server responds with an error.
+      OSError: If the server cannot be reached.
+    """
+    parsed = urllib.parse.urlparse(url)
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or DEFAULT_PORT, timeout=timeout)
+    try:
+        if payload is None:
+            connection.request("GET", path)
+        else:
+            connection.request("POST", path, body=json.dumps(payload).encode("utf-8"),
+                               headers={"Content-Type": "application/json"})
+        response = connection.getresponse()
+        for line in response:
+            message = json.loads(line)
+            if message.get("type") == "error" or response.status != 200:
+                raise ValueError(message.get("message", "Error {}".format(response.status)))
+            yield message
+    finally:
+        connection.close()
@@ -0,0 +1,347 @@
+"""Runs a simulation, and writes its results to files.
+
+The program behind write_raw_events.py and `python3 -m pyrademo simulate`.
+"""
+
+import argparse
+import contextlib
+import os
+import resource
+import shutil
+import numpy
+
+from . import cache
+from . import checkpoint
+from . import ensemble
+from . import eventfile
+from . import eventindex
+from . import model
+from . import population
+from . import profiling
+from . import reduction
+from . import simulation
+from . import timeparser
+from .decaychain import read_decay_chain
+
+
+def _parse_inventory_entry(s: str) -> tuple[str, int]:
+    """Parses an entry of the initial inventory, like Th(228)=1e6."""
+    name, separator, count = s.rpartition("=")
+    if not separator or not name:
+        raise argparse.ArgumentTypeError("expected <isotope>=<number of particles>: {}".format(s))
+    return name, timeparser.parse_count(count)
+
+
+def _parser(prog: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog=prog,
+        description="Runs a simulation, and writes the raw events to a file.",
+    )
+
+    parser.add_argument("-o", "--output_base", required=True,
+                        help="Basename of the output. Do not provide an extension. There will be three files "
+                        "written, a .sim, a .events.bin (or .events with --format text), and a .state.")
+    parser.add_argument("-n", "--num-particles", type=timeparser.parse_count,
+                        help="The number of particles. Scientific notation, like 1e15, is accepted.")
+    parser.add_argument("--decay-chain",
+                        help="File name of a decay chain file.")
+    parser.add_argument("--initial", type=_parse_inventory_entry, action="append", default=[],
+                        help="An isotope of the initial inventory, with its number of particles at time 0, like "
+                        "Th(228)=1e6. Can be given multiple times. Only the isotopes reachable from these are read "
+                        "from the decay chain file, so it can be a whole nuclide table. -n is their sum, and can be "
+                        "left out. By default all the particles start as the first isotope of the decay chain file.")
+    parser.add_argument("--total-time",
+                        help="The total time for the simulation. A string in the form of `<number> <unit>`. "
+                        "Available units: {}".format(timeparser.UNITS))
+    parser.add_argument("--lump-threshold",
+                        help="Lump the isotopes with a shorter half life than this into the decays of their "
+                        "parents, in the same form as --total-time. Their decays are not simulated as separate "
+                        "events, which makes the simulation faster and the output smaller.")
+    parser.add_argument("--engine", choices=["batch", "particle", "population"], default="batch",
+                        help="The simulation engine. `batch` simulates all particles at once with NumPy arrays, "
+                        "`particle` simulates the particles one by one. Both give statistically identical results. "
+                        "`population` only tracks the number of particles of each isotope in time steps, for "
+                        "realistic sample sizes like 1e15, and writes a .populations.npz file instead of events.")
+    parser.add_argument("--format", choices=["binary", "text"], default="binary",
+                        help="The format of the events file. `binary` writes a memory mappable .events.bin file, "
+                        "`text` writes a line oriented .events file.")
+    parser.add_argument("--chunk-size", type=int, default=100000,
+                        help="The number of particles simulated at once. The events of a chunk are written to the "
+                        "output before the next chunk is simulated, so this bounds the memory use. Each chunk has "
+                        "its own random generator, so together with --seed it determines the events.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="The number of processes simulating chunks in parallel.")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="The seed of the random generator. With the same seed and chunk size, the events are "
+                        "identical, whatever the number of workers. A random seed is used and recorded in the .sim "
+                        "file if not given.")
+    parser.add_argument("--extend-to",
+                        help="Instead of a new simulation, continue the existing simulation given by -o until this "
+                        "total time, in the same form as --total-time. The new events are appended to the existing "
+                        "events file. -n, --decay-chain, --total-time, --format and --seed are taken from the "
+                        "existing simulation.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Look up the simulation in the result cache, and only simulate if it is not there. "
+                        "The results of a simulation are stored in the cache. Needs --seed.")
+    parser.add_argument("--cache-dir",
+                        help="The directory of the result cache. Defaults to $PYRADEMO_CACHE_DIR or "
+                        "~/.cache/pyrademo.")
+    parser.add_argument("--cache-max-size", type=cache.parse_size, default=cache.DEFAULT_MAX_BYTES,
+                        help="The maximum size of the result cache, like 500M or 5G. The least recently used "
+                        "results are removed when it grows larger.")
+    parser.add_argument("--time-ordered", action="store_true",
+                        help="Write the events of all the particles in time order, instead of grouped by particle. "
+                        "They are generated lazily in time order, so the plot scripts do not need to sort them. "
+                        "--chunk-size is then the number of events written at once. No .state file is written, so "
+                        "it cannot be used with --extend-to, --cache, --workers or the population engine.")
+    parser.add_argument("--index", action="store_true",
+                        help="Also write a .events.idx file, an index of the events by isotope and time, for fast "
+                        "queries of time ranges. Needs the binary format.")
+    profiling.add_arguments(parser)
+    return parser
+
+
+def _remove_files(output_base: str, suffixes: list[str]) -> None:
+    """Removes the outputs of an earlier simulation with the same base name,
+    which the plot scripts could mistake for the new results."""
+    for suffix in suffixes:
+        if os.path.exists(output_base + suffix):
+            os.remove(output_base + suffix)
+
+
+def _output_files(output_base: str) -> list[str]:
+    """Returns the names of the files written by the simulation."""
+    return [output_base + suffix for suffix in
+            [".sim", ".events", ".events.bin", eventindex.INDEX_SUFFIX, ".state", population.POPULATIONS_SUFFIX]]
+
+
+def _print_peak_rss(message: str) -> None:
+    """Prints a message, followed by the peak memory use of the process."""
+    # On Linux, ru_maxrss is in kilobytes.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("{}, peak RSS: {:.1f} MiB".format(message, peak_rss / 1024))
+
+
+def _new_config(parser: argparse.ArgumentParser, args: argparse.Namespace,
+                profiler: profiling.Profiler | profiling.NullProfiler) -> model.SimulationConfig:
+    """Returns the config of a new simulation, from the options."""
+    if args.initial:
+        inventory = dict(args.initial)
+        if len(inventory) != len(args.initial):
+            parser.error("an isotope is given more than once with --initial")
+        if args.num_particles is not None and args.num_particles != sum(inventory.values()):
+            parser.error("-n is {}, but the --initial particles add up to {}".format(
+                args.num_particles, sum(inventory.values())))
+        args.num_particles = sum(inventory.values())
+    if args.num_particles is None or args.decay_chain is None or args.total_time is None:
+        parser.error("-n or --initial, --decay-chain and --total-time are required, unless --extend-to is given")
+
+    with profiler.stage("read_decay_chain"):
+        try:
+            decay_chain = read_decay_chain(args.decay_chain, [name for name, _ in args.initial] or None)
+        except ValueError as e:
+            parser.error(str(e))
+    profiler.count("isotopes", len(decay_chain.isotopes))
+    if args.lump_threshold is not None:
+        threshold = timeparser.parse_time_str(args.lump_threshold)
+        num_start = max(len(args.initial), 1)
+        lumped = reduction.short_lived_isotopes(decay_chain, threshold, num_start)
+        with profiler.stage("lump"):
+            decay_chain = reduction.lump_short_lived(decay_chain, threshold, num_start)
+        print("Lumped isotopes: {}".format(", ".join(decay_chain.isotopes[i].name for i in lumped) or "none"))
+
+    return model.SimulationConfig(
+        decay_chain=decay_chain,
+        num_particles=args.num_particles,
+        total_time=timeparser.parse_time_str(args.total_time),
+        file_base_name=args.output_base,
+        seed=args.seed if args.seed is not None else numpy.random.SeedSequence().entropy,
+        # The start isotopes are the first ones of the decay chain, in the
+        # order of --initial.
+        initial_inventory={i: count for i, (_, count) in enumerate(args.initial)} if args.initial else None,
+    )
+
+
+def _simulate_populations(args: argparse.Namespace, cfg: model.SimulationConfig,
+                          profiler: profiling.Profiler | profiling.NullProfiler) -> int:
+    """Runs the population engine."""
+    _remove_files(args.output_base, [".events", ".events.bin", eventindex.INDEX_SUFFIX, ".state",
+                                     ensemble.ENSEMBLE_SUFFIX])
+    population_simulator = population.PopulationSimulator(cfg)
+    with profiler.stage("simulate"):
+        history = population_simulator.simulate()
+    with profiler.stage("write"):
+        history.write_file(population.populations_file_name(args.output_base))
+        cfg.write_file()
+    profiler.count("steps", history.times.size - 1)
+    profiler.count("rng_draws", population_simulator.rng_draws)
+    profiler.count_bytes(_output_files(args.output_base))
+    profiler.write_report()
+    _print_peak_rss("Wrote {} steps".format(history.times.size - 1))
+    return 0
+
+
+def _write_index(args: argparse.Namespace, profiler: profiling.Profiler | profiling.NullProfiler) -> None:
+    """Writes the index of the events, if requested."""
+    if args.index:
+        with profiler.stage("index"):
+            eventindex.write_index(args.output_base)
+
+
+def _restore_from_cache(args: argparse.Namespace, cfg: model.SimulationConfig, binary: bool, entry: str) -> None:
+    """Copies the results of a simulation from a cache entry to the output."""
+    if binary:
+        shutil.copyfile(os.path.join(entry, cache.EVENTS_FILE), args.output_base + ".events.bin")
+        cfg.event_format = "binary"
+    else:
+        events = model.EventTable.from_columns(eventfile.read_events(os.path.join(entry, cache.EVENTS_FILE)))
+        with model.open_event_writer(cfg, binary=False) as writer:
+            for start in range(0, len(events), args.chunk_size):
+                writer.write(events[start:start + args.chunk_size])
+    shutil.copyfile(os.path.join(entry, cache.STATE_FILE), args.output_base + ".state")
+    cfg.write_file()
+
+
+def _simulate_time_ordered(args: argparse.Namespace, cfg: model.SimulationConfig, binary: bool,
+                           simulator_class: type[simulation.SimulationBase],
+                           profiler: profiling.Profiler | profiling.NullProfiler) -> int:
+    """Runs a simulation with --time-ordered."""
+    # The state of the particles is not kept, and the one of an earlier
+    # simulation does not match the new events.
+    _remove_files(args.output_base, [".state"])
+    simulator = simulator_class(cfg)
+    with (profiler.stage("simulate_and_write"),
+          model.open_event_writer(cfg, binary) as writer):
+        for events in profiler.iterate("simulate", simulator.simulate_time_ordered(args.chunk_size)):
+            with profiler.stage("write"):
+                writer.write(events)
+    cfg.write_file()
+    _write_index(args, profiler)
+    profiler.count("particles", cfg.num_particles)
+    profiler.count("events", writer.num_events)
+    profiler.count("rng_draws", simulator.rng_draws)
+    profiler.count_bytes(_output_files(args.output_base))
+    profiler.write_report()
+    _print_peak_rss("Wrote {} events in time order".format(writer.num_events))
+    return 0
+
+
+def main(argv: list[str], prog: str = "write_raw_events.py") -> int:
+    """Runs the program with the arguments argv, and returns its exit status.
+
+    Args:
+      argv: The arguments, without the program name.
+      prog: The name of the program in the help and the error messages.
+    """
+    parser = _parser(prog)
+    args = parser.parse_args(argv)
+    profiler = profiling.from_args(args)
+
+    if args.cache and (args.seed is None or args.extend_to is not None):
+        parser.error("--cache needs --seed, and cannot be used with --extend-to")
+    if args.engine == "population" and (args.cache or args.extend_to is not None or args.index):
+        parser.error("--cache, --extend-to and --index cannot be used with the population engine")
+    if args.time_ordered and (args.cache or args.extend_to is not None or args.workers > 1
+                              or args.engine == "population"):
+        parser.error("--time-ordered cannot be used with --cache, --extend-to, --workers or the population engine")
+
+    if args.extend_to is None:
+        cfg = _new_config(parser, args, profiler)
+        binary = args.format == "binary"
+    else:
+        if not os.path.exists(args.output_base + ".state"):
+            parser.error("{} cannot be extended, it has no .state file. Simulations written with --time-ordered, "
+                         "the population engine, or older versions cannot be continued".format(args.output_base))
+        with profiler.stage("read_config"):
+            cfg = model.SimulationConfig.from_file(args.output_base)
+        with profiler.stage("read_state"):
+            start_time, state = checkpoint.read_state(args.output_base + ".state")
+        cfg.total_time = timeparser.parse_time_str(args.extend_to)
+        if cfg.total_time <= start_time:
+            parser.error("--extend-to must be after the current total time of the simulation")
+        try:
+            _, binary = model.events_file_name(args.output_base, cfg)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.index and not binary:
+        parser.error("--index needs the binary format")
+
+    if args.engine == "population":
+        return _simulate_populations(args, cfg, profiler)
+    # An index of the events of an earlier simulation, or of the events before
+    # --extend-to, does not match the new events. Neither do the events of an
+    # earlier simulation in the other format, which the readers could pick.
+    _remove_files(args.output_base, [".events" if binary else ".events.bin", population.POPULATIONS_SUFFIX,
+                                     eventindex.INDEX_SUFFIX, ensemble.ENSEMBLE_SUFFIX])
+
+    if args.cache:
+        result_cache = cache.ResultCache(args.cache_dir, args.cache_max_size)
+        cache_key = cache.cache_key(cfg, args.engine, args.chunk_size)
+        entry = result_cache.lookup(cache_key)
+        if entry is not None:
+            with profiler.stage("restore_from_cache"):
+                _restore_from_cache(args, cfg, binary, entry)
+            _write_index(args, profiler)
+            profiler.count_bytes(_output_files(args.output_base))
+            profiler.write_report()
+            print("Found the simulation in the cache: {}".format(entry))
+            return 0
+
+    if args.engine == "batch":
+        simulator_class = simulation.BatchSimulator
+    else:
+        simulator_class = simulation.RawSimulator
+
+    if args.time_ordered:
+        return _simulate_time_ordered(args, cfg, binary, simulator_class, profiler)
+
+    simulator = simulation.ParallelSimulator(cfg, simulator_class, workers=args.workers)
+
+    if args.extend_to is None:
+        chunks = simulator.simulate_chunks(args.chunk_size)
+    else:
+        chunks = simulator.continue_chunks(state, start_time, args.chunk_size)
+
+    # The new state is written next to the old one, since the old one is still
+    # read while continuing a simulation.
+    # The cache always holds binary events, so text output is also written to a
+    # temporary binary file when caching.
+    cache_events_file = args.output_base + ".events.bin" if binary else args.output_base + ".events.bin.tmp"
+    # The simulate and write stages are within this one, which also includes
+    # assembling the output files.
+    with (profiler.stage("simulate_and_write"),
+          model.open_event_writer(cfg, binary, append=args.extend_to is not None) as writer,
+          checkpoint.StateWriter(args.output_base + ".state.new", cfg.total_time) as state_writer,
+          eventfile.EventWriter(cache_events_file, len(cfg.decay_chain.isotopes)) if args.cache and not binary
+          else contextlib.nullcontext() as cache_writer):
+        # With --extend-to, a binary writer counts the events it copied from
+        # the existing file.
+        num_existing_events = writer.num_events
+        for events, chunk_state in profiler.iterate("simulate", chunks):
+            with profiler.stage("write"):
+                writer.write(events)
+                state_writer.write(chunk_state)
+                if cache_writer is not None:
+                    cache_writer.write(events)
+    os.replace(args.output_base + ".state.new", args.output_base + ".state")
+    cfg.write_file()
+    _write_index(args, profiler)
+
+    if args.cache:
+        with profiler.stage("cache_store"):
+            result_cache.store(cache_key, cfg, args.engine, cache_events_file, args.output_base + ".state")
+        if not binary:
+            os.remove(cache_events_file)
+
+    num_events = writer.num_events - num_existing_events
+    profiler.count("particles", cfg.num_particles)
+    profiler.count("events", num_events)
+    profiler.count("rng_draws", simulator.rng_draws)
+    profiler.count_bytes(_output_files(args.output_base))
+    profiler.write_report()
+
+    _print_peak_rss("Wrote {} events".format(num_events))
+    if args.workers > 1:
+        worker_peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        print("Peak RSS of the largest worker: {:.1f} MiB".format(worker_peak_rss / 1024))
+    return 0
@@ -1,13 +1,25 @@
 """Simulation code for a concrete decay process."""
 
+import bisect
+import collections
+import heapq
 import numpy
+from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 
+from .checkpoint import ParticleState
 from .model import DecayEvent
-from .model import DecayChain
-from .model import Isotope
+from .model import EventTable
 from .model import SimulationConfig
 
+# The version of the simulation algorithms. It must be increased whenever a
+# change makes the same config, seed and engine produce different events, since
+# cached results are only valid for the same version.
+ENGINE_VERSION = 2
+
 
 class SimulationBase:
     """A base class for simulations of a concrete decay process.
@@ -16,83 +28,491 @@ class SimulationBase:
 
     Attributes:
       cfg: SimulationConfig, holding the main options for the simulation.
+      rng: The random generator. If not given, a new one is created, seeded
+        from cfg.seed.
+      chain: The compiled decay chain of cfg.
+      rng_draws: The number of random numbers drawn so far.
     """
 
-    def __init__(self, cfg: SimulationConfig, rng: numpy.random.Generator = numpy.random.default_rng()) -> None:
+    def __init__(self, cfg: SimulationConfig, rng: numpy.random.Generator | None = None) -> None:
         self.cfg = cfg
-        self.rng = rng
+        self.rng = rng if rng is not None else numpy.random.default_rng(cfg.seed)
+        self.chain = cfg.decay_chain.compiled()
+        self.rng_draws = 0
+        # Scalar lookups into Python lists are much faster than into NumPy
+        # arrays, for the decays drawn one by one.
+        self._rate = self.chain.rate.tolist()
+        self._cumulative_probability = self.chain.cumulative_probability.tolist()
+        self._to_isotope = self.chain.to_isotope.tolist()
+        self._energy = self.chain.energy.tolist()
 
-    def _generate_decay_event(self, particle: int, isotope: Isotope, t: float) -> DecayEvent | None:
+    def _generate_decay_event(self, particle: int, isotope: int, t: float) -> DecayEvent | None:
         """Given an isotope, generates a random decay event.
 
-        In case only one decay mode is possible, it chooses that. If both alpha
-        and beta decay is available from the isotope, then it takes the
-        probability parameter of the decays into account to draw a decay type.
+        First draws the branch, according to the probabilities of the decays of
+        the isotope, then the decay time, with the total rate of the isotope.
 
         Args:
           particle: The index of the particle. Only used to fill in to
-          DecayEvent. isotope: The isotope for which to compute the decay event.
+            DecayEvent.
+          isotope: The index of the isotope for which to compute the decay
+            event.
           t: The absolute time when the simulated single decay process starts.
 
         Returns:
           A DecayEvent, or None, if the isotope is stable.
         """
-        decay = isotope.pick_decay(self.rng)
-        if decay is None:
+        rate = self._rate[isotope]
+        if rate == 0.0:
             return None
 
-        decay_time = t + self.rng.exponential(1.0 / decay.rate)
+        branch = bisect.bisect_right(self._cumulative_probability[isotope], self.rng.uniform(0.0, 100.0))
+        decay_time = t + self.rng.exponential(1.0 / rate)
+        self.rng_draws += 2
 
         return DecayEvent(
             particle=particle,
-            from_isotope=isotope.index,
-            to_isotope=decay.to_isotope,
+            from_isotope=isotope,
+            to_isotope=self._to_isotope[isotope][branch],
             time=decay_time,
-            energy=decay.energy,
+            energy=self._energy[isotope][branch],
         )
 
-    def simulate_one_particle(self, particle: int) -> list[DecayEvent]:
-        """Simulates one particle.
+    def _follow_particle(self, particle: int, isotope_id: int,
+                         decay_event: DecayEvent | None) -> tuple[list[DecayEvent], int, DecayEvent | None]:
+        """Follows a particle from its pending decay, until `total_time`.
 
-        Assumes it to start from isotope 0 of the decay chain. Stops when either
-        the particle reaches a stable isotope, or if the randomly chosen next
-        decay time is after `total_time`.
+        Args:
+          particle: The index of the particle.
+          isotope_id: The current isotope of the particle.
+          decay_event: The pending decay of the particle, None if the isotope
+            is stable.
 
         Returns:
-          DecayEvent objects, which all have their time within [0, total_time].
+          The DecayEvent objects within [0, total_time], the isotope of the
+          particle after them, and its pending decay after total_time, or None
+          if it reached a stable isotope.
         """
         events: list[DecayEvent] = []
-        t = 0.0
-        isotope_id = 0
-
-        while True:
-            isotope = self.cfg.decay_chain.isotopes[isotope_id]
-            decay_event = self._generate_decay_event(particle, isotope, t)
-            if decay_event is None:
-                break
-            if decay_event.time > self.cfg.total_time:
-                break
+
+        while decay_event is not None and decay_event.time <= self.cfg.total_time:
             events.append(decay_event)
-            t = decay_event.time
             isotope_id = decay_event.to_isotope
+            decay_event = self._generate_decay_event(particle, isotope_id, decay_event.time)
+
+        return events, isotope_id, decay_event
 
+    def simulate_one_particle(self, particle: int) -> list[DecayEvent]:
+        """Simulates one particle.
+
+        It starts from its isotope in the initial inventory of the config,
+        isotope 0 of the decay chain by default. Stops when either the particle
+        reaches a stable isotope, or if the randomly chosen next decay time is
+        after `total_time`.
+
+        Returns:
+          DecayEvent objects, which all have their time within [0, total_time].
+        """
+        isotope_id = int(self.cfg.initial_isotopes(particle, particle + 1)[0])
+        events, _, _ = self._follow_particle(particle, isotope_id,
+                                             self._generate_decay_event(particle, isotope_id, 0.0))
         return events
 
+    def _follow_particles(self, start: int, isotope_ids: list[int],
+                          pending: list[DecayEvent | None]) -> tuple[EventTable, ParticleState]:
+        """Follows consecutive particles one by one, see _follow_particle."""
+        events: list[DecayEvent] = []
+        state = ParticleState(
+            isotope=numpy.zeros(len(pending), dtype=numpy.int64),
+            next_time=numpy.full(len(pending), numpy.inf),
+            next_to_isotope=numpy.zeros(len(pending), dtype=numpy.int64),
+            next_energy=numpy.zeros(len(pending), dtype=float),
+        )
+        for i, (isotope_id, decay_event) in enumerate(zip(isotope_ids, pending)):
+            particle_events, isotope_id, decay_event = self._follow_particle(start + i, isotope_id, decay_event)
+            events.extend(particle_events)
+            state.isotope[i] = isotope_id
+            state.next_to_isotope[i] = isotope_id
+            if decay_event is not None:
+                state.next_time[i] = decay_event.time
+                state.next_to_isotope[i] = decay_event.to_isotope
+                state.next_energy[i] = decay_event.energy
+        return EventTable.from_events(events), state
+
+    def _simulate_particles(self, start: int, stop: int) -> tuple[EventTable, ParticleState]:
+        """Simulates the particles with index in [start, stop).
+
+        Returns:
+          The events, and the state of the particles at the end.
+        """
+        isotope_ids = self.cfg.initial_isotopes(start, stop).tolist()
+        pending = [self._generate_decay_event(start + i, isotope_id, 0.0) for i, isotope_id in enumerate(isotope_ids)]
+        return self._follow_particles(start, isotope_ids, pending)
+
+    def _continue_particles(self, start: int, state: ParticleState) -> tuple[EventTable, ParticleState]:
+        """Continues the simulation of consecutive particles from a saved state,
+        until `total_time`.
+
+        Args:
+          start: The index of the first particle.
+          state: The state of the particles, when the simulation stopped.
+
+        Returns:
+          The new events, and the state of the particles at the end.
+        """
+        pending: list[DecayEvent | None] = []
+        for i, (isotope_id, time, to_isotope, energy) in enumerate(zip(
+                state.isotope.tolist(), state.next_time.tolist(),
+                state.next_to_isotope.tolist(), state.next_energy.tolist())):
+            pending.append(DecayEvent(start + i, isotope_id, to_isotope, time, energy) if time != numpy.inf else None)
+        return self._follow_particles(start, state.isotope.tolist(), pending)
+
+    def simulate_columns(self) -> EventTable:
+        """Runs the simulation, and returns all the events at once."""
+        columns, _ = self._simulate_particles(0, self.cfg.num_particles)
+        return columns
+
+    def simulate_chunks(self, chunk_size: int) -> Iterator[tuple[EventTable, ParticleState]]:
+        """Runs the simulation, chunk_size particles at a time.
+
+        Only the events of one chunk are held in memory at once, so the memory
+        use does not depend on the number of particles.
+
+        Args:
+          chunk_size: The number of particles in a chunk.
+
+        Yields:
+          The events of each chunk, and the state of its particles at the end.
+          The chunks are in particle order.
+        """
+        for start in range(0, self.cfg.num_particles, chunk_size):
+            yield self._simulate_particles(start, min(start + chunk_size, self.cfg.num_particles))
+
+    def simulate_time_ordered(self, chunk_size: int) -> Iterator[EventTable]:
+        """Runs the simulation, and yields the events of all the particles in
+        time order, like the readout of a detector.
+
+        The pending decays of the particles are kept in a heap, and the
+        earliest one is taken, and replaced by the next decay of its particle,
+        until none is left within `total_time`. The events are generated
+        lazily, so the memory use is proportional to the number of particles
+        still decaying, not to the number of events.
+
+        The events follow the same distribution as the ones of simulate, but
+        the random numbers are drawn in a different order, so the same seed
+        gives different events.
+
+        Args:
+          chunk_size: The number of events in a chunk.
+
+        Yields:
+          The events in chunks, ordered by time, and by particle for the same
+          time.
+        """
+        isotope_ids = self.cfg.initial_isotopes(0, self.cfg.num_particles).tolist()
+        heap: list[tuple[float, int, DecayEvent]] = []
+        for p, isotope_id in enumerate(isotope_ids):
+            decay_event = self._generate_decay_event(p, isotope_id, 0.0)
+            if decay_event is not None and decay_event.time <= self.cfg.total_time:
+                heap.append((decay_event.time, p, decay_event))
+        heapq.heapify(heap)
+
+        events: list[DecayEvent] = []
+        while heap:
+            _, p, decay_event = heap[0]
+            events.append(decay_event)
+            decay_event = self._generate_decay_event(p, decay_event.to_isotope, decay_event.time)
+            if decay_event is not None and decay_event.time <= self.cfg.total_time:
+                heapq.heapreplace(heap, (decay_event.time, p, decay_event))
+            else:
+                heapq.heappop(heap)
+            if len(events) == chunk_size:
+                yield EventTable.from_events(events)
+                events = []
+        if events:
+            yield EventTable.from_events(events)
+
 
 class RawSimulator(SimulationBase):
     """Runs the simulation, and provides the raw events.
 
     Given a decay chain, and a number of particles, all assumed to be the 0th
-    isotope of the decay chain, the simulation will generate for each particle
-    random times, when the particle experienced alpha or beta decay. The
+    isotope of the decay chain, unless the config has an initial inventory,
+    the simulation will generate for each particle
+    random times, when the particle decayed, and the decay it experienced. The
     simulation process is started with a total_time parameter. The simulation
     ends for a particle, when first a decay time leads to after the total_time
     elapsed."""
 
-    def simulate(self) -> list[DecayEvent]:
+    def simulate(self) -> EventTable:
         events: list[DecayEvent] = []
 
-        for p in range(self.cfg.num_particles):
-            events.extend(self.simulate_one_particle(p))
+        isotope_ids = self.cfg.initial_isotopes(0, self.cfg.num_particles).tolist()
+        for p, isotope_id in enumerate(isotope_ids):
+            particle_events, _, _ = self._follow_particle(p, isotope_id, self._generate_decay_event(p, isotope_id, 0.0))
+            events.extend(particle_events)
 
-        return events
+        return EventTable.from_events(events)
+
+
+class BatchSimulator(SimulationBase):
+    """Runs the same simulation as RawSimulator, but on all particles at once.
+
+    Instead of following one particle until it stops, all the particles are
+    moved through the decay chain together, one decay at a time. In each round
+    the branch and the decay time is drawn for every still active particle
+    with a single call to the random generator, and the particles which reached
+    a stable isotope, or whose next decay is after `total_time`, are dropped.
+
+    The generated events follow the same distribution as the ones of
+    RawSimulator, and they are returned in the same order: grouped by
+    particle, and in time order within a particle.
+    """
+
+    def _draw_decays(self, isotope: numpy.ndarray, t: numpy.ndarray) -> tuple[numpy.ndarray, ...]:
+        """Draws the next decay of particles.
+
+        Args:
+          isotope: The current isotope of each particle.
+          t: The time each particle became its current isotope.
+
+        Returns:
+          The time, target and energy of the next decay of each particle, as
+          in ParticleState.
+        """
+        chain = self.chain
+        # The same order of random draws as in _generate_decay_event: first the
+        # branch, then the decay time.
+        branch = chain.pick_branches(isotope, self.rng.uniform(0.0, 100.0, size=isotope.size))
+        stable = chain.stable[isotope]
+        with numpy.errstate(divide="ignore"):
+            next_time = t + self.rng.standard_exponential(isotope.size) / chain.rate[isotope]
+        next_time[stable] = numpy.inf
+        self.rng_draws += 2 * isotope.size
+        # The padding of stable isotopes targets the isotope itself, with 0
+        # energy, as ParticleState expects.
+        return next_time, chain.to_isotope[isotope, branch], chain.energy[isotope, branch]
+
+    def _continue_particles(self, start: int, state: ParticleState) -> tuple[EventTable, ParticleState]:
+        state = state.slice(0, len(state))
+        particle = numpy.arange(start, start + len(state), dtype=numpy.int64)
+
+        rounds: list[tuple[numpy.ndarray, ...]] = []
+        # The particles, whose pending decay is within total_time.
+        active = numpy.flatnonzero(state.next_time <= self.cfg.total_time)
+        while active.size > 0:
+            from_isotope = state.isotope[active]
+            to_isotope = state.next_to_isotope[active]
+            t = state.next_time[active]
+            rounds.append((particle[active], from_isotope, to_isotope, t, state.next_energy[active]))
+
+            state.isotope[active] = to_isotope
+            next_time, next_to_isotope, next_energy = self._draw_decays(to_isotope, t)
+            state.next_time[active] = next_time
+            state.next_to_isotope[active] = next_to_isotope
+            state.next_energy[active] = next_energy
+
+            active = active[next_time <= self.cfg.total_time]
+
+        if not rounds:
+            return EventTable.empty(), state
+        columns = [numpy.concatenate(c) for c in zip(*rounds)]
+        # Within a round the particles are in increasing order, and the rounds
+        # are in time order per particle, so a stable sort by particle gives
+        # the same order as RawSimulator.
+        order = numpy.argsort(columns[0], kind="stable")
+        return EventTable(*(column[order] for column in columns)), state
+
+    def _simulate_particles(self, start: int, stop: int) -> tuple[EventTable, ParticleState]:
+        isotope = self.cfg.initial_isotopes(start, stop)
+        next_time, next_to_isotope, next_energy = self._draw_decays(isotope, numpy.zeros(stop - start))
+        return self._continue_particles(start, ParticleState(isotope, next_time, next_to_isotope, next_energy))
+
+    def simulate(self) -> EventTable:
+        """Runs the simulation, like simulate_columns."""
+        return self.simulate_columns()
+
+    def simulate_time_ordered(self, chunk_size: int) -> Iterator[EventTable]:
+        """Runs the simulation, and yields the events of all the particles in
+        time order, like SimulationBase.simulate_time_ordered.
+
+        Instead of taking the pending decays from a heap one by one, a window
+        of time is processed at once: it ends at the chunk_size-th earliest
+        pending decay, found with numpy.partition. All the decays before its
+        end are drawn in rounds, like in _continue_particles, including the
+        ones of short lived isotopes created within the window, and only the
+        events of the window are sorted. A chunk has about chunk_size events,
+        more if short lived isotopes decay within its window.
+        """
+        total_time = self.cfg.total_time
+        isotope = self.cfg.initial_isotopes(0, self.cfg.num_particles)
+        next_time, next_to_isotope, next_energy = self._draw_decays(isotope, numpy.zeros(isotope.size))
+        particle = numpy.arange(isotope.size, dtype=numpy.int64)
+        # The particles still decaying within total_time.
+        live = next_time <= total_time
+        particle, isotope, next_time, next_to_isotope, next_energy = (
+            a[live] for a in (particle, isotope, next_time, next_to_isotope, next_energy))
+
+        while particle.size > 0:
+            end = numpy.inf
+            if particle.size > chunk_size:
+                end = numpy.partition(next_time, chunk_size)[chunk_size]
+                # Makes progress, even if many decays have the same time.
+                end = max(end, numpy.nextafter(next_time.min(), numpy.inf))
+
+            rounds: list[tuple[numpy.ndarray, ...]] = []
+            active = numpy.flatnonzero(next_time < end)
+            while active.size > 0:
+                to_isotope = next_to_isotope[active]
+                t = next_time[active]
+                rounds.append((particle[active], isotope[active], to_isotope, t, next_energy[active]))
+
+                isotope[active] = to_isotope
+                t, next_to_isotope[active], next_energy[active] = self._draw_decays(to_isotope, t)
+                next_time[active] = t
+                active = active[(t < end) & (t <= total_time)]
+
+            live = next_time <= total_time
+            particle, isotope, next_time, next_to_isotope, next_energy = (
+                a[live] for a in (particle, isotope, next_time, next_to_isotope, next_energy))
+
+            columns = [numpy.concatenate(c) for c in zip(*rounds)]
+            order = numpy.lexsort((columns[0], columns[3]))
+            yield EventTable(*(column[order] for column in columns))
+
+
+# The simulator of a worker process of ParallelSimulator, set up by
+# _init_worker.
+_worker_simulator: SimulationBase | None = None
+
+
+def _init_worker(simulator_class: type[SimulationBase], cfg: SimulationConfig) -> None:
+    global _worker_simulator
+    _worker_simulator = simulator_class(cfg)
+
+
+def _simulate_shard(start: int, stop: int,
+                    seed: numpy.random.SeedSequence) -> tuple[EventTable, ParticleState, int]:
+    """Simulates one shard of particles in a worker process.
+
+    Returns:
+      The events, the state of the particles, and the number of random
+      numbers drawn.
+    """
+    _worker_simulator.rng = numpy.random.default_rng(seed)
+    _worker_simulator.rng_draws = 0
+    columns, state = _worker_simulator._simulate_particles(start, stop)
+    return columns, state, _worker_simulator.rng_draws
+
+
+def _continue_shard(start: int, state: ParticleState,
+                    seed: numpy.random.SeedSequence) -> tuple[EventTable, ParticleState, int]:
+    """Continues one shard of particles in a worker process, like
+    _simulate_shard."""
+    _worker_simulator.rng = numpy.random.default_rng(seed)
+    _worker_simulator.rng_draws = 0
+    columns, state = _worker_simulator._continue_particles(start, state)
+    return columns, state, _worker_simulator.rng_draws
+
+
+class ParallelSimulator:
+    """Runs a simulation on multiple cores.
+
+    The particles are split into shards of consecutive particles, and the
+    shards are simulated in a process pool, each with its own random generator.
+    The generators are seeded with the children of a numpy.random.SeedSequence
+    created from cfg.seed, one child per shard. As the shards do not depend on
+    the number of workers, the same seed and shard size give bit-identical
+    events for any number of workers.
+
+    Attributes:
+      cfg: SimulationConfig, holding the main options for the simulation.
+      simulator_class: The simulator used for the shards, BatchSimulator or
+        RawSimulator.
+      workers: The number of worker processes. With 1 worker, the shards are
+        simulated in the current process.
+      rng_draws: The number of random numbers drawn by all the workers so
+        far.
+    """
+
+    def __init__(self, cfg: SimulationConfig, simulator_class: type[SimulationBase] | None = None,
+                 workers: int = 1) -> None:
+        self.cfg = cfg
+        self.simulator_class = simulator_class if simulator_class is not None else BatchSimulator
+        self.workers = workers
+        self.rng_draws = 0
+
+    def _run(self, function: Callable, tasks: Iterable[tuple]) -> Iterator[tuple[EventTable, ParticleState]]:
+        """Runs function(*task) for each task on the workers, and yields the
+        events and states in task order. The tasks are only created when they
+        are submitted."""
+        for columns, state, rng_draws in self._run_tasks(function, tasks):
+            self.rng_draws += rng_draws
+            yield columns, state
+
+    def _run_tasks(self, function: Callable, tasks: Iterable[tuple]) -> Iterator[tuple]:
+        """Runs function(*task) for each task on the workers, and yields the
+        results in task order."""
+        if self.workers == 1:
+            _init_worker(self.simulator_class, self.cfg)
+            for task in tasks:
+                yield function(*task)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(self.simulator_class, self.cfg)) as pool:
+            # Only a limited number of shards are in flight, so the results
+            # waiting to be consumed do not pile up in memory.
+            pending: collections.deque = collections.deque()
+            for task in tasks:
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+                pending.append(pool.submit(function, *task))
+            while pending:
+                yield pending.popleft().result()
+
+    def simulate_chunks(self, shard_size: int) -> Iterator[tuple[EventTable, ParticleState]]:
+        """Runs the simulation.
+
+        Args:
+          shard_size: The number of particles in a shard. Part of the seed: a
+            different shard size gives different events.
+
+        Yields:
+          The events of each shard, and the state of its particles at the end.
+          The shards are in particle order.
+        """
+        starts = range(0, self.cfg.num_particles, shard_size)
+        seeds = numpy.random.SeedSequence(self.cfg.seed).spawn(len(starts))
+        tasks = [(start, min(start + shard_size, self.cfg.num_particles), seed)
+                 for start, seed in zip(starts, seeds)]
+        yield from self._run(_simulate_shard, tasks)
+
+    def continue_chunks(self, state: ParticleState, start_time: float,
+                        shard_size: int) -> Iterator[tuple[EventTable, ParticleState]]:
+        """Continues a simulation from the state of its particles, until
+        cfg.total_time.
+
+        Args:
+          state: The state of all the particles, at the end of the simulation
+            to continue.
+          start_time: The total_time of the simulation to continue. Together
+            with cfg.seed, it seeds the random generators.
+          shard_size: The number of particles in a shard.
+
+        Yields:
+          The new events of each shard, and the state of its particles at the
+          end, like simulate_chunks.
+        """
+        # The random generators must be independent from the ones of the
+        # simulation being continued, and of its other continuations.
+        time_bits = int(numpy.array(start_time, dtype=numpy.float64).view(numpy.uint64))
+        entropy = [self.cfg.seed, time_bits] if self.cfg.seed is not None else None
+        starts = range(0, len(state), shard_size)
+        seeds = numpy.random.SeedSequence(entropy).spawn(len(starts))
+        tasks = ((start, state.slice(start, start + shard_size), seed) for start, seed in zip(starts, seeds))
+        yield from self._run(_continue_shard, tasks)
+
+    def simulate_columns(self, shard_size: int) -> EventTable:
+        """Runs the simulation, and returns all the events at once."""
+        return EventTable.concatenate(events for events, _ in self.simulate_chunks(shard_size))
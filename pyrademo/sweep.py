@@ -0,0 +1,245 @@
+"""Runs simulations for a grid of decay chains, particle counts and total
+times, and plots their figures.
+
+Each point of the grid is simulated, aggregated and plotted in one go, in
+memory, by a worker process. The decay chains are parsed once, and handed to
+the workers when they start. The points are submitted largest first, so a
+long simulation does not start last and delay the end of the sweep.
+"""
+
+from __future__ import annotations
+
+import time
+import numpy
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from dataclasses import field
+
+from . import analysis
+from . import bateman
+from . import model
+from . import population
+from . import reduction
+from . import simulation
+from .timeparser import parse_time_str
+
+
+@dataclass
+class SweepPoint:
+    """A point of the grid of a sweep.
+
+    Attributes:
+      chain: The index of the decay chain in the list of the sweep.
+      num_particles: The number of particles.
+      total_time: The total time, in seconds.
+      file_base_name: The base name of the output files of the point.
+    """
+
+    chain: int
+    num_particles: int
+    total_time: float
+    file_base_name: str
+
+
+@dataclass
+class SweepOptions:
+    """The options shared by all the points of a sweep.
+
+    Attributes:
+      engine: The simulation engine, batch, particle or population.
+      seed: The seed of the random generator of every point, or None for
+        random seeds.
+      ymax: The maximums of the y scale of additional population figures.
+      energy_ymax: The maximums of the y scale of additional energy figures.
+      theoretical: Whether to plot the Bateman solution on the population
+        figures.
+      write_events: Whether to also write the .sim and event files of every
+        point, in the binary format.
+    """
+
+    engine: str = "batch"
+    seed: int | None = None
+    ymax: list[int] = field(default_factory=list)
+    energy_ymax: list[int] = field(default_factory=list)
+    theoretical: bool = False
+    write_events: bool = False
+
+
+@dataclass
+class SweepResult:
+    """The outcome of a point of a sweep.
+
+    Attributes:
+      point: The point.
+      num_events: The number of events, or of time steps of the population
+        engine.
+      simulate_seconds: The wall time of the simulation.
+      aggregate_seconds: The wall time of computing the curves.
+      plot_seconds: The wall time of plotting and saving the figures.
+      figures: The file names of the figures.
+    """
+
+    point: SweepPoint
+    num_events: int
+    simulate_seconds: float
+    aggregate_seconds: float
+    plot_seconds: float
+    figures: list[str]
+
+    @property
+    def total_seconds(self) -> float:
+        return self.simulate_seconds + self.aggregate_seconds + self.plot_seconds
+
+
+def sweep_points(chain_names: list[str], counts: list[int], total_times: list[str], prefix: str) -> list[SweepPoint]:
+    """Returns the points of a grid.
+
+    The base name of a point is the prefix, followed by the name of the chain
+    if there are multiple chains, the number of particles, and the total time
+    if there are multiple total times, separated by "_", like thoriumx_1000.
+
+    Args:
+      chain_names: The names of the decay chains, like their file names
+        without extension.
+      counts: The numbers of particles.
+      total_times: The total times, in the form parsed by
+        timeparser.parse_time_str.
+      prefix: The start of the base names.
+    """
+    points = []
+    for c, chain_name in enumerate(chain_names):
+        for total_time in total_times:
+            for n in counts:
+                parts = [prefix]
+                if len(chain_names) > 1:
+                    parts.append(chain_name)
+                parts.append(str(n))
+                if len(total_times) > 1:
+                    parts.append(total_time.replace(" ", ""))
+                points.append(SweepPoint(c, n, parse_time_str(total_time), "_".join(parts)))
+    return points
+
+
+# The decay chains and options of a worker process, set up by _init_worker.
+_worker_chains: list[model.DecayChain] = []
+_worker_options: SweepOptions | None = None
+
+
+def _init_worker(chains: list[model.DecayChain], options: SweepOptions) -> None:
+    global _worker_chains, _worker_options
+    _worker_chains = chains
+    _worker_options = options
+    # The workers only save figures, they never show them.
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _run_point(point: SweepPoint) -> SweepResult:
+    """Simulates, aggregates and plots a point in a worker process."""
+    return run_point(_worker_chains[point.chain], point, _worker_options)
+
+
+def run_point(decay_chain: model.DecayChain, point: SweepPoint, options: SweepOptions,
+              close_figures: bool = True) -> SweepResult:
+    """Simulates, aggregates and plots a point, in memory, and saves its
+    figures.
+
+    Args:
+      decay_chain: The decay chain of the point.
+      point: The point.
+      options: The options of the point.
+      close_figures: Whether to close the figures after saving them. If
+        False, they stay open, to show them.
+    """
+    from . import plotting
+    import matplotlib.pyplot as plt
+
+    cfg = model.SimulationConfig(decay_chain, point.num_particles, point.total_time, point.file_base_name,
+                                 seed=options.seed)
+
+    start = time.perf_counter()
+    if options.engine == "population":
+        history = population.PopulationSimulator(cfg).simulate()
+        num_events = history.times.size - 1
+    else:
+        simulator_class = simulation.BatchSimulator if options.engine == "batch" else simulation.RawSimulator
+        events = simulator_class(cfg).simulate_columns()
+        num_events = len(events)
+    if options.write_events:
+        if options.engine == "population":
+            history.write_file(population.populations_file_name(cfg.file_base_name))
+            cfg.write_file()
+        else:
+            model.write_event_columns(cfg, events, binary=True)
+    simulate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if options.engine == "population":
+        population_curves = history.population_steps(cfg.decay_chain)
+        energy_curves = history.energy_steps(cfg.decay_chain)
+    else:
+        population_curves = analysis.population_steps(events, cfg.decay_chain, cfg.initial_populations())
+        energy_curves = analysis.energy_steps(reduction.expand_events(events, cfg.decay_chain), cfg.decay_chain)
+    theoretical = None
+    if options.theoretical:
+        xf = numpy.linspace(0.0, cfg.total_time, num=1000, dtype=float)
+        theoretical = xf, bateman.solve(cfg.decay_chain, xf, cfg.initial_populations()).populations
+    aggregate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    figures = []
+    for ymax in [None] + options.ymax:
+        fig, file_name, _ = plotting.population_figure(cfg, population_curves, ymax, theoretical)
+        fig.savefig(file_name)
+        if close_figures:
+            plt.close(fig)
+        figures.append(file_name)
+    for ymax in [None] + options.energy_ymax:
+        fig, file_name, _ = plotting.energy_figure(cfg, energy_curves, ymax)
+        fig.savefig(file_name)
+        if close_figures:
+            plt.close(fig)
+        figures.append(file_name)
+    plot_seconds = time.perf_counter() - start
+
+    return SweepResult(point, num_events, simulate_seconds, aggregate_seconds, plot_seconds, figures)
+
+
+def run_sweep(chains: list[model.DecayChain], points: list[SweepPoint], options: SweepOptions,
+              workers: int) -> Iterator[SweepResult]:
+    """Runs the points of a sweep.
+
+    Args:
+      chains: The decay chains, referenced by SweepPoint.chain.
+      points: The points to run.
+      options: The options of all the points.
+      workers: The number of worker processes. With 1 worker, the points are
+        run in the current process.
+
+    Yields:
+      The result of each point, as they are finished.
+    """
+    # The cost of a point grows with its number of particles and total time.
+    ordered = sorted(points, key=lambda p: (p.num_particles * p.total_time, p.num_particles), reverse=True)
+    if workers == 1:
+        _init_worker(chains, options)
+        for point in ordered:
+            yield _run_point(point)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(chains, options)) as pool:
+        futures = [pool.submit(_run_point, point) for point in ordered]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def write_summary(file_name: str, chain_names: list[str], results: list[SweepResult]) -> None:
+    """Writes the runtimes of the points of a sweep as a tab separated table."""
+    with open(file_name, "w") as f:
+        f.write("name\tchain\tnum_particles\ttotal_time_s\tevents\tsimulate_s\taggregate_s\tplot_s\ttotal_s\n")
+        for r in results:
+            f.write("{}\t{}\t{}\t{:g}\t{}\t{:.3f}\t{:.3f}\t{:.3f}\t{:.3f}\n".format(
+                r.point.file_base_name, chain_names[r.point.chain], r.point.num_particles, r.point.total_time,
+                r.num_events, r.simulate_seconds, r.aggregate_seconds, r.plot_seconds, r.total_seconds))
@@ -0,0 +1,128 @@
+"""Fast parsing of the text event format.
+
+The text .events files written by SimulationResults.write_file hold one event
+per line, as written by DecayEvent.as_line, after a comment line with the
+header. Parsing them line by line with DecayEvent.from_line is slow, so this
+module parses whole blocks of lines with numpy.loadtxt instead.
+
+A file is split into byte ranges, which start and end on line boundaries, so
+they can be parsed independently, also in parallel, see read_chunks.
+
+Lines are skipped, if they are empty or start with "#" after stripping
+whitespace, and only the first five fields of a line are used, the same as
+SimulationResults.from_file always did.
+"""
+
+import collections
+import io
+import os
+import warnings
+import numpy
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import Final
+
+# The default size of the byte ranges.
+CHUNK_BYTES: Final[int] = 64 << 20
+
+# The fields of a line.
+_ROW_DTYPE: Final[numpy.dtype] = numpy.dtype([
+    ("particle", numpy.int64),
+    ("from_isotope", numpy.int64),
+    ("to_isotope", numpy.int64),
+    ("time", numpy.float64),
+    ("energy", numpy.float64),
+])
+
+
+def parse_events(data: bytes) -> dict[str, numpy.ndarray]:
+    """Parses a block of complete lines of the text event format.
+
+    Args:
+      data: The lines, including their line breaks. The last line break may
+        be missing.
+
+    Returns:
+      A dict of NumPy arrays, one for each field of DecayEvent.
+
+    Raises:
+      ValueError: If a line is not a valid event.
+    """
+    # numpy.loadtxt skips empty lines, and everything after a "#", and
+    # parses the indices as integers, like int() in DecayEvent.from_line.
+    with warnings.catch_warnings():
+        # A range with only comments is not worth a warning.
+        warnings.filterwarnings("ignore", "loadtxt: input contained no data", UserWarning)
+        rows = numpy.loadtxt(io.BytesIO(data), dtype=_ROW_DTYPE, comments="#", usecols=range(len(_ROW_DTYPE)),
+                             ndmin=1)
+    return {name: numpy.ascontiguousarray(rows[name]) for name in _ROW_DTYPE.names}
+
+
+def line_aligned_ranges(file_name: str, chunk_bytes: int = CHUNK_BYTES) -> list[tuple[int, int]]:
+    """Splits a file into byte ranges of about chunk_bytes, each starting at the
+    beginning of a line, and ending after a line break or at the end of the
+    file."""
+    size = os.path.getsize(file_name)
+    boundaries = [0]
+    with open(file_name, "rb") as f:
+        while boundaries[-1] < size:
+            f.seek(boundaries[-1] + chunk_bytes - 1)
+            # Moves to the beginning of the next line.
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_range(file_name: str, start: int, stop: int) -> dict[str, numpy.ndarray]:
+    """Reads and parses the events in a byte range of a file, as returned by
+    line_aligned_ranges."""
+    with open(file_name, "rb") as f:
+        f.seek(start)
+        return parse_events(f.read(stop - start))
+
+
+def read_events(file_name: str) -> dict[str, numpy.ndarray]:
+    """Reads a whole text event file in this process.
+
+    Returns:
+      A dict of NumPy arrays, one for each field of DecayEvent.
+    """
+    chunks = [read_range(file_name, start, stop) for start, stop in line_aligned_ranges(file_name)]
+    if not chunks:
+        return parse_events(b"")
+    return {name: numpy.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+
+def read_chunks(file_name: str, workers: int,
+                chunk_bytes: int = CHUNK_BYTES) -> Iterator[tuple[dict[str, numpy.ndarray], int]]:
+    """Reads a text event file, parsing its byte ranges in a process pool.
+
+    Args:
+      file_name: The name of the .events file.
+      workers: The number of worker processes. With 1 worker, the file is
+        parsed in the current process.
+      chunk_bytes: The approximate size of a byte range.
+
+    Yields:
+      The events of each byte range, as a dict of NumPy arrays, one for each
+      field of DecayEvent, and the size of the range in bytes. The ranges are
+      in file order.
+    """
+    ranges = line_aligned_ranges(file_name, chunk_bytes)
+    if workers == 1:
+        for start, stop in ranges:
+            yield read_range(file_name, start, stop), stop - start
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only a limited number of ranges are in flight, so the parsed events
+        # waiting to be consumed do not pile up in memory.
+        pending: collections.deque = collections.deque()
+        for start, stop in ranges:
+            if len(pending) >= 2 * workers:
+                future, size = pending.popleft()
+                yield future.result(), size
+            pending.append((pool.submit(read_range, file_name, start, stop), stop - start))
+        while pending:
+            future, size = pending.popleft()
+            yield future.result(), size
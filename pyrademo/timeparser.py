@@ -1,4 +1,7 @@
-"""Parses a human time specification to float seconds."""
+"""Parses a human time specification to float seconds, and numbers of
+particles."""
+
+import argparse
 
 UNITS = "ns, s, min, h, d, a (for year)"
 
@@ -39,4 +42,21 @@ def parse_time_str(s: str) -> float:
     """
     
     parts = s.split()
-    return parse_time(float(parts[0]), parts[1])
\ No newline at end of file
+    return parse_time(float(parts[0]), parts[1])
+
+
+def parse_count(s: str) -> int:
+    """Parses a number of particles, also in scientific notation, like 1e15.
+
+    Meant as the type of an argparse argument.
+
+    Raises:
+      argparse.ArgumentTypeError: If s is not a whole number.
+    """
+    try:
+        return int(s)
+    except ValueError:
+        value = float(s)
+        if not value.is_integer():
+            raise argparse.ArgumentTypeError("not a whole number: {}".format(s)) from None
+        return int(value)
@@ -0,0 +1,100 @@
+"""Runs replicates of a simulation, and writes the statistics of their results."""
+
+import argparse
+import os
+import sys
+import numpy
+
+from pyrademo.decaychain import read_decay_chain
+from pyrademo import ensemble
+from pyrademo import eventindex
+from pyrademo import model
+from pyrademo import population
+from pyrademo import profiling
+from pyrademo import reduction
+from pyrademo import timeparser
+
+
+parser = argparse.ArgumentParser(
+    prog="run_ensemble.py",
+    description="Runs the same simulation many times, and writes the mean, the standard deviation and quantiles of "
+    "the number of particles and the released energy of each isotope, on a time grid. No events are written.",
+)
+
+parser.add_argument("-o", "--output_base", required=True,
+                    help="Basename of the output. Do not provide an extension. A .sim and a .ensemble.npz file are "
+                    "written.")
+parser.add_argument("-n", "--num-particles", required=True, type=timeparser.parse_count,
+                    help="The number of particles of each replicate. Scientific notation, like 1e15, is accepted.")
+parser.add_argument("--decay-chain", required=True,
+                    help="File name of a decay chain file.")
+parser.add_argument("--total-time", required=True,
+                    help="The total time for the simulation. A string in the form of `<number> <unit>`. Available "
+                    "units: {}".format(timeparser.UNITS))
+parser.add_argument("-r", "--replicates", required=True, type=int,
+                    help="The number of replicates.")
+parser.add_argument("--grid-points", type=int, default=1000,
+                    help="The number of points of the time grid, from 0 to the total time, 1000 by default.")
+parser.add_argument("--quantiles", type=float, nargs="+", default=list(ensemble.DEFAULT_QUANTILES),
+                    help="The levels of the quantiles, between 0 and 1. 0.05 0.5 0.95 by default.")
+parser.add_argument("--lump-threshold",
+                    help="Lump the isotopes with a shorter half life than this into the decays of their parents, "
+                    "see write_raw_events.py.")
+parser.add_argument("--engine", choices=["batch", "particle", "population"], default="batch",
+                    help="The simulation engine, see write_raw_events.py.")
+parser.add_argument("--chunk-size", type=int, default=100000,
+                    help="The number of particles simulated at once by the batch and particle engines.")
+parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                    help="The number of replicates run in parallel. The number of CPUs by default.")
+parser.add_argument("--seed", type=int, default=None,
+                    help="The seed of the random generators of the replicates. A random seed if not given.")
+
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+if args.replicates < 1 or args.grid_points < 2 or args.chunk_size < 1:
+    parser.error("--replicates and --chunk-size must be positive, and --grid-points at least 2")
+if not all(0.0 <= level <= 1.0 for level in args.quantiles):
+    parser.error("--quantiles must be between 0 and 1")
+
+with profiler.stage("read_decay_chain"):
+    decay_chain = read_decay_chain(args.decay_chain)
+if args.lump_threshold is not None:
+    threshold = timeparser.parse_time_str(args.lump_threshold)
+    lumped = reduction.short_lived_isotopes(decay_chain, threshold)
+    with profiler.stage("lump"):
+        decay_chain = reduction.lump_short_lived(decay_chain, threshold)
+    print("Lumped isotopes: {}".format(", ".join(decay_chain.isotopes[i].name for i in lumped) or "none"))
+
+cfg = model.SimulationConfig(
+    decay_chain=decay_chain,
+    num_particles=args.num_particles,
+    total_time=timeparser.parse_time_str(args.total_time),
+    file_base_name=args.output_base,
+    seed=args.seed if args.seed is not None else numpy.random.SeedSequence().entropy,
+)
+
+# The outputs of an earlier simulation with the same base name, which the plot
+# scripts would read instead of the ensemble.
+for suffix in [".events", ".events.bin", eventindex.INDEX_SUFFIX, ".state", population.POPULATIONS_SUFFIX]:
+    if os.path.exists(args.output_base + suffix):
+        os.remove(args.output_base + suffix)
+
+grid = numpy.linspace(0.0, cfg.total_time, num=args.grid_points)
+accumulator = ensemble.EnsembleAccumulator(len(decay_chain.isotopes), grid, tuple(sorted(args.quantiles)))
+with profiler.stage("simulate"):
+    for populations, energy, num_events in ensemble.simulate_replicates(
+            cfg, args.engine, args.replicates, grid, args.workers, args.chunk_size):
+        accumulator.add(populations, energy)
+        profiler.count("replicates")
+        profiler.count("events", num_events)
+
+with profiler.stage("write"):
+    accumulator.statistics().write_file(ensemble.ensemble_file_name(args.output_base))
+    cfg.write_file()
+profiler.count_bytes([args.output_base + ".sim", ensemble.ensemble_file_name(args.output_base)])
+profiler.write_report()
+print("Wrote {} and {}, the statistics of {} replicates".format(
+    args.output_base + ".sim", ensemble.ensemble_file_name(args.output_base), accumulator.num_replicates))
@@ -0,0 +1,143 @@
+"""Sends requests to a simulation server, and shows its curves as they arrive."""
+
+import argparse
+import os
+import sys
+import numpy
+
+from pyrademo import profiling
+from pyrademo import server
+from pyrademo import timeparser
+
+
+parser = argparse.ArgumentParser(
+    prog="simulation_client.py",
+    description="Sends requests to a server started by simulation_server.py.",
+)
+
+parser.add_argument("--url", default="http://{}:{}".format(server.DEFAULT_HOST, server.DEFAULT_PORT),
+                    help="The URL of the server.")
+subparsers = parser.add_subparsers(dest="command", required=True)
+subparsers.add_parser("status", help="Prints the status of the server.")
+
+simulate_parser = subparsers.add_parser("simulate", help="Runs a simulation on the server.")
+simulate_parser.add_argument("-n", "--num-particles", required=True, type=timeparser.parse_count,
+                             help="The number of particles. Scientific notation, like 1e15, is accepted.")
+simulate_parser.add_argument("--decay-chain", required=True,
+                             help="File name of a decay chain file.")
+simulate_parser.add_argument("--total-time", required=True,
+                             help="The total time for the simulation. A string in the form of `<number> <unit>`. "
+                             "Available units: {}".format(timeparser.UNITS))
+simulate_parser.add_argument("--engine", choices=["batch", "particle", "population"], default="batch",
+                             help="The simulation engine, see write_raw_events.py.")
+simulate_parser.add_argument("--lump-threshold",
+                             help="Lump the isotopes with a shorter half life than this into the decays of their "
+                             "parents, see write_raw_events.py.")
+simulate_parser.add_argument("--seed", type=int, default=None,
+                             help="The seed of the random generator. A random seed if not given.")
+simulate_parser.add_argument("--first-shard", type=int, default=server.DEFAULT_FIRST_SHARD,
+                             help="The number of particles of the first shard, the first curves sent back.")
+simulate_parser.add_argument("--shard-size", type=int, default=server.DEFAULT_SHARD_SIZE,
+                             help="The maximal number of particles of a shard.")
+
+aggregate_parser = subparsers.add_parser("aggregate", help="Reads a simulation on the server.")
+aggregate_parser.add_argument("-i", "--input", required=True,
+                              help="A simulation, produced by write_raw_events.py. Either the filename of a .sim "
+                              "file, or its base name.")
+
+for subparser in (simulate_parser, aggregate_parser):
+    subparser.add_argument("--grid-points", type=int, default=server.DEFAULT_GRID_POINTS,
+                           help="The number of points of the time grid of the curves.")
+    subparser.add_argument("--plot", choices=["population", "energy"],
+                           help="Plot the number of particles or the released energy of each isotope, updated "
+                           "as the curves arrive.")
+    subparser.add_argument("--figure",
+                           help="Save the final figure of --plot to this file, like foo.png.")
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+if args.command == "status":
+    with profiler.stage("request"):
+        for message in server.request_messages(args.url, "/status"):
+            print(", ".join("{}: {}".format(key, value) for key, value in message.items()))
+    profiler.write_report()
+    sys.exit(0)
+
+if args.command == "simulate":
+    path = "/simulate"
+    payload = {
+        # The server resolves relative paths in its own working directory.
+        "decay_chain": os.path.abspath(args.decay_chain),
+        "num_particles": args.num_particles,
+        "total_time": args.total_time,
+        "seed": args.seed,
+        "engine": args.engine,
+        "grid_points": args.grid_points,
+        "lump_threshold": args.lump_threshold,
+        "first_shard": args.first_shard,
+        "shard_size": args.shard_size,
+    }
+else:
+    path = "/aggregate"
+    payload = {"input": os.path.abspath(args.input), "grid_points": args.grid_points}
+
+if args.plot is not None:
+    with profiler.stage("import_matplotlib"):
+        import matplotlib.pyplot as plt
+    plt.ion()
+    fig, ax = plt.subplots()
+    ax.set_xlabel("seconds")
+    ax.set_ylabel("# of particles" if args.plot == "population" else "MeV")
+    fig.suptitle("Number of particles per isotope in time" if args.plot == "population"
+                 else "Cumulative released energy per isotope in time")
+    lines = []
+
+try:
+    # The request stage is the wait for each message, the plot stage the update
+    # of the figure after it.
+    for message in profiler.iterate("request", server.request_messages(args.url, path, payload)):
+        profiler.count("messages")
+        if message["type"] == "start":
+            num_particles = message["num_particles"]
+            grid = numpy.array(message["grid"])
+            print("Seed {}, {} particles, {} isotopes".format(message["seed"], num_particles,
+                                                             len(message["isotopes"])), flush=True)
+            if args.plot is not None:
+                lines = [ax.plot(grid, numpy.zeros(grid.size), linewidth=1.5, label=name)[0]
+                         for name in message["isotopes"]]
+                ax.legend()
+        elif message["type"] == "progress":
+            print("{:>12} particles {:>12} events {:>9.3f} s".format(
+                message["particles"], message["events"], message["seconds"]), flush=True)
+            if args.plot is not None:
+                with profiler.stage("plot"):
+                    # The estimate of the final curves, from the particles so
+                    # far.
+                    values = numpy.array(message["populations" if args.plot == "population" else "energy"],
+                                         dtype=float)
+                    values *= num_particles / message["particles"]
+                    for line, row in zip(lines, values):
+                        line.set_ydata(row)
+                    ax.relim()
+                    ax.autoscale_view()
+                    ax.set_title("num_particles={}, {} simulated".format(num_particles, message["particles"]))
+                    plt.pause(0.001)
+        elif message["type"] == "done":
+            print("Done: {} particles, {} events in {:.3f} s".format(
+                message["particles"], message["events"], message["seconds"]))
+except (ValueError, OSError) as e:
+    print("Error: {}".format(e), file=sys.stderr)
+    sys.exit(1)
+
+if args.plot is not None and args.figure is not None:
+    with profiler.stage("save"):
+        fig.savefig(args.figure)
+    profiler.count_bytes([args.figure])
+    print("Wrote {}".format(args.figure))
+profiler.write_report()
+
+if args.plot is not None:
+    plt.ioff()
+    plt.show()
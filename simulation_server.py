@@ -0,0 +1,48 @@
+"""Runs a local simulation server, which keeps decay chains and worker processes warm."""
+
+import argparse
+import os
+import sys
+
+from pyrademo import profiling
+from pyrademo import server
+
+parser = argparse.ArgumentParser(
+    prog="simulation_server.py",
+    description="Runs a local HTTP server, which simulates and aggregates on request, and streams the curves back "
+    "while the particles are still being simulated. See simulation_client.py, and the protocol in "
+    "pyrademo/server.py.",
+)
+
+parser.add_argument("--host", default=server.DEFAULT_HOST,
+                    help="The address to listen on, {} by default.".format(server.DEFAULT_HOST))
+parser.add_argument("--port", type=int, default=server.DEFAULT_PORT,
+                    help="The port to listen on, {} by default.".format(server.DEFAULT_PORT))
+parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                    help="The number of worker processes. The number of CPUs by default.")
+parser.add_argument("--decay-chain", action="append", default=[],
+                    help="File name of a decay chain file, to parse before the first request. Can be given "
+                    "multiple times.")
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+service = server.SimulationService(args.workers)
+try:
+    with profiler.stage("warm_up"):
+        service.warm_up(args.decay_chain)
+    with server.SimulationServer(service, args.host, args.port) as http_server:
+        print("Listening on http://{}:{} with {} workers".format(args.host, http_server.server_port, args.workers),
+              flush=True)
+        # The report is written when the server is stopped with Ctrl-C.
+        with profiler.stage("serve"):
+            try:
+                http_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+finally:
+    with profiler.stage("close"):
+        service.close()
+    profiler.count("requests", service.requests)
+    profiler.write_report()
@@ -0,0 +1,92 @@
+"""Runs simulations for a grid of parameters, and plots all their figures."""
+
+import argparse
+import os
+import sys
+
+from pyrademo.decaychain import read_decay_chain
+from pyrademo import profiling
+from pyrademo import sweep
+from pyrademo import timeparser
+
+
+parser = argparse.ArgumentParser(
+    prog="sweep.py",
+    description="Runs a simulation for every combination of decay chain, number of particles and total time, and "
+    "plots the figures of each, without writing the events to files. Writes a table of the runtimes.",
+)
+
+parser.add_argument("-o", "--output-prefix", required=True,
+                    help="The start of the base names of the figures, like latex/thoriumx. The number of particles "
+                    "is appended, and the name of the chain and the total time too, if more than one is given.")
+parser.add_argument("--decay-chain", required=True, action="append",
+                    help="File name of a decay chain file. Can be given multiple times.")
+parser.add_argument("-n", "--num-particles", required=True, type=timeparser.parse_count, nargs="+",
+                    help="The numbers of particles.")
+parser.add_argument("--total-time", required=True, nargs="+",
+                    help="The total times, each in the form of `<number> <unit>`. Available units: {}".format(
+                        timeparser.UNITS))
+parser.add_argument("--engine", choices=["batch", "particle", "population"], default="batch",
+                    help="The simulation engine, see write_raw_events.py.")
+parser.add_argument("--seed", type=int, default=None,
+                    help="The seed of the random generator of every simulation. Random seeds if not given.")
+parser.add_argument("--ymax", type=int, action="append", default=[],
+                    help="The maximum of the y scale of an additional figure of the number of particles of each "
+                    "simulation. Can be given multiple times.")
+parser.add_argument("--energy-ymax", type=int, action="append", default=[],
+                    help="The maximum of the y scale of an additional figure of the released energy of each "
+                    "simulation. Can be given multiple times.")
+parser.add_argument("-e", "--example-theoretical-curve", action="store_true",
+                    help="Also plot the solution of the Bateman equations on the figures of the number of particles.")
+parser.add_argument("--write-events", action="store_true",
+                    help="Also write the .sim and .events.bin files of each simulation, to plot them again later.")
+parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                    help="The number of simulations run in parallel. The number of CPUs by default.")
+parser.add_argument("--summary",
+                    help="The file of the table of the runtimes. <output-prefix>-sweep.tsv by default.")
+
+profiling.add_arguments(parser)
+
+args = parser.parse_args(sys.argv[1:])
+profiler = profiling.from_args(args)
+
+with profiler.stage("read_decay_chain"):
+    chains = [read_decay_chain(file_name) for file_name in args.decay_chain]
+chain_names = [os.path.splitext(os.path.basename(file_name))[0] for file_name in args.decay_chain]
+if len(set(chain_names)) < len(chain_names):
+    # Chains from different directories with the same file name.
+    chain_names = ["{}{}".format(name, c) for c, name in enumerate(chain_names)]
+
+points = sweep.sweep_points(chain_names, args.num_particles, args.total_time, args.output_prefix)
+options = sweep.SweepOptions(
+    engine=args.engine,
+    seed=args.seed,
+    ymax=args.ymax,
+    energy_ymax=args.energy_ymax,
+    theoretical=args.example_theoretical_curve,
+    write_events=args.write_events,
+)
+
+results = []
+with profiler.stage("sweep"):
+    for result in sweep.run_sweep(chains, points, options, args.workers):
+        results.append(result)
+        profiler.count("runs")
+        profiler.count("events", result.num_events)
+        print("{}: {} events, {:.2f} s".format(result.point.file_base_name, result.num_events, result.total_seconds),
+              flush=True)
+
+# In grid order, not in the order the points finished.
+order = {point.file_base_name: i for i, point in enumerate(points)}
+results.sort(key=lambda r: order[r.point.file_base_name])
+
+summary_file_name = args.summary if args.summary is not None else args.output_prefix + "-sweep.tsv"
+sweep.write_summary(summary_file_name, chain_names, results)
+profiler.count_bytes([figure for result in results for figure in result.figures])
+profiler.write_report()
+
+print("\n{:<40} {:>10} {:>10} {:>10} {:>10}".format("name", "simulate", "aggregate", "plot", "total"))
+for r in results:
+    print("{:<40} {:>9.2f}s {:>9.2f}s {:>9.2f}s {:>9.2f}s".format(
+        r.point.file_base_name, r.simulate_seconds, r.aggregate_seconds, r.plot_seconds, r.total_seconds))
+print("Wrote {}".format(summary_file_name))
@@ -0,0 +1,54 @@
+"""Tests of reading simulation results with pyrademo.model."""
+
+import json
+import os
+
+import pytest
+
+from pyrademo import model
+from pyrademo import simulation
+from pyrademo.decaychain import read_decay_chain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THORIUM_CHAIN = os.path.join(ROOT, "data", "thorium.decaychain")
+
+
+def _write_results(output_base: str, num_particles: int, binary: bool) -> model.SimulationResults:
+    cfg = model.SimulationConfig(read_decay_chain(THORIUM_CHAIN), num_particles, 1e8, output_base, seed=1)
+    results = model.SimulationResults(cfg, simulation.BatchSimulator(cfg).simulate())
+    results.write_file(binary)
+    return results
+
+
+def test_readers_use_the_recorded_event_format(tmp_path):
+    output_base = str(tmp_path / "sim")
+    _write_results(output_base, 100, binary=True)
+    os.rename(output_base + ".events.bin", str(tmp_path / "old.events.bin"))
+    results = _write_results(output_base, 300, binary=False)
+    # A stale binary file, as left by older versions.
+    os.rename(str(tmp_path / "old.events.bin"), output_base + ".events.bin")
+
+    for read in [lambda: model.read_event_columns(output_base + ".sim"),
+                 lambda: tuple(vars(model.SimulationResults.from_file(output_base)).values())]:
+        cfg, events = read()
+        assert cfg.event_format == "text"
+        assert len(events) == len(results.data)
+
+
+def test_unrecorded_event_format_with_both_files_is_an_error(tmp_path):
+    output_base = str(tmp_path / "sim")
+    _write_results(output_base, 100, binary=True)
+    _write_results(output_base + "_text", 100, binary=False)
+    os.rename(output_base + "_text.events", output_base + ".events")
+    with open(output_base + ".sim") as f:
+        d = json.load(f)
+    del d["event_format"]
+    with open(output_base + ".sim", "w") as f:
+        json.dump(d, f)
+
+    with pytest.raises(ValueError, match="both a .events and a .events.bin"):
+        model.read_event_columns(output_base)
+    os.remove(output_base + ".events")
+    cfg, events = model.read_event_columns(output_base)
+    assert cfg.event_format is None
+    assert len(events) > 0
@@ -0,0 +1,31 @@
+"""Tests of the accuracy of the population engine, pyrademo.population."""
+
+import os
+
+import numpy
+
+from pyrademo import bateman
+from pyrademo import model
+from pyrademo import population
+from pyrademo.decaychain import read_decay_chain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THORIUM_CHAIN = os.path.join(ROOT, "data", "thorium.decaychain")
+TOTAL_TIME = 20 * 365.25 * 24 * 3600
+
+
+def test_populations_agree_with_the_bateman_solution():
+    decay_chain = read_decay_chain(THORIUM_CHAIN)
+    cfg = model.SimulationConfig(decay_chain, 10**15, TOTAL_TIME, "unused", seed=1)
+    history = population.PopulationSimulator(cfg).simulate()
+    expected = bateman.solve(decay_chain, history.times, cfg.initial_populations()).populations
+    relative = numpy.abs(history.populations - expected) / numpy.maximum(expected, 1.0)
+
+    long_lived = expected[:, -1] > 1e13
+    short_lived = (expected[:, -1] > 1e7) & ~long_lived
+    assert [decay_chain.isotopes[i].name for i in numpy.flatnonzero(long_lived)] == ["Ra(228)", "Th(228)",
+                                                                                      "Pb(208)"]
+    assert numpy.all(relative[long_lived, -1] < 2e-6)
+    assert numpy.all(relative[short_lived, -1] < 1e-3)
+    late = history.times >= TOTAL_TIME / 10
+    assert numpy.all(relative[numpy.ix_(short_lived, late)] < 3e-3)
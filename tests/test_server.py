@@ -0,0 +1,60 @@
+"""Tests of the requests of the simulation server, pyrademo.server."""
+
+import os
+import threading
+
+import pytest
+
+from pyrademo import server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THORIUM_CHAIN = os.path.join(ROOT, "data", "thorium.decaychain")
+VALID_REQUEST = {"decay_chain": THORIUM_CHAIN, "num_particles": 1000, "total_time": "5 a"}
+
+
+@pytest.mark.parametrize("name,value", [
+    ("decay_chain", 1),
+    ("num_particles", "1000"),
+    ("num_particles", 1000.5),
+    ("total_time", 5),
+    ("seed", "1"),
+    ("seed", 1.5),
+    ("engine", ["batch"]),
+    ("grid_points", "5"),
+    ("grid_points", True),
+    ("lump_threshold", 1),
+    ("first_shard", 10.0),
+    ("shard_size", None),
+])
+def test_parameters_of_the_wrong_type_are_invalid(name, value):
+    with pytest.raises(ValueError, match=name):
+        server.SimulationRequest.from_dict({**VALID_REQUEST, name: value})
+
+
+def test_optional_parameters_can_be_null():
+    request = server.SimulationRequest.from_dict({**VALID_REQUEST, "seed": None, "lump_threshold": None})
+    assert request.seed is None
+    assert request.lump_threshold is None
+
+
+@pytest.fixture(scope="module")
+def url():
+    service = server.SimulationService(workers=1)
+    simulation_server = server.SimulationServer(service, port=0)
+    thread = threading.Thread(target=simulation_server.serve_forever, daemon=True)
+    thread.start()
+    yield "http://{}:{}".format(*simulation_server.server_address)
+    simulation_server.shutdown()
+    simulation_server.server_close()
+    service.close()
+
+
+@pytest.mark.parametrize("path,payload", [
+    ("/simulate", {**VALID_REQUEST, "grid_points": "5"}),
+    ("/simulate", {**VALID_REQUEST, "seed": "1"}),
+    ("/aggregate", {"input": "foo.sim", "grid_points": "5"}),
+])
+def test_invalid_requests_get_an_error_response(url, path, payload):
+    # A dropped connection would raise an OSError instead.
+    with pytest.raises(ValueError, match="must be an integer"):
+        list(server.request_messages(url, path, payload, timeout=10))
@@ -0,0 +1,39 @@
+"""Tests of the outputs written by pyrademo.simulate."""
+
+import os
+
+import numpy
+import pytest
+
+from pyrademo import model
+from pyrademo import simulate
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THORIUM_CHAIN = os.path.join(ROOT, "data", "thorium.decaychain")
+
+
+def _simulate(output_base: str, num_particles: int, seed: int, *options: str) -> None:
+    argv = ["-o", output_base, "-n", str(num_particles), "--seed", str(seed), "--decay-chain", THORIUM_CHAIN,
+            "--total-time", "5 a", *options]
+    assert simulate.main(argv) == 0
+
+
+@pytest.mark.parametrize("first_format,second_format", [("binary", "text"), ("text", "binary")])
+@pytest.mark.parametrize("options", [[], ["--time-ordered"], ["--cache"]], ids=["normal", "time_ordered", "cache"])
+def test_rerun_in_the_other_format_replaces_the_events(tmp_path, first_format, second_format, options):
+    output_base = str(tmp_path / "sim")
+    if "--cache" in options:
+        options = options + ["--cache-dir", str(tmp_path / "cache")]
+        # The second run restores the results from the cache.
+        _simulate(str(tmp_path / "cached"), 300, 6, "--format", second_format, *options)
+    _simulate(output_base, 100, 5, "--format", first_format, *options)
+    _simulate(output_base, 300, 6, "--format", second_format, *options)
+
+    other_suffix = ".events.bin" if second_format == "text" else ".events"
+    assert not os.path.exists(output_base + other_suffix)
+    cfg, events = model.read_event_columns(output_base + ".sim")
+    assert cfg.num_particles == 300
+    assert 100 <= numpy.max(events.particle) < 300
+    if "--cache" in options:
+        _, expected = model.read_event_columns(str(tmp_path / "cached"))
+        assert numpy.array_equal(events.time, expected.time)